@@ -0,0 +1,138 @@
+"""
+import-time benchmark of `database_reader`, via `python -X importtime`,
+failing (exit code 1) if the import time of some target exceeds its budget,
+or if some heavy dependency (e.g. OpenCV, librosa) is imported by a target that does not need it
+
+examples:
+    python benchmark_import_time.py
+    python benchmark_import_time.py -t CPSC2019 -b 1000 -n 10
+"""
+
+import os, sys, argparse, subprocess
+from typing import List, Tuple, Optional
+
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# target (attribute of `database_reader`, "" for the bare package): budget in milliseconds
+_BUDGETS = {
+    "": 50,
+    "CPSC2019": 1500,
+    "SHHS": 2500,
+    "CINC2021": 2500,
+}
+
+# dependencies that none of the above targets should import at import time
+_FORBIDDEN = [
+    "cv2", "librosa", "parselmouth", "matplotlib", "PIL", "torch", "tensorflow", "pyedflib",
+]
+
+
+def get_parser() -> dict:
+    """
+    """
+    description = "import-time benchmark (via `python -X importtime`) of database_reader, with regression budgets"
+    parser = argparse.ArgumentParser(
+        description=description,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-t", "--target", type=str, nargs="*",
+        help=f"names to access from database_reader, e.g. CPSC2019, \"\" for the bare package, defaults to {list(_BUDGETS)}",
+        dest="target",
+    )
+    parser.add_argument(
+        "-b", "--budget", type=float,
+        help="budget (in milliseconds) of the import time of each target, defaults to the predefined ones",
+        dest="budget",
+    )
+    parser.add_argument(
+        "-n", "--n-runs", type=int, default=5,
+        help="number of runs of each target, the minimum import time is taken",
+        dest="n_runs",
+    )
+
+    args = vars(parser.parse_args())
+
+    return args
+
+
+def _baseline_modules() -> List[str]:
+    """ finished, checked,
+
+    modules imported at the startup of the interpreter (hence not attributed to the targets)
+    """
+    return [name for name, _, _ in _import_times("pass")]
+
+
+def _import_times(code:str) -> List[Tuple[str, int, int]]:
+    """ finished, checked,
+
+    Parameters
+    ----------
+    code: str,
+        the code to run with `python -X importtime -c`
+
+    Returns
+    -------
+    times: list of tuple,
+        (module name, self time, cumulative time) of each imported module, in microseconds
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=_BASE_DIR, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"failed to run `{code}`:\n{proc.stderr[-2000:]}")
+    times = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times.append((name.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+
+def run(target:str, budget:Optional[float], n_runs:int, baseline:List[str]) -> bool:
+    """ finished, checked,
+
+    Parameters
+    ----------
+    target: str,
+        name to access from `database_reader`, "" for the bare package
+    budget: float, optional,
+        budget (in milliseconds) of the import time of `target`, defaults to `_BUDGETS[target]`
+    n_runs: int,
+        number of runs, the minimum import time is taken
+    baseline: list of str,
+        modules imported at the startup of the interpreter
+
+    Returns
+    -------
+    passed: bool,
+        whether the import time is within the budget, and no forbidden dependency is imported
+    """
+    code = "import database_reader" + (f"; database_reader.{target}" if target else "")
+    budget = budget or _BUDGETS.get(target, None)
+    elapsed = []
+    for _ in range(n_runs):
+        times = [item for item in _import_times(code) if item[0] not in baseline]
+        elapsed.append(sum([self_us for _, self_us, _ in times]) / 1000)
+    elapsed = min(elapsed)
+    modules = set([name for name, _, _ in times])
+    forbidden = sorted([m for m in modules if m in _FORBIDDEN])
+    top = sorted([item for item in times if "." not in item[0]], key=lambda item: -item[2])[:5]
+    passed = (budget is None or elapsed <= budget) and len(forbidden) == 0
+    print(f"{target or 'database_reader'}: {elapsed:.1f} ms (budget {budget} ms), {len(modules)} modules imported, {'passed' if passed else 'FAILED'}")
+    print("    slowest top-level imports: " + ", ".join([f"{name} {cumulative_us/1000:.1f} ms" for name, _, cumulative_us in top]))
+    if len(forbidden) > 0:
+        print(f"    forbidden dependencies imported: {forbidden}")
+    return passed
+
+
+if __name__ == "__main__":
+    args = get_parser()
+    targets = args["target"] if args["target"] is not None else list(_BUDGETS)
+    baseline = _baseline_modules()
+    results = [run(t, args["budget"], args["n_runs"], baseline) for t in targets]
+    exit(0 if all(results) else 1)
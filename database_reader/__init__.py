@@ -6,11 +6,14 @@ subpackages:
 ------------
     physionet_databases
     nsrr_databases
+    cpsc_databases
     audio_databases
     image_databases
-    audio_databases
     other_databases
     utils (submodule)
+
+the readers are exported lazily, e.g. `from database_reader import SHHS`,
+the modules of the readers (and their dependencies) are imported only at the first access
 """
 import os, sys
 
@@ -23,12 +26,48 @@ if len(_IN_SYS_PATH) == 0:
 import warnings
 warnings.simplefilter(action="ignore", category=FutureWarning)
 
-# from .base import *
-# from .physionet_databases import *
-# from .nsrr_databases import *
-# from .audio_databases import *
-# from .image_databases import *
-# from .other_databases import *
+from ._lazy import attach
 
 
-# __all__ = [s for s in dir() if not s.startswith("_")]
+# lazy (PEP 562) exports, so that e.g. `from database_reader import CPSC2019`
+# imports only `cpsc_databases.cpsc2019` (and its dependencies), rather than all the readers
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=[
+        "base",
+        "physionet_databases",
+        "nsrr_databases",
+        "cpsc_databases",
+        "audio_databases",
+        "image_databases",
+        "other_databases",
+        "intervals",
+        "sleep_events",
+    ],
+    submod_attrs={
+        "base": [
+            "PhysioNetDataBase", "NSRRDataBase", "ImageDataBase", "AudioDataBase", "OtherDataBase",
+        ],
+        "physionet_databases": [
+            "AFDB", "AFTDB", "ApneaECG", "BIDMC", "BUTQDB", "CAPSLPDB",
+            "CINC2017", "CINC2018", "CINC2020", "CINC2021",
+            "EDB", "LTAFDB", "LTSTDB", "LUDB", "MIMIC3", "MITDB", "NSTDB", "QTDB", "SLPDB", "STDB", "UCDDB",
+            "INCARTDB", "PTBDB", "PTB_XL",
+        ],
+        "nsrr_databases": [
+            "SHHS", "CHAT", "MESA", "OYA", "nuMoM2b",
+        ],
+        "cpsc_databases": [
+            "CPSC2018", "CPSC2019", "CPSC2020", "CPSC2021",
+        ],
+        "audio_databases": [
+            "IEMOCAP", "CASIA_CESC", "EmoDB", "CHEAVD", "RAVDESS",
+        ],
+        "image_databases": [
+            "ACNE04", "CelebA", "DermNet", "Hands11K", "ImageNet", "COCO2017",
+        ],
+        "other_databases": [
+            "PPGBP", "SleepAccel", "TELE", "PRCV2021",
+        ],
+    },
+)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+lazy (PEP 562) exports of packages,
+so that importing a package does not import all its modules, together with their (heavy) dependencies,
+the modules are imported at the first access of the exported names
+"""
+import sys
+import importlib
+from typing import Dict, List, Tuple, Sequence, Callable, Optional, Any
+
+
+__all__ = [
+    "attach",
+]
+
+
+def attach(package_name:str, submodules:Optional[Sequence[str]]=None, submod_attrs:Optional[Dict[str, Sequence[str]]]=None) -> Tuple[Callable[[str], Any], Callable[[], List[str]], List[str]]:
+    """ finished, checked,
+
+    make the module-level `__getattr__`, `__dir__` and `__all__` of a package, which export lazily
+    the submodules in `submodules` and the attributes (classes, functions) of the submodules in `submod_attrs`,
+    typical usage (in the `__init__.py` of a package):
+
+    >>> __getattr__, __dir__, __all__ = attach(__name__, submodules=[...], submod_attrs={...})
+
+    Parameters
+    ----------
+    package_name: str,
+        (full) name of the package, typically `__name__`
+    submodules: sequence of str, optional,
+        names of the submodules (subpackages) to export
+    submod_attrs: dict, optional,
+        in the form of {submodule name: [attribute names]},
+        if an attribute name occurs in more than one submodule, the last one takes effect
+
+    Returns
+    -------
+    __getattr__: callable,
+        the module-level `__getattr__` of the package
+    __dir__: callable,
+        the module-level `__dir__` of the package
+    __all__: list of str,
+        names of the exported attributes and submodules
+    """
+    submodules = list(submodules or [])
+    attr_to_submod = {}
+    for submod, attrs in (submod_attrs or {}).items():
+        for attr in attrs:
+            attr_to_submod[attr] = submod
+    __all__ = list(attr_to_submod) + [m for m in submodules if m not in attr_to_submod]
+
+    def __getattr__(name:str) -> Any:
+        if name in submodules:
+            return importlib.import_module(f"{package_name}.{name}")
+        if name in attr_to_submod:
+            submod = importlib.import_module(f"{package_name}.{attr_to_submod[name]}")
+            attr = getattr(submod, name)
+            # cached as an attribute of the package, so that `__getattr__` would not be called again
+            setattr(sys.modules[package_name], name, attr)
+            return attr
+        raise AttributeError(f"module `{package_name}` has no attribute `{name}`")
+
+    def __dir__() -> List[str]:
+        return sorted(set(vars(sys.modules[package_name])) | set(__all__))
+
+    return __getattr__, __dir__, __all__
@@ -2,11 +2,24 @@
 
 """
 
-from .iemocap import *
-from .casia_cesc import *
-from .emodb import *
-from .cheavd import *
-from .ravdess import *
+from .._lazy import attach
 
 
-__all__ = [s for s in dir() if not s.startswith('_')]
+# the modules (and their dependencies) are imported at the first access of the exported names
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=[
+        'iemocap',
+        'casia_cesc',
+        'emodb',
+        'cheavd',
+        'ravdess',
+    ],
+    submod_attrs={
+        'iemocap': ['IEMOCAP'],
+        'casia_cesc': ['CASIA_CESC'],
+        'emodb': ['EmoDB'],
+        'cheavd': ['CHEAVD'],
+        'ravdess': ['RAVDESS'],
+    },
+)
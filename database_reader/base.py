@@ -13,21 +13,28 @@ Remarks:
 """
 import os
 import sys
+import math
 import pprint
 import logging
 import time
 import json
-from collections import namedtuple
-from typing import Union, Optional, Any, List, NoReturn
+import inspect
+import threading
+import xml.etree.ElementTree as ET
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Union, Optional, Any, List, Tuple, Dict, Sequence, Hashable, Iterator, Callable, ContextManager, NoReturn
 from numbers import Real
 
-import wfdb
 import numpy as np
 np.set_printoptions(precision=5, suppress=True)
 import pandas as pd
-from pyedflib import EdfReader
+from easydict import EasyDict as ED
 
 from .utils.common import *
+from .version import version as __version__
+from .intervals import as_intervals, resample_intervals, runs_to_mask
 
 
 __all__ = [
@@ -38,6 +45,8 @@ __all__ = [
     "AudioDataBase",
     "OtherDataBase",
     "ECGWaveForm",
+    "LRUCache",
+    "EdfReaderPool",
 ]
 
 
@@ -112,6 +121,10 @@ class _DataBase(object):
 
     universal base class for all databases
     """
+    # version of the parsing of the annotation sidecars of the reader,
+    # to be increased when the parsed contents change
+    _ann_sidecar_version = 1
+
     def __init__(self, db_name:str, db_dir:Optional[str]=None, working_dir:Optional[str]=None, verbose:int=2, **kwargs:Any) -> NoReturn:
         """
         Parameters
@@ -125,12 +138,18 @@ class _DataBase(object):
             working directory, to store intermediate files and log file
         verbose: int, default 2,
             log verbosity
-        kwargs: auxilliary key word arguments
+        kwargs: auxilliary key word arguments,
+            e.g. `ann_sidecar` (default True), whether or not to cache parsed annotations in `working_dir`,
+            `edf_header_cache_size` (default 256), number of headers of EDF files kept in memory,
+            `edf_pool_size` (default 8), number of idle handles of EDF files kept open
         """
         self.db_name = db_name
         self.db_dir = db_dir
         self.working_dir = working_dir or os.getcwd()
         os.makedirs(self.working_dir, exist_ok=True)
+        self._ann_sidecar = kwargs.get("ann_sidecar", True)
+        self._edf_header_cache = LRUCache(maxsize=kwargs.get("edf_header_cache_size", 256))
+        self._edf_pool = EdfReaderPool(maxsize=kwargs.get("edf_pool_size", 8))
         self.data_ext = None
         self.ann_ext = None
         self.header_ext = "hea"
@@ -226,6 +245,445 @@ class _DataBase(object):
         """
         raise NotImplementedError
 
+    def load_data_batch(self,
+                        records:Sequence[str],
+                        workers:int=4,
+                        executor:str="thread",
+                        siglen:Optional[int]=None,
+                        pad_value:Real=0,
+                        **kwargs:Any) -> Tuple[Union[np.ndarray, List[Optional[np.ndarray]]], Dict[str, str]]:
+        """ finished, checked,
+
+        load data of many records, with the I/O fanned out over a pool of threads or processes
+
+        Parameters
+        ----------
+        records: sequence of str,
+            names of the records
+        workers: int, default 4,
+            number of workers of the pool,
+            if is 1, records are loaded sequentially in the current thread
+        executor: str, default "thread", case insensitive,
+            type of the pool, "thread" or "process",
+            "process" requires the reader to be picklable
+        siglen: int, optional,
+            if set, data of all records are padded (at the end, with `pad_value`) or center-cropped
+            to `siglen` samples, and stacked into one preallocated array of shape (n, nb_leads, siglen),
+            or (n, siglen, nb_leads) if `data_format` (in `kwargs`, defaults to that of `self.load_data`)
+            is "channel_last" (aliases "lead_last", "channels_last", "leads_last"),
+            in which case all the records should have the same number of leads
+        pad_value: real number, default 0,
+            value for padding, also for the rows of the records that failed to load
+        kwargs: dict,
+            key word arguments passed to `self.load_data`, e.g. `leads`, `data_format`, `units`, `fs`, etc.
+
+        Returns
+        -------
+        data: ndarray, or list of ndarray,
+            the data of the records, in the order of `records`,
+            if `siglen` is not set, it is a list, with None for the records that failed to load
+        failed: dict,
+            records that failed to load, with corr. error messages
+        """
+        if workers <= 1:
+            results = [_load_data_task(self, rec, kwargs) for rec in records]
+        elif executor.lower() == "thread":
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(lambda rec: _load_data_task(self, rec, kwargs), records))
+        elif executor.lower() == "process":
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_load_data_worker, initargs=(self,)) as pool:
+                results = list(pool.map(_load_data_task, [None]*len(records), records, [kwargs]*len(records)))
+        else:
+            raise ValueError(f"executor `{executor}` not supported")
+
+        failed = {rec: err for rec, (_, err) in zip(records, results) if err is not None}
+        if len(failed) > 0 and self.logger is not None:
+            self.logger.warning(f"failed to load {len(failed)} of {len(records)} records: {list(failed)}")
+        if siglen is None:
+            data = [d for d, _ in results]
+            return data, failed
+
+        data_format = kwargs.get("data_format", None)
+        if data_format is None:
+            # the default of `self.load_data`, e.g. "channels_last" for `INCARTDB`, `CPSC2018`
+            param = inspect.signature(self.load_data).parameters.get("data_format", None)
+            data_format = param.default if param is not None and isinstance(param.default, str) else "channel_first"
+        if data_format.lower() in ["channel_last", "lead_last", "channels_last", "leads_last",]:
+            channel_last = True
+        elif data_format.lower() in ["channel_first", "lead_first", "channels_first", "leads_first",]:
+            channel_last = False
+        else:
+            raise ValueError(f"data format `{data_format}` not supported")
+        data, first_idx = None, None
+        for idx, (d, _) in enumerate(results):
+            if d is None:
+                continue
+            if d.ndim == 1:
+                d = d[:, np.newaxis] if channel_last else d[np.newaxis, :]
+            if channel_last:
+                d = d.T
+            if data is None:
+                shape = (len(records), siglen, d.shape[0]) if channel_last else (len(records), d.shape[0], siglen)
+                data = np.full(shape, pad_value, dtype=d.dtype)
+                first_idx = idx
+            nb_leads = data.shape[2] if channel_last else data.shape[1]
+            if d.shape[0] != nb_leads:
+                raise ValueError(
+                    "records of the batch have different numbers of leads, "
+                    f"{nb_leads} of `{records[first_idx]}` while {d.shape[0]} of `{records[idx]}`, "
+                    "select the same leads (via `leads`), or set `siglen` to None to load them as a list"
+                )
+            # of shape (nb_leads, siglen), a view of `data`
+            target = data[idx].T if channel_last else data[idx]
+            if d.shape[1] >= siglen:
+                start = (d.shape[1] - siglen) // 2
+                target[...] = d[:, start: start+siglen]
+            else:
+                target[:, :d.shape[1]] = d
+        if data is None:  # all failed
+            data = np.full((len(records), 0, siglen), pad_value, dtype=np.float32)
+        return data, failed
+
+    def _load_ann_sidecar(self, rec:str, name:str, source_fps:Sequence[str], parse_func:Callable[[], Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        """ finished, checked,
+
+        load parsed annotations of a record from its sidecar (.npz) file in `working_dir`,
+        or parse the annotation files via `parse_func` and save the results to the sidecar file,
+        the sidecar is invalidated when the version of the package or of the reader (`_ann_sidecar_version`),
+        or the paths or modification times of the source files change
+
+        Parameters
+        ----------
+        rec: str,
+            name of the record
+        name: str,
+            name of the parsed annotations, e.g. "rhythm", "beats", etc.
+        source_fps: sequence of str,
+            paths of the annotation files that `parse_func` reads
+        parse_func: callable,
+            function that parses the annotation files of `rec`,
+            returning a dict of ndarrays (no object arrays), with keys not starting with "__"
+
+        Returns
+        -------
+        arrays: dict of ndarray,
+            the parsed annotations
+        """
+        if not self._ann_sidecar or not all([os.path.isfile(fp) for fp in source_fps]):
+            return parse_func()
+        version = f"{__version__}-{type(self).__name__}-{self._ann_sidecar_version}"
+        sources = np.array([os.path.abspath(fp) for fp in source_fps])
+        mtimes = np.array([os.path.getmtime(fp) for fp in source_fps], dtype=np.float64)
+        sidecar_dir = os.path.join(self.working_dir, "ann_sidecars", self.db_name)
+        sidecar_fp = os.path.join(sidecar_dir, f"{rec.replace(os.sep, '_')}_{name}.npz")
+        if os.path.isfile(sidecar_fp):
+            try:
+                with np.load(sidecar_fp, allow_pickle=False) as npz:
+                    if str(npz["__version__"]) == version \
+                        and np.array_equal(npz["__sources__"], sources) \
+                            and np.array_equal(npz["__mtimes__"], mtimes):
+                        return {k: npz[k] for k in npz.files if not k.startswith("__")}
+            except:
+                pass  # corrupted or outdated sidecar, re-parse
+        arrays = parse_func()
+        os.makedirs(sidecar_dir, exist_ok=True)
+        tmp_fp = f"{sidecar_fp[:-4]}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_fp, __version__=np.array(version), __sources__=sources, __mtimes__=mtimes, **arrays)
+        os.replace(tmp_fp, sidecar_fp)
+        return arrays
+
+    def _iter_wfdb_windows(self,
+                           rec_fp:str,
+                           win_len:int,
+                           hop:int,
+                           channels:Optional[List[int]]=None,
+                           fs:Optional[Real]=None,
+                           sampfrom:Optional[int]=None,
+                           sampto:Optional[int]=None,
+                           rhythm_intervals:Optional[np.ndarray]=None,
+                           fill_value:int=0,
+                           rpeaks:Optional[np.ndarray]=None,
+                           data_format:str="channel_first",
+                           units:str="mV",
+                           block_len:Optional[int]=None) -> Iterator[Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]]:
+        """ finished, checked,
+
+        iterate over sliding windows of a (long-term) wfdb record,
+        the signal file is read sequentially in blocks (each of `block_len` samples),
+        so that the memory footprint does not grow with the length of the record,
+        NOTE that each block is read via `wfdb.rdrecord`, which re-reads the (small) header file,
+        i.e. the header is read once per block (plus once in advance), not once per window
+
+        Parameters
+        ----------
+        rec_fp: str,
+            path (without file extension) of the record
+        win_len: int,
+            length of the windows, in number of samples (w.r.t. `fs`)
+        hop: int,
+            step between the starts of consecutive windows, in number of samples (w.r.t. `fs`)
+        channels: list of int, optional,
+            indices of the channels to load, defaults to all channels
+        fs: real number, optional,
+            if not None, the windows will be resampled to this frequency,
+            `win_len` and `hop` should then correspond to integer numbers of samples w.r.t. `self.fs`
+        sampfrom: int, optional,
+            start index (w.r.t. `self.fs`) of the part of the record to iterate over
+        sampto: int, optional,
+            end index (w.r.t. `self.fs`) of the part of the record to iterate over
+        rhythm_intervals: ndarray, optional,
+            array of shape (n, 3), each row being [start, end, label] (w.r.t. `self.fs`),
+            intervals should be sorted and non-overlapping,
+            if is None, no rhythm mask would be yielded
+        fill_value: int, default 0,
+            value of the rhythm mask out of `rhythm_intervals`
+        rpeaks: ndarray, optional,
+            sorted indices (w.r.t. `self.fs`) of the rpeaks,
+            if is None, no rpeaks would be yielded
+        data_format: str, default "channel_first",
+            format of the signal windows,
+            "channel_last" (alias "lead_last"), or
+            "channel_first" (alias "lead_first")
+        units: str, default "mV",
+            units of the signal windows, can also be "μV", with an alias of "uV"
+        block_len: int, optional,
+            number of samples (w.r.t. `self.fs`) of each sequential read,
+            defaults to the larger one of 4 windows and 2^18 samples
+
+        Yields
+        ------
+        sig: ndarray,
+            the signal window
+        mask: ndarray or None,
+            the rhythm mask of the window, of dtype int8
+        rpeaks_in_window: ndarray or None,
+            indices of the rpeaks in the window, relative to the start of the window
+
+        NOTE that the trailing part of the record shorter than `win_len` is not yielded
+        """
+        assert data_format.lower() in ["channel_first", "lead_first", "channel_last", "lead_last"]
+        if fs is None or fs == self.fs:
+            up, down = 1, 1
+        else:
+            assert int(fs) == fs and int(self.fs) == self.fs, "only integer sampling frequencies are supported"
+            g = math.gcd(int(fs), int(self.fs))
+            up, down = int(fs) // g, int(self.fs) // g
+        if (win_len * down) % up != 0 or (hop * down) % up != 0:
+            raise ValueError(f"`win_len` and `hop` should correspond to integer numbers of samples at {self.fs} Hz")
+        orig_win_len, orig_hop = win_len * down // up, hop * down // up
+
+        import wfdb
+        from scipy.signal import resample_poly
+        header = wfdb.rdheader(rec_fp)
+        sf = sampfrom or 0
+        st = min(sampto or header.sig_len, header.sig_len)
+        block_len = max(block_len or max(4*orig_win_len, 2**18), orig_win_len)
+
+        # annotations are converted to the frequency of the output once for all
+        if rhythm_intervals is not None:
+            rhythm_intervals = resample_intervals(as_intervals(rhythm_intervals, ncols=3), down, up, epsilon=0)
+        if rpeaks is not None:
+            rpeaks = np.round(np.asarray(rpeaks) * up / down).astype(int)
+
+        buffer = np.empty((0, len(channels) if channels else header.n_sig))
+        buffer_start = read_pos = sf
+        for start in range(sf, st - orig_win_len + 1, orig_hop):
+            end = start + orig_win_len
+            if start >= buffer_start + buffer.shape[0]:
+                # the buffer is exhausted (possibly `hop` > `win_len`), skip the gap without reading it
+                buffer = buffer[:0]
+                buffer_start = read_pos = start
+            while buffer_start + buffer.shape[0] < end:
+                read_to = min(read_pos + block_len, st)
+                block = wfdb.rdrecord(
+                    rec_fp,
+                    sampfrom=read_pos,
+                    sampto=read_to,
+                    physical=True,
+                    channels=channels,
+                ).p_signal
+                buffer = np.concatenate([buffer[start-buffer_start:], block])
+                buffer_start, read_pos = start, read_to
+            sig = buffer[start-buffer_start: end-buffer_start]
+            if up != down:
+                sig = resample_poly(sig, up, down, axis=0)
+            if units.lower() in ["μv", "uv"]:
+                sig = 1000 * sig
+            if data_format.lower() in ["channel_first", "lead_first"]:
+                sig = sig.T
+
+            out_start = start * up // down
+            out_end = out_start + win_len
+            mask, rpeaks_in_window = None, None
+            if rhythm_intervals is not None:
+                lo = np.searchsorted(rhythm_intervals[:, 1], out_start, side="right")
+                hi = np.searchsorted(rhythm_intervals[:, 0], out_end, side="left")
+                mask = runs_to_mask(rhythm_intervals[lo:hi], win_len, fill_value=fill_value, start=out_start)
+            if rpeaks is not None:
+                lo, hi = np.searchsorted(rpeaks, [out_start, out_end], side="left")
+                rpeaks_in_window = rpeaks[lo:hi] - out_start
+            yield sig, mask, rpeaks_in_window
+
+    def open_edf_file(self, file_path:str) -> ContextManager["EdfReader"]:
+        """ finished, checked,
+
+        borrow a handle of the EDF file from the pool of open handles of the reader,
+        to be used as a context manager, e.g.
+        >>> with self.open_edf_file(file_path) as reader:
+        ...     labels = reader.getSignalLabels()
+
+        Parameters
+        ----------
+        file_path: str,
+            path of the EDF file
+        """
+        return self._edf_pool.open(file_path)
+
+    def close_edf_files(self) -> NoReturn:
+        """ finished, checked,
+
+        close all idle handles in the pool of open handles of EDF files
+        """
+        self._edf_pool.close()
+
+    def _get_edf_header(self, file_path:str) -> ED:
+        """ finished, checked,
+
+        get the header (signal labels, sampling frequencies, etc.) of an EDF file,
+        cached (keyed by the path and the modification time of the file) so that the file is opened only once
+
+        Parameters
+        ----------
+        file_path: str,
+            path of the EDF file
+
+        Returns
+        -------
+        header: ED,
+            with items "labels", "fs", "n_samples", "prefilter", "transducer", "physical_dimension" (lists, one item per channel),
+            and "duration" (in seconds)
+        """
+        key = (os.path.abspath(file_path), os.path.getmtime(file_path))
+        header = self._edf_header_cache.get(key)
+        if header is not None:
+            return header
+        with self._edf_pool.open(file_path) as reader:
+            labels = reader.getSignalLabels()
+            header = ED(
+                labels=labels,
+                fs=[reader.getSampleFrequency(chn) for chn in range(len(labels))],
+                n_samples=[int(n) for n in reader.getNSamples()],
+                prefilter=[reader.getPrefilter(chn) for chn in range(len(labels))],
+                transducer=[reader.getTransducer(chn) for chn in range(len(labels))],
+                physical_dimension=[reader.getPhysicalDimension(chn) for chn in range(len(labels))],
+                duration=reader.getFileDuration(),
+            )
+        self._edf_header_cache.put(key, header)
+        return header
+
+    def _read_edf_signals(self,
+                          file_path:str,
+                          channels:Optional[Sequence[Union[str,int]]]=None,
+                          start_sec:Real=0,
+                          duration_sec:Optional[Real]=None,
+                          dtype:type=np.float64) -> Dict[str, np.ndarray]:
+        """ finished, checked,
+
+        read (a window of) the selected channels of an EDF file,
+        only the samples of the selected channels in the window are decoded
+
+        Parameters
+        ----------
+        file_path: str,
+            path of the EDF file
+        channels: sequence of str or int, optional,
+            labels or indices of the channels to read,
+            if not specified, all channels will be read
+        start_sec: real number, default 0,
+            start time (in seconds) of the window
+        duration_sec: real number, optional,
+            duration (in seconds) of the window,
+            if not specified, the window ends at the end of the record
+        dtype: type, default np.float64,
+            dtype of the returned signals, e.g. np.float32 to halve the memory footprint
+
+        Returns
+        -------
+        data_dict: dict,
+            the signals, keyed by the channel labels
+        """
+        header = self._get_edf_header(file_path)
+        if channels is None:
+            chn_inds = list(range(len(header.labels)))
+        else:
+            chn_inds = [chn if isinstance(chn, int) else header.labels.index(chn) for chn in channels]
+        data_dict = {}
+        with self._edf_pool.open(file_path) as reader:
+            for chn in chn_inds:
+                fs, n_samples = header.fs[chn], header.n_samples[chn]
+                start = min(int(round(start_sec * fs)), n_samples)
+                n = n_samples - start
+                if duration_sec is not None:
+                    n = min(int(round(duration_sec * fs)), n)
+                data_dict[header.labels[chn]] = reader.readSignal(chn, start=start, n=n).astype(dtype, copy=False)
+        return data_dict
+
+
+# the reader used by the worker processes of `_DataBase.load_data_batch` and `NSRRDataBase.map_records`
+_WORKER_DB = None
+
+
+def _init_load_data_worker(db:_DataBase) -> NoReturn:
+    """
+    initializer of the worker processes of `_DataBase.load_data_batch` and `NSRRDataBase.map_records`,
+    so that the reader is pickled once per worker instead of once per record
+    """
+    global _WORKER_DB
+    _WORKER_DB = db
+
+
+def _load_data_task(db:Optional[_DataBase], rec:str, kwargs:dict) -> Tuple[Optional[np.ndarray], Optional[str]]:
+    """
+    load data of one record, catching the errors so that one failed record would not abort the whole batch
+
+    Returns
+    -------
+    data: ndarray or None,
+        the data of `rec`, None if failed
+    err: str or None,
+        the error message if failed
+    """
+    db = db or _WORKER_DB
+    try:
+        return db.load_data(rec, **kwargs), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def _map_record_task(db:Optional[_DataBase], extractor:Union[str, Callable], rec:str) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    run the feature extractor of `NSRRDataBase.map_records` on one record,
+    catching the errors so that one failed record would not abort the whole run
+
+    Returns
+    -------
+    result: dict or None,
+        the features of `rec` (converted to JSON-serializable python scalars), None if failed
+    err: str or None,
+        the error message if failed
+    """
+    db = db or _WORKER_DB
+    try:
+        if isinstance(extractor, str):
+            result = getattr(db, extractor)(rec)
+        else:
+            result = extractor(db, rec)
+        result = {k: v.item() if isinstance(v, np.generic) else v for k, v in result.items()}
+        json.dumps(result)  # to be checkpointed
+        return result, None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
 
 class PhysioNetDataBase(_DataBase):
     """
@@ -272,6 +730,7 @@ class PhysioNetDataBase(_DataBase):
             return
         
         try:
+            import wfdb
             all_dbs = wfdb.io.get_dbs()
         except:
             all_dbs = [
@@ -466,6 +925,7 @@ class PhysioNetDataBase(_DataBase):
             self._ls_rec_local()
             return
         try:
+            import wfdb
             self._all_records = wfdb.get_record_list(db_name or self.db_name)
         except:
             self._ls_rec_local()
@@ -645,7 +1105,6 @@ class NSRRDataBase(_DataBase):
         self.fs = None
         self._all_records = None
         self.device_id = None  # maybe data are imported into impala db, to facilitate analyzing
-        self.file_opened = None
         
         all_dbs = [
             ["shhs", "Multi-cohort study focused on sleep-disordered breathing and cardiovascular outcomes"],
@@ -664,29 +1123,6 @@ class NSRRDataBase(_DataBase):
         self.kwargs = kwargs
 
 
-    def safe_edf_file_operation(self, operation:str="close", full_file_path:Optional[str]=None) -> NoReturn:
-        """ finished, checked,
-
-        Parameters
-        ----------
-        operation: str, default "close",
-            operation name, can be "open" and "close"
-        full_file_path: str, optional,
-            path of the file which contains the psg data,
-            if not given, default path will be used
-        """
-        if operation == "open":
-            if self.file_opened is not None:
-                self.file_opened._close()
-            self.file_opened = EdfReader(full_file_path)
-        elif operation =="close":
-            if self.file_opened is not None:
-                self.file_opened._close()
-                self.file_opened = None
-        else:
-            raise ValueError("Illegal operation")
-        
-
     def get_subject_id(self, rec:str) -> int:
         """
         Attach a `subject_id` to the record, in order to facilitate further uses
@@ -722,6 +1158,213 @@ class NSRRDataBase(_DataBase):
         raise NotImplementedError
 
 
+    def map_records(self,
+                    extractor:Union[str, Callable[["NSRRDataBase", str], Dict[str, Any]]],
+                    records:Optional[Sequence[str]]=None,
+                    workers:int=4,
+                    executor:str="process",
+                    name:Optional[str]=None,
+                    resume:bool=True,
+                    max_pending:Optional[int]=None) -> Tuple[pd.DataFrame, Dict[str, str]]:
+        """ finished, checked,
+
+        cohort-level map-reduce: run a per-record feature extractor over (all) the records with a pool of workers,
+        and collect the results into one table,
+        results of completed records are checkpointed (appended to a JSON lines file in `working_dir`) as soon as they come,
+        so that an interrupted run resumes from where it stopped
+
+        Parameters
+        ----------
+        extractor: str or callable,
+            name of a method of the reader, called as `self.<extractor>(rec)`,
+            or a (picklable, e.g. module-level, if `executor` is "process") function called as `extractor(self, rec)`,
+            which returns a dict of scalars (features) of the record
+        records: sequence of str, optional,
+            names of the records, defaults to `self.all_records`
+        workers: int, default 4,
+            number of workers of the pool,
+            if is 1, records are processed sequentially in the current thread
+        executor: str, default "process", case insensitive,
+            type of the pool, "thread" or "process",
+            for "process", the reader is pickled once per worker
+        name: str, optional,
+            name of the run, which is also the name of the checkpoint file,
+            defaults to the name of `extractor`
+        resume: bool, default True,
+            if True, records already in the checkpoint file are skipped,
+            otherwise the checkpoint file is overwritten
+        max_pending: int, optional,
+            maximum number of records submitted to the pool but not yet collected,
+            which bounds the memory held by the pending results, defaults to 2 * `workers`
+
+        Returns
+        -------
+        df_results: DataFrame,
+            one row per (succeeded) record, in the order of `records`, with the record names in the column "rec"
+        failed: dict,
+            records that failed, with corr. error messages
+        """
+        records = list(self.all_records if records is None else records)
+        name = name or (extractor if isinstance(extractor, str) else extractor.__name__)
+        max_pending = max_pending or 2 * max(1, workers)
+        ckpt_dir = os.path.join(self.working_dir, "cohort_runs", self.db_name)
+        os.makedirs(ckpt_dir, exist_ok=True)
+        ckpt_fp = os.path.join(ckpt_dir, f"{name}.jsonl")
+
+        done = {}
+        if resume and os.path.isfile(ckpt_fp):
+            with open(ckpt_fp, "r") as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                        done[item["rec"]] = item["result"]
+                    except:
+                        pass  # line truncated by an interruption
+        todo = [rec for rec in records if rec not in done]
+        self.logger.info(f"{len(records)-len(todo)} of {len(records)} records have been done in previous run(s) of {name}")
+
+        failed = {}
+        with open(ckpt_fp, "a" if resume else "w") as ckpt:
+            def _collect(rec:str, result:Optional[dict], err:Optional[str]) -> NoReturn:
+                if err is not None:
+                    failed[rec] = err
+                    return
+                done[rec] = result
+                ckpt.write(json.dumps({"rec": rec, "result": result}) + "\n")
+                ckpt.flush()
+
+            if workers <= 1:
+                for rec in todo:
+                    _collect(rec, *_map_record_task(self, extractor, rec))
+            else:
+                if executor.lower() == "thread":
+                    pool = ThreadPoolExecutor(max_workers=workers)
+                    db = self
+                elif executor.lower() == "process":
+                    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_load_data_worker, initargs=(self,))
+                    db = None
+                else:
+                    raise ValueError(f"executor `{executor}` not supported")
+                with pool:
+                    pending, rec_iter = {}, iter(todo)
+                    while True:
+                        # at most `max_pending` records are in flight
+                        for rec in rec_iter:
+                            pending[pool.submit(_map_record_task, db, extractor, rec)] = rec
+                            if len(pending) >= max_pending:
+                                break
+                        if len(pending) == 0:
+                            break
+                        finished, _ = wait(list(pending.keys()), return_when=FIRST_COMPLETED)
+                        for fut in finished:
+                            _collect(pending.pop(fut), *fut.result())
+
+        if len(failed) > 0:
+            self.logger.warning(f"{name} failed on {len(failed)} of {len(records)} records: {list(failed)}")
+        df_results = pd.DataFrame([dict(rec=rec, **done[rec]) for rec in records if rec in done])
+        if len(df_results) == 0:
+            df_results = pd.DataFrame(columns=["rec"])
+        return df_results, failed
+
+
+    def _iterparse_xml_events(self,
+                              file_path:str,
+                              event_tag:str="ScoredEvent",
+                              numeric_fields:Sequence[str]=(),
+                              keep:Optional[Dict[str, Sequence[str]]]=None,
+                              skip_first:bool=False,
+                              list_tags:Sequence[str]=(),
+                              fields:Sequence[str]=()) -> Tuple[pd.DataFrame, Dict[str, List[int]]]:
+        """ finished, checked,
+
+        streaming parser of the NSRR XML annotation files (nsrr or profusion format),
+        based on `xml.etree.ElementTree.iterparse`, parsed elements are freed on the fly,
+        and fields of the events are written directly into (preallocated, growing) numpy columns
+
+        Parameters
+        ----------
+        file_path: str,
+            path of the XML annotation file
+        event_tag: str, default "ScoredEvent",
+            tag of the event elements, whose child elements are the fields of the events
+        numeric_fields: sequence of str, default (),
+            fields to be converted to numbers,
+            to int if all values are integers (without "."), otherwise to float, with NaN for missing values
+        keep: dict, optional,
+            filter of the events, in the form of {field: values},
+            only events whose fields take values in the given ones are kept, e.g.
+            {"EventType": ["Stages|Stages"]} to keep only the sleep stage annotations,
+            if not specified, all events are kept
+        skip_first: bool, default False,
+            if True, the first event is skipped, which is the recording start time in the nsrr format
+        list_tags: sequence of str, default (),
+            tags of (non-event) elements whose (int) values are collected into lists, e.g. "SleepStage" in the profusion format
+        fields: sequence of str, default (),
+            fields that are always columns of `df_events`, together with those in `numeric_fields` and `keep`,
+            even if no event is kept (or no kept event has them), in which case the columns are empty (or NaN)
+
+        Returns
+        -------
+        df_events: DataFrame,
+            the events, with columns in the order of their first appearances,
+            followed by the absent ones of `fields`, `keep`, `numeric_fields`
+        lists: dict,
+            the collected values of the elements of `list_tags`
+        """
+        expected_fields = list(OrderedDict.fromkeys(list(fields) + list(keep or {}) + list(numeric_fields)))
+        numeric_fields = set(numeric_fields)
+        keep = {k: set(v) for k, v in (keep or {}).items()}
+        lists = {tag: [] for tag in list_tags}
+        columns = OrderedDict()  # field -> preallocated column
+        int_only = {}
+        capacity, n_events, n_seen = 256, 0, 0
+        stack = []
+        for action, elem in ET.iterparse(file_path, events=("start", "end")):
+            if action == "start":
+                stack.append(elem)
+                continue
+            stack.pop()
+            if elem.tag in lists:
+                lists[elem.tag].append(int(elem.text))
+            if elem.tag != event_tag:
+                continue
+            n_seen += 1
+            fields = {child.tag: child.text for child in elem}
+            if len(stack) > 0:
+                stack[-1].remove(elem)
+            elem.clear()
+            if (skip_first and n_seen == 1) or any([fields.get(k, None) not in v for k, v in keep.items()]):
+                continue
+            if n_events == capacity:
+                capacity *= 2
+                for c in columns:
+                    columns[c] = np.concatenate([columns[c], np.full((capacity-n_events,), np.nan, dtype=columns[c].dtype)])
+            for k, text in fields.items():
+                if k not in columns:
+                    columns[k] = np.full((capacity,), np.nan, dtype=np.float64 if k in numeric_fields else object)
+                    int_only[k] = True
+                if text is None:
+                    continue
+                if k in numeric_fields:
+                    columns[k][n_events] = float(text)
+                    int_only[k] = int_only[k] and "." not in text
+                else:
+                    columns[k][n_events] = text
+            n_events += 1
+        # non-numeric columns are passed as lists, so that pandas infers their dtypes
+        df_events = pd.DataFrame(
+            {c: arr[:n_events] if c in numeric_fields else arr[:n_events].tolist() for c, arr in columns.items()},
+            columns=list(columns.keys()),
+        )
+        for c in numeric_fields & set(columns.keys()):
+            if int_only[c] and not df_events[c].isna().any():
+                df_events[c] = df_events[c].astype(np.int64)
+        for c in expected_fields:
+            if c not in df_events.columns:
+                df_events[c] = np.full((n_events,), np.nan, dtype=np.float64 if c in numeric_fields else object)
+        return df_events, lists
+
+
     def database_info(self, detailed:bool=False) -> NoReturn:
         """
         print the information about the database
@@ -964,3 +1607,230 @@ ECGWaveForm = namedtuple(
     typename="ECGWaveForm",
     field_names=["name", "onset", "offset", "peak", "duration"],
 )
+
+
+class LRUCache(object):
+    """ finished, checked,
+
+    a size-bounded, thread-safe least-recently-used cache,
+    used by the readers to keep parsed headers, annotations, etc. in memory
+    """
+    def __init__(self, maxsize:int=1024) -> NoReturn:
+        """
+        Parameters
+        ----------
+        maxsize: int, default 1024,
+            maximum number of items kept in the cache,
+            if is non-positive, nothing will be cached
+        """
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key:Hashable, default:Any=None) -> Any:
+        """
+        get the item of `key`, and mark it as the most recently used one
+        """
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key:Hashable, value:Any) -> NoReturn:
+        """
+        put `value` into the cache, evicting the least recently used items if necessary
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key:Hashable, default:Any=None) -> Any:
+        """
+        remove the item of `key` from the cache and return it
+        """
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self) -> NoReturn:
+        """
+        """
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key:Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def __getstate__(self) -> dict:
+        """
+        the lock is not picklable, the cache is emptied when pickled (e.g. sent to worker processes)
+        """
+        return {"maxsize": self.maxsize}
+
+    def __setstate__(self, state:dict) -> NoReturn:
+        self.__init__(maxsize=state["maxsize"])
+
+
+class EdfReaderPool(object):
+    """ finished, checked,
+
+    a bounded, thread-safe pool of open `EdfReader` handles, keyed by file path,
+    with reference counting and eviction of idle handles in the least-recently-used order
+
+    since `edflib` refuses to open a file that is already opened in the same process,
+    there is at most one handle per file, which is lent to one user at a time,
+    i.e. concurrent users of the same file are serialized, while different files are read in parallel
+
+    Usage
+    -----
+    >>> pool = EdfReaderPool(maxsize=8)
+    >>> with pool.open("/path/to/file.edf") as reader:
+    ...     sig = reader.readSignal(0)
+    """
+    def __init__(self, maxsize:int=8) -> NoReturn:
+        """
+        Parameters
+        ----------
+        maxsize: int, default 8,
+            maximum number of handles kept open,
+            exceeded only when more files than `maxsize` are in use at the same time,
+            if is non-positive, handles are closed once released
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # path -> _EdfPoolEntry, most recently used last
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def open(self, file_path:str) -> Iterator["EdfReader"]:
+        """
+        borrow the handle of the EDF file `file_path`, which is returned to the pool on exit
+        """
+        entry = self.acquire(file_path)
+        try:
+            yield entry.reader
+        finally:
+            self.release(entry)
+
+    def acquire(self, file_path:str) -> "_EdfPoolEntry":
+        """
+        take the handle of `file_path`, opening the file if necessary,
+        blocks while the handle is used by others;
+        an idle handle of an outdated version (modification time) of the file is reopened
+
+        Returns
+        -------
+        entry: _EdfPoolEntry,
+            the pool entry, whose `reader` is the handle, to be passed to `release`
+        """
+        file_path = os.path.abspath(file_path)
+        mtime = os.path.getmtime(file_path)
+        with self._lock:
+            entry = self._entries.get(file_path, None)
+            if entry is None:
+                entry = _EdfPoolEntry(file_path)
+                self._entries[file_path] = entry
+            entry.ref_count += 1
+            self._entries.move_to_end(file_path)
+        entry.lock.acquire()
+        try:
+            if entry.reader is not None and entry.mtime != mtime:
+                entry.close()
+            if entry.reader is None:
+                from pyedflib import EdfReader
+                with _EDFLIB_LOCK:
+                    entry.reader = EdfReader(file_path)
+                entry.mtime = mtime
+        except:
+            self.release(entry)
+            raise
+        return entry
+
+    def release(self, entry:"_EdfPoolEntry") -> NoReturn:
+        """
+        return the handle of `entry` to the pool,
+        closing the least recently used idle handles if the pool is full
+        """
+        entry.lock.release()
+        with self._lock:
+            entry.ref_count -= 1
+            n_excess = len(self._entries) - max(0, self.maxsize)
+            for path in list(self._entries.keys()):
+                if n_excess <= 0:
+                    break
+                if self._entries[path].ref_count == 0:
+                    # closed while holding the lock, otherwise the file might be reopened
+                    # (by `acquire` of another thread) before closed, which `edflib` refuses
+                    self._entries.pop(path).close()
+                    n_excess -= 1
+
+    def ref_count(self, file_path:str) -> int:
+        """
+        number of users (holding or waiting for) the handle of `file_path`
+        """
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(file_path), None)
+            return 0 if entry is None else entry.ref_count
+
+    def close(self, file_path:Optional[str]=None) -> NoReturn:
+        """
+        close the idle handle of `file_path`, or all idle handles if `file_path` is not specified,
+        handles in use are not affected
+        """
+        with self._lock:
+            paths = list(self._entries.keys()) if file_path is None else [os.path.abspath(file_path)]
+            for p in paths:
+                # closed while holding the lock, ref. `self.release`
+                if p in self._entries and self._entries[p].ref_count == 0:
+                    self._entries.pop(p).close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __getstate__(self) -> dict:
+        """
+        open handles are not picklable, the pool is emptied when pickled (e.g. sent to worker processes)
+        """
+        return {"maxsize": self.maxsize}
+
+    def __setstate__(self, state:dict) -> NoReturn:
+        self.__init__(maxsize=state["maxsize"])
+
+    def __del__(self) -> NoReturn:
+        try:
+            self.close()
+        except:
+            pass
+
+
+# `edflib` keeps the opened files in a global table, which is not thread-safe
+_EDFLIB_LOCK = threading.Lock()
+
+
+class _EdfPoolEntry(object):
+    """
+    an entry of `EdfReaderPool`, the handle of one EDF file
+    """
+    __slots__ = ["file_path", "reader", "mtime", "ref_count", "lock",]
+
+    def __init__(self, file_path:str) -> NoReturn:
+        self.file_path = file_path
+        self.reader = None
+        self.mtime = None
+        self.ref_count = 0
+        self.lock = threading.Lock()
+
+    def close(self) -> NoReturn:
+        if self.reader is not None:
+            with _EDFLIB_LOCK:
+                self.reader._close()
+            self.reader = None
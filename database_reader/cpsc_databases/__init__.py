@@ -3,10 +3,22 @@
 docstring, to write
 """
 
-from .cpsc2018 import *
-from .cpsc2019 import *
-from .cpsc2020 import *
-from .cpsc2021 import *
+from .._lazy import attach
 
 
-__all__ = [s for s in dir() if not s.startswith('_')]
+# the modules (and their dependencies) are imported at the first access of the exported names
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=[
+        'cpsc2018',
+        'cpsc2019',
+        'cpsc2020',
+        'cpsc2021',
+    ],
+    submod_attrs={
+        'cpsc2018': ['CPSC2018'],
+        'cpsc2019': ['CPSC2019'],
+        'cpsc2020': ['CPSC2020', 'compute_metrics'],
+        'cpsc2021': ['CPSC2021'],
+    },
+)
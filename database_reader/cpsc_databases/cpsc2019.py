@@ -3,7 +3,8 @@
 """
 import os, json
 from datetime import datetime
-from typing import Union, Optional, Any, List, Dict, Sequence, NoReturn
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union, Optional, Any, List, Tuple, Dict, Sequence, NoReturn
 from numbers import Real
 
 import numpy as np
@@ -349,7 +350,7 @@ class CPSC2019(OtherDataBase):
 
 
 
-def compute_metrics(rpeaks_truth:Sequence[Union[np.ndarray,Sequence[int]]], rpeaks_pred:Sequence[Union[np.ndarray,Sequence[int]]], fs:Real, thr:float=0.075, verbose:int=0) -> float:
+def compute_metrics(rpeaks_truth:Sequence[Union[np.ndarray,Sequence[int]]], rpeaks_pred:Sequence[Union[np.ndarray,Sequence[int]]], fs:Real, thr:float=0.075, verbose:int=0, return_flags:bool=False, workers:Optional[int]=None) -> Union[float, Tuple[float, np.ndarray]]:
     """ finished, checked,
 
     metric (scoring) function modified from the official one, with errors fixed
@@ -367,56 +368,167 @@ def compute_metrics(rpeaks_truth:Sequence[Union[np.ndarray,Sequence[int]]], rpea
         with units in seconds,
     verbose: int, default 0,
         print verbosity
+    return_flags: bool, default False,
+        if True, the flags (scores) of each record will be returned as well
+    workers: int, optional,
+        if specified (and > 1), the records are split into `workers` chunks,
+        scored in parallel in a process pool,
+        which pays off only for very large sets of records
 
     Returns
     -------
     rec_acc: float,
         accuracy of predictions
+    record_flags: ndarray,
+        flags (scores) of each record, 1 for perfect predictions, 0.7 for one false positive,
+        0.3 for one false negative, and 0 otherwise,
+        returned only if `return_flags` is True
+
+    NOTE
+    ----
+    the predictions are counted in the tolerance window of each true rpeak, and in the gaps between the windows,
+    via `np.searchsorted` on the sorted predictions of all the records at once,
+    rather than scanning the predictions for each true rpeak
     """
     assert len(rpeaks_truth) == len(rpeaks_pred), \
         f"number of records does not match, truth indicates {len(rpeaks_truth)}, while pred indicates {len(rpeaks_pred)}"
     n_records = len(rpeaks_truth)
-    record_flags = np.ones((len(rpeaks_truth),), dtype=float)
     thr_ = thr * fs
     if verbose >= 1:
         print(f"number of records = {n_records}")
         print(f"threshold in number of sample points = {thr_}")
-    for idx, (truth_arr, pred_arr) in enumerate(zip(rpeaks_truth, rpeaks_pred)):
-        false_negative = 0
-        false_positive = 0
-        true_positive = 0
-        extended_truth_arr = np.concatenate((truth_arr.astype(int), [int(9.5*fs)]))
-        for j, t_ind in enumerate(extended_truth_arr[:-1]):
-            next_t_ind = extended_truth_arr[j+1]
-            loc = np.where(np.abs(pred_arr - t_ind) <= thr_)[0]
-            if j == 0:
-                err = np.where((pred_arr >= 0.5*fs + thr_) & (pred_arr <= t_ind - thr_))[0]
-            else:
-                err = np.array([], dtype=int)
-            err = np.append(
-                err,
-                np.where((pred_arr >= t_ind+thr_) & (pred_arr <= next_t_ind-thr_))[0]
-            )
-
-            false_positive += len(err)
-            if len(loc) >= 1:
-                true_positive += 1
-                false_positive += len(loc) - 1
-            elif len(loc) == 0:
-                false_negative += 1
-
-        if false_negative + false_positive > 1:
-            record_flags[idx] = 0
-        elif false_negative == 1 and false_positive == 0:
-            record_flags[idx] = 0.3
-        elif false_negative == 0 and false_positive == 1:
-            record_flags[idx] = 0.7
-
-        if verbose >= 2:
-            print(f"for the {idx}-th record,\ntrue positive = {true_positive}\nfalse positive = {false_positive}\nfalse negative = {false_negative}")
+    if workers is not None and workers > 1 and n_records > 1:
+        split_inds = np.array_split(np.arange(n_records), min(workers, n_records))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            stats = list(pool.map(
+                _qrs_stats,
+                [[rpeaks_truth[i] for i in inds] for inds in split_inds],
+                [[rpeaks_pred[i] for i in inds] for inds in split_inds],
+                [fs] * len(split_inds),
+                [thr] * len(split_inds),
+            ))
+        stats = np.concatenate(stats, axis=0)
+    else:
+        stats = _qrs_stats(rpeaks_truth, rpeaks_pred, fs, thr)
+    true_positive, false_positive, false_negative = stats.T
+
+    record_flags = np.ones((n_records,), dtype=float)
+    record_flags[(false_negative == 0) & (false_positive == 1)] = 0.7
+    record_flags[(false_negative == 1) & (false_positive == 0)] = 0.3
+    record_flags[false_negative + false_positive > 1] = 0
+
+    if verbose >= 2:
+        for idx in range(n_records):
+            print(f"for the {idx}-th record,\ntrue positive = {true_positive[idx]}\nfalse positive = {false_positive[idx]}\nfalse negative = {false_negative[idx]}")
 
     rec_acc = round(np.sum(record_flags) / n_records, 4)
-    print(f"QRS_acc: {rec_acc}")
-    print("Scoring complete.")
+    if verbose >= 1:
+        print(f"QRS_acc: {rec_acc}")
+        print("Scoring complete.")
 
+    if return_flags:
+        return rec_acc, record_flags
     return rec_acc
+
+
+def _qrs_stats(rpeaks_truth:Sequence[Union[np.ndarray,Sequence[int]]], rpeaks_pred:Sequence[Union[np.ndarray,Sequence[int]]], fs:Real, thr:float=0.075) -> np.ndarray:
+    """ finished, checked,
+
+    numbers of true positives, false positives, false negatives of the rpeak predictions of each record,
+    the tolerance windows (|pred - truth| <= thr) of the true rpeaks,
+    and the gaps in between (the first gap starting from 0.5s, the last one ending at 9.5s),
+    are counted via `np.searchsorted`,
+    for integer predictions (sample indices), the bounds are converted into integers,
+    so that all the records are shifted apart and counted in one call
+
+    Parameters
+    ----------
+    rpeaks_truth: sequence,
+        sequence of ground truths of rpeaks locations from multiple records
+    rpeaks_pred: sequence,
+        predictions of ground truths of rpeaks locations for multiple records
+    fs: real number,
+        sampling frequency of ECG signal
+    thr: float, default 0.075,
+        threshold for a prediction to be truth positive,
+        with units in seconds,
+
+    Returns
+    -------
+    stats: ndarray,
+        of shape (n_records, 3), each row being [true_positive, false_positive, false_negative]
+    """
+    n_records = len(rpeaks_truth)
+    thr_ = thr * fs
+    truths = [np.asarray(truth_arr).astype(int).ravel() for truth_arr in rpeaks_truth]
+    preds = [np.asarray(pred_arr).ravel() for pred_arr in rpeaks_pred]
+    n_truths = np.array([len(truth_arr) for truth_arr in truths], dtype=np.int64)
+    win_rec = np.repeat(np.arange(n_records), n_truths)
+    pred_rec = np.repeat(np.arange(n_records), [len(pred_arr) for pred_arr in preds])
+    all_truth = np.concatenate([np.zeros((0,), dtype=int)] + truths)
+    all_pred = np.concatenate([np.zeros((0,), dtype=int)] + preds)
+
+    # the gaps are [t_j + thr_, t_{j+1} - thr_] for the true rpeaks t_j (with the extra t_n at 9.5s),
+    # together with [0.5s + thr_, t_0 - thr_] of each record with true rpeaks
+    next_truth = np.append(all_truth[1:], 0)
+    next_truth[np.cumsum(n_truths)[n_truths > 0] - 1] = int(9.5*fs)
+    first_inds = (np.cumsum(n_truths) - n_truths)[n_truths > 0]
+    gap_rec = np.append(np.flatnonzero(n_truths > 0), win_rec)
+    gap_lo = np.append(np.full((len(first_inds),), 0.5*fs + thr_), all_truth + thr_)
+    gap_hi = np.append(all_truth[first_inds] - thr_, next_truth - thr_)
+    gap_order = np.argsort(gap_rec, kind="stable")  # gaps of each record made contiguous
+    gap_rec, gap_lo, gap_hi = gap_rec[gap_order], gap_lo[gap_order], gap_hi[gap_order]
+
+    if np.array_equal(all_pred, np.round(all_pred)):
+        # integer predictions (sample indices), for which |pred - truth| <= thr_ <=> |pred - truth| <= floor(thr_), etc.,
+        # the records are then shifted apart, so that the counting is done in one call of `np.searchsorted`
+        win_lo, win_hi = all_truth - int(np.floor(thr_)), all_truth + int(np.floor(thr_))
+        gap_lo, gap_hi = np.ceil(gap_lo).astype(np.int64), np.floor(gap_hi).astype(np.int64)
+        all_pred = all_pred.astype(np.int64)
+        all_vals = [a for a in [all_pred, win_lo, win_hi, gap_lo, gap_hi] if len(a) > 0]
+        v_min = min([int(a.min()) for a in all_vals], default=0)
+        v_max = max([int(a.max()) for a in all_vals], default=0)
+        offsets = np.arange(n_records, dtype=np.int64) * (v_max - v_min + 1) - v_min
+        all_pred = np.sort(all_pred + offsets[pred_rec])
+        win_counts = _count_in_range(all_pred, win_lo + offsets[win_rec], win_hi + offsets[win_rec])
+        gap_counts = _count_in_range(all_pred, gap_lo + offsets[gap_rec], gap_hi + offsets[gap_rec])
+    else:
+        win_lo, win_hi = all_truth - thr_, all_truth + thr_
+        win_counts = np.zeros((len(win_rec),), dtype=np.int64)
+        gap_counts = np.zeros((len(gap_rec),), dtype=np.int64)
+        win_bounds = np.append(0, np.cumsum(n_truths))
+        gap_bounds = np.append(0, np.cumsum(n_truths + (n_truths > 0)))
+        for idx, pred_arr in enumerate(preds):
+            pred_arr = np.sort(pred_arr)
+            win_inds = slice(win_bounds[idx], win_bounds[idx+1])
+            gap_inds = slice(gap_bounds[idx], gap_bounds[idx+1])
+            win_counts[win_inds] = _count_in_range(pred_arr, win_lo[win_inds], win_hi[win_inds])
+            gap_counts[gap_inds] = _count_in_range(pred_arr, gap_lo[gap_inds], gap_hi[gap_inds])
+
+    stats = np.zeros((n_records, 3), dtype=int)
+    stats[:, 0] = np.bincount(win_rec, weights=(win_counts >= 1), minlength=n_records)
+    stats[:, 1] = np.bincount(gap_rec, weights=gap_counts, minlength=n_records) \
+        + np.bincount(win_rec, weights=np.maximum(win_counts-1, 0), minlength=n_records)
+    stats[:, 2] = np.bincount(win_rec, weights=(win_counts == 0), minlength=n_records)
+    return stats
+
+
+def _count_in_range(sorted_vals:np.ndarray, lo:np.ndarray, hi:np.ndarray) -> np.ndarray:
+    """ finished, checked,
+
+    count the values in each of the closed ranges [lo, hi]
+
+    Parameters
+    ----------
+    sorted_vals: ndarray,
+        the values, sorted in ascending order
+    lo, hi: ndarray,
+        lower and upper bounds of the ranges
+
+    Returns
+    -------
+    counts: ndarray,
+        number of values in each of the ranges, 0 for empty ranges (lo > hi)
+    """
+    counts = np.searchsorted(sorted_vals, hi, side="right") - np.searchsorted(sorted_vals, lo, side="left")
+    return np.maximum(counts, 0)
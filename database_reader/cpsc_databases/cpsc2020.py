@@ -593,6 +593,72 @@ class CPSC2020(OtherDataBase):
             plt.show()
 
 
+def _nearest_ann(rpeaks:np.ndarray, ann_indices:np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ finished, checked,
+
+    find the nearest annotation to each of the rpeaks, via `np.searchsorted` on the sorted annotations,
+    in O((n+m) log m) time instead of the O(n*m) of the pairwise distances
+
+    Parameters
+    ----------
+    rpeaks: ndarray,
+        rpeaks (indices) for forming beats
+    ann_indices: ndarray,
+        indices of the annotations, not necessarily sorted
+
+    Returns
+    -------
+    dist: ndarray,
+        distance from each of the rpeaks to its nearest annotation, `np.inf` if there's no annotation
+    nearest: ndarray,
+        index (in `ann_indices`) of the nearest annotation of each of the rpeaks,
+        among those of equal distance, the first one in `ann_indices` (as `np.argmin` does),
+        0 if there's no annotation
+    """
+    rpeaks, ann_indices = np.asarray(rpeaks), np.asarray(ann_indices)
+    if ann_indices.size == 0:
+        return np.full((len(rpeaks),), np.inf), np.zeros((len(rpeaks),), dtype=int)
+    order = np.argsort(ann_indices, kind="stable")
+    sorted_ann = ann_indices[order]
+    pos = np.searchsorted(sorted_ann, rpeaks, side="right")
+    # the nearest annotation is either the last one <= r, or the first one > r
+    left = np.maximum(pos-1, 0)
+    right = np.minimum(pos, len(sorted_ann)-1)
+    # the first one (in `ann_indices`) among annotations of equal values
+    left = np.searchsorted(sorted_ann, sorted_ann[left], side="left")
+    dist_left = np.where(pos > 0, np.abs(rpeaks-sorted_ann[left]), np.inf)
+    dist_right = np.where(pos < len(sorted_ann), np.abs(rpeaks-sorted_ann[right]), np.inf)
+    take_right = (dist_right < dist_left) | ((dist_right == dist_left) & (order[right] < order[left]))
+    dist = np.where(take_right, dist_right, dist_left)
+    nearest = np.where(take_right, order[right], order[left])
+    return dist, nearest
+
+
+def _count_matched(ref:np.ndarray, pred:np.ndarray, bias_thr:Real) -> np.ndarray:
+    """ finished, checked,
+
+    count the predictions within the tolerance `bias_thr` of each reference beat,
+    via `np.searchsorted` on the sorted predictions
+
+    Parameters
+    ----------
+    ref: ndarray,
+        indices of the reference beats
+    pred: ndarray,
+        indices of the predicted beats
+    bias_thr: real number,
+        tolerance (inclusive) of the matching
+
+    Returns
+    -------
+    counts: ndarray,
+        number of predictions in [r-`bias_thr`, r+`bias_thr`] for each reference beat r
+    """
+    ref, pred = np.asarray(ref), np.sort(np.asarray(pred))
+    counts = np.searchsorted(pred, ref+bias_thr, side="right") - np.searchsorted(pred, ref-bias_thr, side="left")
+    return counts
+
+
 def _ann_to_beat_ann_epoch_v1(rpeaks:np.ndarray, ann:Dict[str, np.ndarray], bias_thr:Real) -> dict:
     """ finished, checked,
 
@@ -620,11 +686,11 @@ def _ann_to_beat_ann_epoch_v1(rpeaks:np.ndarray, ann:Dict[str, np.ndarray], bias
             label for each beat from `rpeaks`
     """
     beat_ann = np.array(["N" for _ in range(len(rpeaks))])
-    for idx, r in enumerate(rpeaks):
-        if any([abs(r-p) < bias_thr for p in ann["SPB_indices"]]):
-            beat_ann[idx] = "S"
-        elif any([abs(r-p) < bias_thr for p in ann["PVC_indices"]]):
-            beat_ann[idx] = "V"
+    if len(rpeaks) > 0:
+        dist_to_spb, _ = _nearest_ann(rpeaks, ann["SPB_indices"])
+        dist_to_pvc, _ = _nearest_ann(rpeaks, ann["PVC_indices"])
+        beat_ann[dist_to_pvc < bias_thr] = "V"
+        beat_ann[dist_to_spb < bias_thr] = "S"
     ann_matched = ann.copy()
     retval = dict(ann_matched=ann_matched, beat_ann=beat_ann)
     return retval
@@ -720,24 +786,17 @@ def _ann_to_beat_ann_epoch_v3(rpeaks:np.ndarray, ann:Dict[str, np.ndarray], bias
         - beat_ann: ndarray,
             label for each beat from `rpeaks`
     """
-    beat_ann = np.array(["N" for _ in range(len(rpeaks))], dtype="<U1")
+    beat_ann = np.full((len(rpeaks),), "N", dtype="<U1")
+    dist_to_spb, nearest_spb = _nearest_ann(rpeaks, ann["SPB_indices"])
+    dist_to_pvc, nearest_pvc = _nearest_ann(rpeaks, ann["PVC_indices"])
+    # ties are broken in the order SPB, PVC, `bias_thr` (as `np.argmin` does)
+    is_spb = (dist_to_spb <= dist_to_pvc) & (dist_to_spb <= bias_thr)
+    is_pvc = (dist_to_pvc < dist_to_spb) & (dist_to_pvc <= bias_thr)
+    beat_ann[is_spb] = "S"
+    beat_ann[is_pvc] = "V"
     ann_matched = {k: [] for k,v in ann.items()}
-    for idx_r, r in enumerate(rpeaks):
-        dist_to_spb = np.abs(r-ann["SPB_indices"])
-        dist_to_pvc = np.abs(r-ann["PVC_indices"])
-        if len(dist_to_spb) == 0:
-            dist_to_spb = np.array([np.inf])
-        if len(dist_to_pvc) == 0:
-            dist_to_pvc = np.array([np.inf])
-        argmin = np.argmin([np.min(dist_to_spb), np.min(dist_to_pvc), bias_thr])
-        if argmin == 2:
-            pass
-        elif argmin == 1:
-            beat_ann[idx_r] = "V"
-            ann_matched["PVC_indices"].append(ann["PVC_indices"][np.argmin(dist_to_pvc)])
-        elif argmin == 0:
-            beat_ann[idx_r] = "S"
-            ann_matched["SPB_indices"].append(ann["SPB_indices"][np.argmin(dist_to_spb)])
+    ann_matched["SPB_indices"] = list(np.asarray(ann["SPB_indices"])[nearest_spb[is_spb]])
+    ann_matched["PVC_indices"] = list(np.asarray(ann["PVC_indices"])[nearest_pvc[is_pvc]])
     ann_matched = {k: np.array(v) for k,v in ann_matched.items()}
     retval = dict(ann_matched=ann_matched, beat_ann=beat_ann)
     return retval
@@ -763,50 +822,46 @@ def compute_metrics(sbp_true:List[np.ndarray], pvc_true:List[np.ndarray], sbp_pr
         - true_positive: number of true positives of each ectopic beat type
         - false_positive: number of false positives of each ectopic beat type
         - false_negative: number of false negatives of each ectopic beat type
+        - record_details: list of the above three items of each record
+
+    NOTE
+    ----
+    predictions are matched to each reference beat via `np.searchsorted` on the sorted predictions,
+    hence O((n+m) log m) for each record
     """
     BaseCfg = ED()
     BaseCfg.fs = 400
     BaseCfg.bias_thr = 0.15 * BaseCfg.fs
     s_score = np.zeros([len(sbp_true), ], dtype=int)
     v_score = np.zeros([len(sbp_true), ], dtype=int)
+    s_tp, s_fp, s_fn = np.zeros_like(s_score), np.zeros_like(s_score), np.zeros_like(s_score)
+    v_tp, v_fp, v_fn = np.zeros_like(v_score), np.zeros_like(v_score), np.zeros_like(v_score)
     ## Scoring ##
     for i, (s_ref, v_ref, s_pos, v_pos) in enumerate(zip(sbp_true, pvc_true, sbp_pred, pvc_pred)):
-        s_tp = 0
-        s_fp = 0
-        s_fn = 0
-        v_tp = 0
-        v_fp = 0
-        v_fn = 0
         # SBP
-        if s_ref.size == 0:
-            s_fp = len(s_pos)
+        if np.size(s_ref) == 0:
+            s_fp[i] = len(s_pos)
         else:
-            for m, ans in enumerate(s_ref):
-                s_pos_cand = np.where(abs(s_pos-ans) <= BaseCfg.bias_thr)[0]
-                if s_pos_cand.size == 0:
-                    s_fn += 1
-                else:
-                    s_tp += 1
-                    s_fp += len(s_pos_cand) - 1
+            s_cnt = _count_matched(s_ref, s_pos, BaseCfg.bias_thr)
+            s_tp[i] = np.count_nonzero(s_cnt)
+            s_fn[i] = len(s_cnt) - s_tp[i]
+            s_fp[i] = s_cnt.sum() - s_tp[i]
         # PVC
-        if v_ref.size == 0:
-            v_fp = len(v_pos)
+        if np.size(v_ref) == 0:
+            v_fp[i] = len(v_pos)
         else:
-            for m, ans in enumerate(v_ref):
-                v_pos_cand = np.where(abs(v_pos-ans) <= BaseCfg.bias_thr)[0]
-                if v_pos_cand.size == 0:
-                    v_fn += 1
-                else:
-                    v_tp += 1
-                    v_fp += len(v_pos_cand) - 1
+            v_cnt = _count_matched(v_ref, v_pos, BaseCfg.bias_thr)
+            v_tp[i] = np.count_nonzero(v_cnt)
+            v_fn[i] = len(v_cnt) - v_tp[i]
+            v_fp[i] = v_cnt.sum() - v_tp[i]
         # calculate the score
-        s_score[i] = s_fp * (-1) + s_fn * (-5)
-        v_score[i] = v_fp * (-1) + v_fn * (-5)
+        s_score[i] = s_fp[i] * (-1) + s_fn[i] * (-5)
+        v_score[i] = v_fp[i] * (-1) + v_fn[i] * (-5)
 
         if verbose >= 1:
             print(f"for the {i}-th record")
-            print(f"s_tp = {s_tp}, s_fp = {s_fp}, s_fn = {s_fn}")
-            print(f"v_tp = {v_tp}, v_fp = {v_fp}, s_fn = {v_fn}")
+            print(f"s_tp = {s_tp[i]}, s_fp = {s_fp[i]}, s_fn = {s_fn[i]}")
+            print(f"v_tp = {v_tp[i]}, v_fp = {v_fp[i]}, v_fn = {v_fn[i]}")
             print(f"s_score[{i}] = {s_score[i]}, v_score[{i}] = {v_score[i]}")
 
     Score1 = np.sum(s_score)
@@ -816,9 +871,16 @@ def compute_metrics(sbp_true:List[np.ndarray], pvc_true:List[np.ndarray], sbp_pr
         retval = ED(
             total_loss=-(Score1+Score2),
             class_loss={"S":-Score1, "V":-Score2},
-            true_positive={"S":s_tp, "V":v_tp},
-            false_positive={"S":s_fp, "V":v_fp},
-            false_negative={"S":s_fn, "V":v_fn},
+            true_positive={"S":int(s_tp.sum()), "V":int(v_tp.sum())},
+            false_positive={"S":int(s_fp.sum()), "V":int(v_fp.sum())},
+            false_negative={"S":int(s_fn.sum()), "V":int(v_fn.sum())},
+            record_details=[
+                ED(
+                    true_positive={"S":int(s_tp[i]), "V":int(v_tp[i])},
+                    false_positive={"S":int(s_fp[i]), "V":int(v_fp[i])},
+                    false_negative={"S":int(s_fn[i]), "V":int(v_fn[i])},
+                ) for i in range(len(s_score))
+            ],
         )
     else:
         retval = Score1, Score2
@@ -8,7 +8,7 @@ import time
 import warnings
 import json
 from datetime import datetime
-from typing import Union, Optional, Any, List, Tuple, Dict, Sequence, NoReturn
+from typing import Union, Optional, Any, List, Tuple, Dict, Sequence, Iterator, NoReturn
 from numbers import Real
 
 import numpy as np
@@ -25,9 +25,14 @@ from ..utils.common import (
     DEFAULT_FIG_SIZE_PER_SEC,
 )
 from ..utils.utils_universal import generalized_intervals_intersection
+from ..intervals import (
+    clip_intervals, union_intervals, shift_intervals, resample_intervals,
+    intervals_to_mask,
+)
 from ..base import (
     OtherDataBase,
     WFDB_Beat_Annotations, WFDB_Non_Beat_Annotations, WFDB_Rhythm_Annotations,
+    LRUCache,
 )
 
 
@@ -118,7 +123,8 @@ class CPSC2021(OtherDataBase):
             working directory, to store intermediate files and log file
         verbose: int, default 2,
             log verbosity
-        kwargs: auxilliary key word arguments
+        kwargs: auxilliary key word arguments,
+            e.g. `ann_cache_size` (default 256), the maximum number of records whose annotations are kept in memory
         """
         super().__init__(db_name="CPSC2021", db_dir=db_dir, working_dir=working_dir, verbose=verbose, **kwargs)
 
@@ -152,6 +158,8 @@ class CPSC2021(OtherDataBase):
         self._subject_records = ED({t:[] for t in self.db_tranches})
         self._stats = pd.DataFrame()
         self._stats_columns = ["record", "tranche", "subject_id", "record_id", "label", "fs", "sig_len",]
+        # header and annotations read once per record, keyed by (record name, mtimes of the files)
+        self._ann_cache = LRUCache(maxsize=kwargs.get("ann_cache_size", 256))
         self._ls_rec()
         self._aggregate_stats()
 
@@ -237,7 +245,7 @@ class CPSC2021(OtherDataBase):
             self._stats["record_id"] = self._stats["record"].apply(lambda s: int(s.split("_")[2]))
             self._stats["label"] = self._stats["record"].apply(lambda s: self.load_label(s))
             self._stats["fs"] = self.fs
-            self._stats["sig_len"] = self._stats["record"].apply(lambda s: wfdb.rdheader(self._get_path(s)).sig_len)
+            self._stats["sig_len"] = self._stats["record"].apply(lambda s: self._get_ann_bundle(s).sig_len)
             self._stats["revised"] = self._stats["record"].apply(lambda s: 1 if s in self.__revised_records else 0)
             self._stats = self._stats.sort_values(by=["subject_id", "record_id"], ignore_index=True)
             self._stats = self._stats[self._stats_columns]
@@ -475,7 +483,10 @@ class CPSC2021(OtherDataBase):
             annotaton of the record
         """
         sf, st = self._validate_samp_interval(rec, sampfrom, sampto)
-        ann = wfdb.rdann(self._get_path(rec), extension=self.ann_ext, sampfrom=sf, sampto=st)
+        if field is not None and field.lower() in ["raw", "wfdb",]:
+            ann = wfdb.rdann(self._get_path(rec), extension=self.ann_ext, sampfrom=sf, sampto=st)
+            return ann
+        # all the fields are derived from the (cached) single read of the header and annotation files
         # `load_af_episodes` should not use sampfrom, sampto
         func = {
             "rpeaks": self.load_rpeaks,
@@ -483,18 +494,16 @@ class CPSC2021(OtherDataBase):
             "label": self.load_label,
         }
         if field is None:
-            ann = {k: f(rec, ann, sf, st) for k,f in func.items()}
+            ann = {k: f(rec, None, sf, st) for k,f in func.items()}
             if kwargs:
                 warnings.warn(f"key word arguments {list(kwargs.keys())} ignored when field is not specified!")
             return ann
-        elif field.lower() in ["raw", "wfdb",]:
-            return ann
 
         try:
             f = func[field.lower()]
         except:
             raise ValueError(f"invalid field")
-        ann = f(rec, ann, sf, st, **kwargs)
+        ann = f(rec, None, sf, st, **kwargs)
         return ann
 
 
@@ -515,7 +524,7 @@ class CPSC2021(OtherDataBase):
             name of the record
         ann: Annotation, optional,
             the wfdb Annotation of the record,
-            if None, corresponding annotation file will be read
+            if None, the (cached) annotations of the record will be used
         sampfrom: int, optional,
             start index of the data to be loaded
         sampto: int, optional,
@@ -534,10 +543,14 @@ class CPSC2021(OtherDataBase):
         """
         if ann is None:
             sf, st = self._validate_samp_interval(rec, sampfrom, sampto)
-            ann = wfdb.rdann(self._get_path(rec), extension=self.ann_ext, sampfrom=sf, sampto=st)
-        critical_points = ann.sample
-        symbols = ann.symbol
-        rpeaks_valid = np.isin(symbols, list(WFDB_Beat_Annotations.keys()))
+            critical_points = self._get_ann_bundle(rec).rpeaks
+            # NOTE that `wfdb.rdann` includes annotations at `sampto`
+            critical_points = critical_points[(critical_points >= sf) & (critical_points <= st)]
+            rpeaks_valid = slice(None)
+        else:
+            critical_points = ann.sample
+            symbols = ann.symbol
+            rpeaks_valid = np.isin(symbols, list(WFDB_Beat_Annotations.keys()))
         if sampfrom and zero_start:
             critical_points = critical_points - sampfrom
         if fs is not None and fs!=self.fs:
@@ -553,7 +566,8 @@ class CPSC2021(OtherDataBase):
                          sampto:Optional[int]=None,
                          zero_start:bool=False,
                          fs:Optional[Real]=None,
-                         fmt:str="intervals") -> Union[List[List[int]], np.ndarray]:
+                         fmt:str="intervals",
+                         mask_dtype:type=int) -> Union[List[List[int]], np.ndarray]:
         """ finished, checked,
 
         load the episodes of atrial fibrillation, in terms of intervals or mask
@@ -563,8 +577,7 @@ class CPSC2021(OtherDataBase):
         rec: str,
             name of the record
         ann: Annotation, optional,
-            the wfdb Annotation of the record,
-            if None, corresponding annotation file will be read
+            not used, the episodes are always derived from the (cached) annotations of the whole record
         sampfrom: int, optional,
             start index of the data to be loaded,
             not used when `fmt` is "c_intervals"
@@ -579,39 +592,28 @@ class CPSC2021(OtherDataBase):
             if not None, positions of the loaded intervals or mask will be ajusted according to this sampling frequency
         fmt: str, default "intervals",
             format of the episodes of atrial fibrillation, can be one of "intervals", "mask", "c_intervals"
+        mask_dtype: type, default int,
+            dtype of the mask, for example `np.int8` to reduce memory footprint,
+            used only when `fmt` is "mask"
 
         Returns
         -------
         af_episodes: list or ndarray,
             episodes of atrial fibrillation, in terms of intervals or mask
         """
-        header = wfdb.rdheader(self._get_path(rec))
-        label = self._labels_f2a[header.comments[0]]
-        siglen = header.sig_len
-        # if ann is None or fmt.lower() in ["c_intervals",]:
-        #     _ann = wfdb.rdann(self._get_path(rec), extension=self.ann_ext)
-        # else:
-        #     _ann = ann
-        _ann = wfdb.rdann(self._get_path(rec), extension=self.ann_ext)
+        bundle = self._get_ann_bundle(rec)
+        label = self._labels_f2a[bundle.label]
+        siglen = bundle.sig_len
         sf, st = self._validate_samp_interval(rec, sampfrom, sampto)
-        aux_note = np.array(_ann.aux_note)
-        critical_points = _ann.sample
-        af_start_inds = np.where((aux_note=="(AFIB") | (aux_note=="(AFL"))[0]  # ref. NOTE 3.
-        af_end_inds = np.where(aux_note=="(N")[0]
-        assert len(af_start_inds) == len(af_end_inds), \
-            "unequal number of af period start indices and af period end indices"
 
         if fmt.lower() in ["c_intervals",]:
             if sf > 0 or st < siglen:
                 raise ValueError(f"when `fmt` is `c_intervals`, `sampfrom` and `sampto` should never be used!")
+            af_start_inds, af_end_inds = bundle.af_critical_inds
             af_episodes = [[start, end] for start, end in zip(af_start_inds, af_end_inds)]
             return af_episodes
 
-        intervals = []
-        for start, end in zip(af_start_inds, af_end_inds):
-            itv = [critical_points[start], critical_points[end]]
-            intervals.append(itv)
-        intervals = generalized_intervals_intersection(intervals, [[sf, st]])
+        intervals = clip_intervals(union_intervals(bundle.af_intervals), sf, st)
 
         siglen = st - sf
         if fs is not None and fs != self.fs:
@@ -620,20 +622,17 @@ class CPSC2021(OtherDataBase):
             if label == "AFf":
                 # ref. NOTE. 1 of the class docstring
                 # the `ann.sample` does not always satify this point after resampling
-                intervals = [[sf, siglen-1]]
+                intervals = np.array([[sf, siglen-1]])
             else:
-                intervals = [[self._round(itv[0]*fs/self.fs), self._round(itv[1]*fs/self.fs)] for itv in intervals]
+                intervals = resample_intervals(intervals, self.fs, fs, self._epsilon)
 
         if zero_start:
-            intervals = [[itv[0]-sf, itv[1]-sf] for itv in intervals]
+            intervals = shift_intervals(intervals, -sf)
             sf = 0
-        af_episodes = intervals
+        af_episodes = intervals.tolist()
 
         if fmt.lower() in ["mask",]:
-            mask = np.zeros((siglen,), dtype=int)
-            for itv in intervals:
-                mask[itv[0]-sf:itv[1]-sf] = 1
-            af_episodes = mask
+            af_episodes = intervals_to_mask(intervals, siglen, start=sf, dtype=mask_dtype)
 
         return af_episodes
 
@@ -673,8 +672,7 @@ class CPSC2021(OtherDataBase):
         label: str,
             classifying label of the record
         """
-        header = wfdb.rdheader(self._get_path(rec))
-        label = header.comments[0]
+        label = self._get_ann_bundle(rec).label
         if fmt.lower() in ["a", "abbr", "abbreviation"]:
             label = self._labels_f2a[label]
         elif fmt.lower() in ["n", "num", "number"]:
@@ -684,6 +682,83 @@ class CPSC2021(OtherDataBase):
         return label
 
 
+    def iter_windows(self,
+                     rec:str,
+                     win_len:int,
+                     hop:int,
+                     leads:Optional[Union[str, List[str]]]=None,
+                     fs:Optional[Real]=None,
+                     sampfrom:Optional[int]=None,
+                     sampto:Optional[int]=None,
+                     data_format:str="channel_first",
+                     units:str="mV",
+                     block_len:Optional[int]=None) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """ finished, checked,
+
+        iterate over sliding windows of a record,
+        the signal is read sequentially in blocks, with constant memory footprint
+
+        Parameters
+        ----------
+        rec: str,
+            name of the record
+        win_len: int,
+            length of the windows, in number of samples (w.r.t. `fs`)
+        hop: int,
+            step between the starts of consecutive windows, in number of samples (w.r.t. `fs`)
+        leads: str or list of str, optional,
+            the leads to load
+        fs: real number, optional,
+            if not None, the windows (and the annotations) will be resampled to this frequency
+        sampfrom: int, optional,
+            start index (w.r.t. `self.fs`) of the part of the record to iterate over
+        sampto: int, optional,
+            end index (w.r.t. `self.fs`) of the part of the record to iterate over
+        data_format: str, default "channel_first",
+            format of the ecg data,
+            "channel_last" (alias "lead_last"), or
+            "channel_first" (alias "lead_first")
+        units: str, default "mV",
+            units of the output signal, can also be "μV", with an alias of "uV"
+        block_len: int, optional,
+            number of samples (w.r.t. `self.fs`) of each sequential read of the signal file
+
+        Yields
+        ------
+        sig: ndarray,
+            the ecg data of the window
+        mask: ndarray,
+            mask of the episodes of atrial fibrillation in the window
+        rpeaks: ndarray,
+            indices of the rpeaks in the window, relative to the start of the window
+        """
+        if not leads:
+            _leads = self.all_leads
+        elif isinstance(leads, str):
+            _leads = [leads]
+        else:
+            _leads = leads
+        assert all([l in self.all_leads for l in _leads])
+        af_episodes = self.load_af_episodes(rec, fmt="intervals")
+        rhythm_intervals = np.column_stack([np.array(af_episodes, dtype=int).reshape(-1, 2), np.ones((len(af_episodes),), dtype=int)])
+        rpeaks = self._get_ann_bundle(rec).rpeaks
+        yield from self._iter_wfdb_windows(
+            self._get_path(rec),
+            win_len=win_len,
+            hop=hop,
+            channels=[self.all_leads.index(l) for l in _leads],
+            fs=fs,
+            sampfrom=sampfrom,
+            sampto=sampto,
+            rhythm_intervals=rhythm_intervals,
+            fill_value=0,
+            rpeaks=np.sort(rpeaks),
+            data_format=data_format,
+            units=units,
+            block_len=block_len,
+        )
+
+
     def plot(self,
              rec:str,
              data:Optional[np.ndarray]=None,
@@ -901,9 +976,133 @@ class CPSC2021(OtherDataBase):
         plt.show()
 
 
+    def _get_ann_bundle(self, rec:str) -> "_AnnBundle":
+        """ finished, checked,
+
+        get the (cached) annotation bundle of `rec`,
+        the cache is keyed by the record name and the modification times of the header and annotation files,
+        hence updated files would be re-read
+
+        Parameters
+        ----------
+        rec: str,
+            name of the record
+
+        Returns
+        -------
+        bundle: _AnnBundle,
+            header and annotations of the record, read at most once,
+            and persisted in the annotation sidecar (in `working_dir`) if enabled
+        """
+        rec_fp = self._get_path(rec)
+        source_fps = [f"{rec_fp}.{self.header_ext}", f"{rec_fp}.{self.ann_ext}"]
+        key = (rec,) + tuple(os.path.getmtime(fp) for fp in source_fps)
+        bundle = self._ann_cache.get(key)
+        if bundle is None:
+            if self._ann_sidecar:
+                arrays = self._load_ann_sidecar(
+                    rec, "ann", source_fps, lambda: _AnnBundle(rec_fp, self.ann_ext).to_arrays(),
+                )
+                bundle = _AnnBundle(rec_fp, self.ann_ext, arrays=arrays)
+            else:
+                bundle = _AnnBundle(rec_fp, self.ann_ext)
+            self._ann_cache.put(key, bundle)
+        return bundle
+
+
     def _round(self, n:Real) -> int:
         """ finished, checked,
 
         dealing with round(0.5) = 0, hence keeping accordance with output length of `resample_poly`
         """
         return int(round(n + self._epsilon))
+
+
+class _AnnBundle(object):
+    """ finished, checked,
+
+    header and annotations of one record of CPSC2021,
+    the header file is read on creation, the annotation file on first use,
+    and the fields (rpeaks, af episodes, label) are derived lazily from these single reads
+    """
+    def __init__(self, rec_fp:str, ann_ext:str="atr", arrays:Optional[Dict[str, np.ndarray]]=None) -> NoReturn:
+        """
+        Parameters
+        ----------
+        rec_fp: str,
+            path (without file extension) of the record
+        ann_ext: str, default "atr",
+            file extension of the annotation file
+        arrays: dict of ndarray, optional,
+            output of `self.to_arrays` (e.g. loaded from the annotation sidecar),
+            if given, no file would be read
+        """
+        self.rec_fp = rec_fp
+        self.ann_ext = ann_ext
+        self._sample = None
+        self._rpeaks = None
+        self._af_critical_inds = None
+        if arrays is not None:
+            self.sig_len = int(arrays["sig_len"])
+            self.label = str(arrays["label"])
+            self._sample = arrays["sample"].astype(int)
+            self._rpeaks = arrays["rpeaks"].astype(int)
+            self._af_critical_inds = (arrays["af_start_inds"].astype(int), arrays["af_end_inds"].astype(int))
+            return
+        header = wfdb.rdheader(rec_fp)
+        self.sig_len = header.sig_len
+        self.label = header.comments[0]  # full name of the label
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        the (compact) arrays of the bundle, to be saved in the annotation sidecar
+        """
+        af_start_inds, af_end_inds = self.af_critical_inds
+        return {
+            "sig_len": np.array(self.sig_len),
+            "label": np.array(self.label),
+            "sample": self._sample.astype(np.int32),
+            "rpeaks": self._rpeaks.astype(np.int32),
+            "af_start_inds": af_start_inds.astype(np.int32),
+            "af_end_inds": af_end_inds.astype(np.int32),
+        }
+
+    def _read_ann(self) -> NoReturn:
+        """
+        read the annotation file, keeping only the fields in use
+        """
+        ann = wfdb.rdann(self.rec_fp, extension=self.ann_ext)
+        self._sample = ann.sample
+        self._rpeaks = ann.sample[np.isin(ann.symbol, list(WFDB_Beat_Annotations.keys()))]
+        aux_note = np.array(ann.aux_note)
+        af_start_inds = np.where((aux_note=="(AFIB") | (aux_note=="(AFL"))[0]  # ref. NOTE 3. of `CPSC2021`
+        af_end_inds = np.where(aux_note=="(N")[0]
+        assert len(af_start_inds) == len(af_end_inds), \
+            "unequal number of af period start indices and af period end indices"
+        self._af_critical_inds = (af_start_inds, af_end_inds)
+
+    @property
+    def rpeaks(self) -> np.ndarray:
+        """
+        positions (in terms of samples) of the rpeaks of the whole record
+        """
+        if self._sample is None:
+            self._read_ann()
+        return self._rpeaks
+
+    @property
+    def af_critical_inds(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        indices (in the annotation) of the starts and ends of the af episodes
+        """
+        if self._sample is None:
+            self._read_ann()
+        return self._af_critical_inds
+
+    @property
+    def af_intervals(self) -> np.ndarray:
+        """
+        af episodes (in terms of samples) of the whole record, of shape (n, 2)
+        """
+        af_start_inds, af_end_inds = self.af_critical_inds
+        return np.column_stack([self._sample[af_start_inds], self._sample[af_end_inds]])
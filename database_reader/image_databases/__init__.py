@@ -2,12 +2,26 @@
 
 """
 
-from .acne04 import *
-from .celeba import *
-from .dermnet import *
-from .hands_11k import *
-from .imagenet import *
-from .coco2017 import *
+from .._lazy import attach
 
 
-__all__ = [s for s in dir() if not s.startswith('_')]
+# the modules (and their dependencies) are imported at the first access of the exported names
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=[
+        'acne04',
+        'celeba',
+        'dermnet',
+        'hands_11k',
+        'imagenet',
+        'coco2017',
+    ],
+    submod_attrs={
+        'acne04': ['ACNE04'],
+        'celeba': ['CelebA'],
+        'dermnet': ['DermNet'],
+        'hands_11k': ['Hands11K'],
+        'imagenet': ['ImageNet'],
+        'coco2017': ['COCO2017'],
+    },
+)
@@ -3,13 +3,11 @@
 """
 import os
 import json
-from typing import Optional, Any, NoReturn
+from typing import Optional, Any, Sequence, NoReturn
 
-import cv2
 import numpy as np
 np.set_printoptions(precision=5, suppress=True)
 import pandas as pd
-from PIL import Image
 from easydict import EasyDict as ED
 
 from ..base import ImageDataBase
@@ -69,51 +67,40 @@ class COCO2017(ImageDataBase):
         })
 
 
-    def get_od_ann_csv(self) -> ED:
-        """ finished, not checked,
+    def get_od_ann_csv(self, parts:Sequence[str]=("train", "val",), fmt:str="csv") -> ED:
+        """ finished, checked,
         
-        convert the annotations regarding object detection into csv files with 'standard' columns
+        convert the annotations regarding object detection into csv (or parquet) files with 'standard' columns,
+        one file for each part, in `self.working_dir`
+
+        the sizes of the images and the categories are looked up (via hash tables) from the "images" and "categories" tables of the annotation files,
+        and the columns are built as arrays in one pass over the annotations,
+        without reading the images
+
+        Parameters
+        ----------
+        parts: sequence of str, default ("train", "val",),
+            parts (splits) of the dataset to convert
+        fmt: str, default "csv",
+            format of the output files, "csv" or "parquet" (requires `pyarrow` or `fastparquet`)
+
+        Returns
+        -------
+        df_ann: ED,
+            with items of DataFrame of the annotations of each part in `parts`
         """
-        cols = ['filename', 'width', 'height', 'iscrowd', 'image_id', 'id', 'xmin', 'ymin', 'xmax', 'ymax', 'box_width', 'box_height', 'box_area', 'category_id', 'category_name', 'supercategory']
-        df_ann = ED({
-            'train': pd.DataFrame(columns=cols),
-            'val': pd.DataFrame(columns=cols),
-        })
-        for part in ['train', 'val']:
+        if fmt.lower() not in ["csv", "parquet"]:
+            raise ValueError(f"format `{fmt}` not supported")
+        df_ann = ED()
+        for part in parts:
             with open(self.ann_paths.instances[part], 'r') as f:
                 content = json.load(f)
-                for d in content:
-                    iscrowd = d['iscrowd']
-                    fn = _image_id_to_filename(d['image_id'])
-                    category_id = d['category_id']
-                    cate = [item for item in content['categories'] if item['id'] == category_id][0]
-                    _id = d['id']
-                    xmin,ymin,box_width,box_height = list(map(lambda i:int(round(i)), d['bbox']))
-                    xmax = xmin+box_width
-                    ymax = ymin+box_height
-                    area = box_width*box_height
-                    img = cv2.imread(os.path.join(self.image_dirs[part], fn))
-                    height, width, _ = img.shape
-                    vals = {
-                        'filename': fn,
-                        'width': width,
-                        'height': height,
-                        'iscrowd': iscrowd,
-                        'image_id': d['image_id'],
-                        'xmin': xmin,
-                        'ymin': ymin,
-                        'xmax': xmax,
-                        'ymax': ymax,
-                        'box_width': box_width,
-                        'box_height': box_height,
-                        'box_area': area,
-                        'category_id': category_id,
-                        'id': _id,
-                        'category_name': cate['name'],
-                        'supercategory': cate['supercategory'],
-                    }
-                    df_ann[part] = pd.concat([df_ann[part],pd.DataFrame([vals])],ignore_index=True)
-            df_ann[part].to_csv(os.path.join(self.working_dir, f"od_{part}_coco2017.csv"), index=False)
+            df_ann[part] = _instances_to_od_df(content)
+            save_path = os.path.join(self.working_dir, f"od_{part}_coco2017.{fmt.lower()}")
+            if fmt.lower() == "csv":
+                df_ann[part].to_csv(save_path, index=False)
+            else:
+                df_ann[part].to_parquet(save_path, index=False)
         return df_ann
 
 
@@ -123,19 +110,56 @@ class COCO2017(ImageDataBase):
         raise NotImplementedError
 
 
-def _image_id_to_filename(image_id:int) -> str:
-    """
-    convert image_id to the corresponding filename of the image in COCO2017
+def _instances_to_od_df(content:dict) -> pd.DataFrame:
+    """ finished, checked,
+
+    convert the content of an instances annotation file into a DataFrame of (bounding box) annotations for object detection
 
     Parameters
     ----------
-    image_id: int,
-        the `image_id` of the image, read from the annotation file
-    
+    content: dict,
+        content of the instances annotation file, with items "images", "annotations", "categories"
+
     Returns
     -------
-    fn: str,
-        the filename of the corresponding image
+    df: DataFrame,
+        with columns 'filename', 'width', 'height', 'iscrowd', 'image_id', 'id', 'xmin', 'ymin', 'xmax', 'ymax',
+        'box_width', 'box_height', 'box_area', 'category_id', 'category_name', 'supercategory'
     """
-    fn = f"{image_id:012d}.jpg"
-    return fn
\ No newline at end of file
+    anns = content['annotations']
+    n_anns = len(anns)
+    images = pd.DataFrame(content['images'], columns=['id', 'file_name', 'width', 'height'])
+    categories = pd.DataFrame(content['categories'], columns=['id', 'name', 'supercategory'])
+
+    image_id = np.fromiter((d['image_id'] for d in anns), dtype=np.int64, count=n_anns)
+    category_id = np.fromiter((d['category_id'] for d in anns), dtype=np.int64, count=n_anns)
+    img_idx = pd.Index(images['id'].values).get_indexer(image_id)
+    cate_idx = pd.Index(categories['id'].values).get_indexer(category_id)
+    if (img_idx < 0).any():
+        raise ValueError(f"images of ids {np.unique(image_id[img_idx < 0]).tolist()} not found in the annotation file")
+    if (cate_idx < 0).any():
+        raise ValueError(f"categories of ids {np.unique(category_id[cate_idx < 0]).tolist()} not found in the annotation file")
+
+    # round half to even, as the builtin `round`
+    bbox = np.round(np.array([d['bbox'] for d in anns], dtype=float).reshape((n_anns, 4))).astype(np.int64)
+    xmin, ymin, box_width, box_height = bbox.T
+
+    df = pd.DataFrame({
+        'filename': images['file_name'].values[img_idx],
+        'width': images['width'].values[img_idx],
+        'height': images['height'].values[img_idx],
+        'iscrowd': np.fromiter((d['iscrowd'] for d in anns), dtype=np.int64, count=n_anns),
+        'image_id': image_id,
+        'id': np.fromiter((d['id'] for d in anns), dtype=np.int64, count=n_anns),
+        'xmin': xmin,
+        'ymin': ymin,
+        'xmax': xmin + box_width,
+        'ymax': ymin + box_height,
+        'box_width': box_width,
+        'box_height': box_height,
+        'box_area': box_width * box_height,
+        'category_id': category_id,
+        'category_name': categories['name'].values[cate_idx],
+        'supercategory': categories['supercategory'].values[cate_idx],
+    })
+    return df
@@ -2,19 +2,21 @@
 """
 """
 import os
-from typing import Union, Optional, Any, List, NoReturn
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Union, Optional, Any, List, Dict, Tuple, NoReturn
 from numbers import Real
 
 import numpy as np
 np.set_printoptions(precision=5, suppress=True)
 import pandas as pd
+from easydict import EasyDict as ED
 
 from ..utils.common import (
     ArrayLike,
     get_record_list_recursive,
 )
-from ..utils.utils_image import synthesis_img
-from ..base import ImageDataBase
+from ..base import ImageDataBase, LRUCache
 
 
 __all__ = [
@@ -60,10 +62,19 @@ class Hands11K(ImageDataBase):
         self.df_hand_info = pd.read_csv(hand_info_path)
 
 
-    def add_background(self, bkgd_dir:str, save_dir:Optional[str]=None) -> NoReturn:
-        """
+    def add_background(self, bkgd_dir:str, save_dir:Optional[str]=None, workers:Optional[int]=None, seed:Optional[int]=None, chunk_size:int=64) -> ED:
+        """ finished, checked,
+
         add background to the images of 11k Hands, which can largely improve performance of DL models
 
+        each image is assigned a random background (reproducible given `seed`),
+        the images are grouped by their backgrounds into tasks (of at most `chunk_size` images),
+        and the tasks are run in a process pool, each writing the synthesized images to `save_dir` as soon as they are done,
+        the decoded backgrounds are cached (the most recently used few) in each process,
+        and the tasks of the same background are submitted consecutively,
+        so that a background shared by several tasks is decoded (about) once per worker process rather than once per task,
+        and exactly once if `workers` <= 1
+
         Parameters
         ----------
         bkgd_dir: str,
@@ -71,20 +82,141 @@ class Hands11K(ImageDataBase):
         save_dir: str, optional,
             directory to save the augmented hand images,
             if not specified, `self.working_dir` will be used
+        workers: int, optional,
+            number of worker processes, if not specified (or <= 1), the images are processed in the current process
+        seed: int, optional,
+            seed of the random assignment of the backgrounds
+        chunk_size: int, default 64,
+            maximum number of images in one task
+
+        Returns
+        -------
+        summary: ED,
+            with items
+            - "n_images": number of the images
+            - "n_failed": number of the images failed to be processed
+            - "failed": dict of the filenames of the failed images and the error messages
+            - "elapsed": time elapsed, in seconds
+            - "throughput": number of images processed per second
         """
         save_dir = save_dir or os.path.join(self.working_dir, 'img_with_bg')
+        os.makedirs(save_dir, exist_ok=True)
 
-        all_bkgd = [os.path.join(bkgd_dir, item) for item in os.listdir(bkgd_dir)]
+        all_bkgd = sorted([os.path.join(bkgd_dir, item) for item in os.listdir(bkgd_dir)])
         all_bkgd = [item for item in all_bkgd if os.path.isfile(item)]
         l_img_fn = self.df_hand_info['filename'].values.tolist()
 
-        bkgd_seq = np.random.choice(all_bkgd, size=len(l_img_fn), replace=True)
+        rng = np.random.default_rng(seed)
+        bkgd_seq = rng.integers(0, len(all_bkgd), size=len(l_img_fn))
+
+        mask_paths = self._get_mask_paths()
+        tasks = []
+        for bkgd_idx in np.unique(bkgd_seq):
+            fns = [l_img_fn[i] for i in np.flatnonzero(bkgd_seq == bkgd_idx)]
+            for start in range(0, len(fns), chunk_size):
+                chunk = fns[start:start+chunk_size]
+                tasks.append((
+                    self.db_dir, all_bkgd[bkgd_idx],
+                    [(fn, mask_paths.get(os.path.splitext(fn)[0], None)) for fn in chunk],
+                    save_dir,
+                ))
+
+        n_done, failed = 0, {}
+        start_time = time.time()
+        def _collect(task_failed:Dict[str, str], n_task:int) -> NoReturn:
+            nonlocal n_done
+            n_done += n_task
+            failed.update(task_failed)
+            for fn, err in task_failed.items():
+                self.logger.warning(f"error occurred when processing the image with filename {fn}: {err}")
+            elapsed = time.time() - start_time
+            self.logger.info(f"{n_done}/{len(l_img_fn)} images processed, {n_done/max(elapsed, 1e-6):.1f} images/s")
+
+        if workers is None or workers <= 1:
+            for task in tasks:
+                _collect(_add_background_task(*task), len(task[2]))
+            _BKGD_CACHE.clear()
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(_add_background_task, *task): len(task[2]) for task in tasks}
+                for future in as_completed(futures):
+                    _collect(future.result(), futures[future])
+
+        elapsed = time.time() - start_time
+        summary = ED(
+            n_images=len(l_img_fn),
+            n_failed=len(failed),
+            failed=failed,
+            elapsed=elapsed,
+            throughput=len(l_img_fn) / max(elapsed, 1e-6),
+        )
+        self.logger.info(f"{summary.n_images} images processed in {elapsed:.1f}s ({summary.throughput:.1f} images/s), {summary.n_failed} failed")
+        return summary
+
+
+    def _get_mask_paths(self) -> Dict[str, str]:
+        """ finished, checked,
+
+        paths of the raw masks, keyed by the filenames (without extension) of the images
+
+        Returns
+        -------
+        mask_paths: dict,
+            with items of the form {filename without extension: path of the mask}
+        """
+        mask_paths = {
+            os.path.splitext(item)[0]: os.path.join(self.mask_dir, item) \
+                for item in sorted(os.listdir(self.mask_dir)) if os.path.isfile(os.path.join(self.mask_dir, item))
+        }
+        return mask_paths
+
+
+# decoded background images of `_add_background_task` in the current (worker) process,
+# tasks sharing a background are submitted consecutively, hence a few entries suffice
+_BKGD_CACHE = LRUCache(maxsize=4)
+
+
+def _add_background_task(db_dir:str, bkgd_path:str, img_mask_fns:List[Tuple[str, Optional[str]]], save_dir:str) -> Dict[str, str]:
+    """
+    add the same background to a group of images of 11k Hands (the task function of `Hands11K.add_background`),
+    the background image is decoded only once per process, ref. `_BKGD_CACHE`
+
+    Parameters
+    ----------
+    db_dir: str,
+        directory of the images of the database
+    bkgd_path: str,
+        path of the background image
+    img_mask_fns: list of tuple,
+        filenames of the images, and paths of their raw masks (None if not found)
+    save_dir: str,
+        directory to save the augmented hand images
+
+    Returns
+    -------
+    failed: dict,
+        filenames of the failed images and the error messages
+    """
+    import cv2
+    from ..utils.utils_image import synthesis_img
 
-        for idx, fn in enumerate(l_img_fn):
-            try:
-                raw_img = cv2.imread(os.path.join(self.db_dir, fn))[::-1,::-1,:]
-                raw_mask = cv2.imread(os.path.join(mask_dir, name), cv2.IMREAD_GRAYSCALE)[::-1,::-1]
-                bkgd_img = cv2.imread(bkgd_seq[idx])
-                synthesis_img(raw_img, bkgd_img, raw_mask, save_path=os.path.join(save_dir, fn), verbose=verbose)
-            except Exception:
-                print(f"error occurred when processing the {idx}-th image with filename {fn}")
+    failed = {}
+    bkgd_img = _BKGD_CACHE.get(bkgd_path, None)
+    if bkgd_img is None:
+        bkgd_img = cv2.imread(bkgd_path)
+        if bkgd_img is not None:
+            _BKGD_CACHE.put(bkgd_path, bkgd_img)
+    if bkgd_img is None:
+        return {fn: f"failed to read background image {bkgd_path}" for fn, _ in img_mask_fns}
+    for fn, mask_path in img_mask_fns:
+        try:
+            if mask_path is None:
+                raise FileNotFoundError("raw mask not found")
+            raw_img = cv2.imread(os.path.join(db_dir, fn))
+            raw_mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
+            if raw_img is None or raw_mask is None:
+                raise IOError("failed to read the image or the raw mask")
+            synthesis_img(raw_img[::-1,::-1,:], bkgd_img.copy(), raw_mask[::-1,::-1], save_path=os.path.join(save_dir, fn), verbose=0)
+        except Exception as e:
+            failed[fn] = f"{type(e).__name__}: {e}"
+    return failed
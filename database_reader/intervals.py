@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+NumPy-backed operations on intervals of sample indices,
+typically rhythm annotations of long-term ECG records
+
+intervals are stored as sorted int arrays of shape (n, 2), each row being [start, end),
+labelled intervals (runs) as int arrays of shape (n, 3), each row being [start, end, label],
+which is also the compact run-length representation of masks
+"""
+from typing import Union, Optional, Sequence, Dict
+from numbers import Real
+
+import numpy as np
+
+
+__all__ = [
+    "as_intervals",
+    "union_intervals",
+    "clip_intervals",
+    "shift_intervals",
+    "resample_intervals",
+    "intervals_to_mask",
+    "label_intervals",
+    "runs_to_mask",
+    "mask_to_runs",
+]
+
+
+def as_intervals(intervals:Union[Sequence[Sequence[int]], np.ndarray], ncols:int=2) -> np.ndarray:
+    """ finished, checked,
+
+    convert a list of intervals (or runs) to an int array sorted by starts
+
+    Parameters
+    ----------
+    intervals: sequence of sequence of int, or ndarray,
+        the intervals, in the form of [[a, b], ...] (or [[a, b, label], ...])
+    ncols: int, default 2,
+        number of columns, 2 for intervals, 3 for runs
+
+    Returns
+    -------
+    arr: ndarray,
+        of shape (n, `ncols`) and dtype int64
+    """
+    arr = np.asarray(intervals, dtype=np.int64).reshape(-1, ncols)
+    if arr.shape[0] > 1 and (np.diff(arr[:, 0]) < 0).any():
+        arr = arr[np.argsort(arr[:, 0], kind="stable")]
+    return arr
+
+
+def union_intervals(intervals:Union[Sequence[Sequence[int]], np.ndarray], join_book_endeds:bool=True) -> np.ndarray:
+    """ finished, checked,
+
+    union of the intervals, i.e. merge overlapping (and book-ended) intervals,
+    degenerate intervals (start >= end) are dropped
+
+    Parameters
+    ----------
+    intervals: sequence of sequence of int, or ndarray,
+        the intervals
+    join_book_endeds: bool, default True,
+        if True, intervals like [a, b] and [b, c] are merged into [a, c]
+
+    Returns
+    -------
+    arr: ndarray,
+        sorted and disjoint intervals, of shape (n, 2)
+    """
+    arr = as_intervals(intervals)
+    arr = arr[arr[:, 0] < arr[:, 1]]
+    if arr.shape[0] <= 1:
+        return arr
+    prev_ends = np.maximum.accumulate(arr[:, 1])[:-1]
+    if join_book_endeds:
+        new_group = np.r_[True, arr[1:, 0] > prev_ends]
+    else:
+        new_group = np.r_[True, arr[1:, 0] >= prev_ends]
+    group_starts = np.flatnonzero(new_group)
+    ends = np.maximum.reduceat(arr[:, 1], group_starts)
+    return np.column_stack([arr[group_starts, 0], ends])
+
+
+def clip_intervals(intervals:Union[Sequence[Sequence[int]], np.ndarray], start:Optional[int]=None, end:Optional[int]=None, drop_degenerate:bool=True) -> np.ndarray:
+    """ finished, checked,
+
+    clip the intervals (or runs) to [start, end],
+    equivalent to `generalized_intervals_intersection(intervals, [[start, end]])` for disjoint intervals
+
+    Parameters
+    ----------
+    intervals: sequence of sequence of int, or ndarray,
+        the intervals, or runs (with labels in the 3rd column)
+    start: int, optional,
+        start of the clipping range, defaults to no clipping at the start
+    end: int, optional,
+        end of the clipping range, defaults to no clipping at the end
+    drop_degenerate: bool, default True,
+        if True, intervals that become empty (start >= end) after clipping are dropped
+
+    Returns
+    -------
+    arr: ndarray,
+        the clipped intervals (or runs)
+    """
+    arr = np.array(intervals, dtype=np.int64)
+    arr = arr.reshape(-1, arr.shape[-1] if arr.ndim > 1 else 2)
+    if start is not None:
+        np.maximum(arr[:, 0], start, out=arr[:, 0])
+        np.maximum(arr[:, 1], start, out=arr[:, 1])
+    if end is not None:
+        np.minimum(arr[:, 0], end, out=arr[:, 0])
+        np.minimum(arr[:, 1], end, out=arr[:, 1])
+    if drop_degenerate:
+        arr = arr[arr[:, 0] < arr[:, 1]]
+    return arr
+
+
+def shift_intervals(intervals:Union[Sequence[Sequence[int]], np.ndarray], offset:int) -> np.ndarray:
+    """ finished, checked,
+
+    shift the intervals (or runs) by `offset`, labels of runs are kept
+
+    Parameters
+    ----------
+    intervals: sequence of sequence of int, or ndarray,
+        the intervals, or runs
+    offset: int,
+        the offset to add to the bounds of the intervals
+
+    Returns
+    -------
+    arr: ndarray,
+        the shifted intervals (or runs)
+    """
+    arr = np.array(intervals, dtype=np.int64)
+    arr = arr.reshape(-1, arr.shape[-1] if arr.ndim > 1 else 2)
+    arr[:, :2] += offset
+    return arr
+
+
+def resample_intervals(intervals:Union[Sequence[Sequence[int]], np.ndarray], fs:Real, new_fs:Real, epsilon:float=1e-7) -> np.ndarray:
+    """ finished, checked,
+
+    convert the bounds of the intervals (or runs) from sampling frequency `fs` to `new_fs`,
+    labels of runs are kept
+
+    Parameters
+    ----------
+    intervals: sequence of sequence of int, or ndarray,
+        the intervals, or runs
+    fs: real number,
+        sampling frequency of the intervals
+    new_fs: real number,
+        the new sampling frequency
+    epsilon: float, default 1e-7,
+        dealing with round(0.5) = 0, hence keeping accordance with output length of `resample_poly`
+
+    Returns
+    -------
+    arr: ndarray,
+        the resampled intervals (or runs)
+    """
+    arr = np.array(intervals, dtype=np.int64)
+    arr = arr.reshape(-1, arr.shape[-1] if arr.ndim > 1 else 2)
+    if fs != new_fs:
+        arr[:, :2] = np.round(arr[:, :2] * new_fs / fs + epsilon).astype(np.int64)
+    return arr
+
+
+def label_intervals(intervals:Dict[str, Union[Sequence[Sequence[int]], np.ndarray]], class_map:Dict[str, int]) -> np.ndarray:
+    """ finished, checked,
+
+    merge intervals of different classes into runs sorted by starts
+
+    Parameters
+    ----------
+    intervals: dict,
+        intervals of each class, in the form of {class: l_itv, ...}
+    class_map: dict,
+        mapping from the classes to (int) labels
+
+    Returns
+    -------
+    runs: ndarray,
+        of shape (n, 3), each row being [start, end, label]
+    """
+    runs = [
+        np.column_stack([as_intervals(l_itv), np.full((len(l_itv),), class_map[k], dtype=np.int64)]) \
+            for k, l_itv in intervals.items() if len(l_itv) > 0
+    ]
+    if len(runs) == 0:
+        return np.zeros((0, 3), dtype=np.int64)
+    return as_intervals(np.concatenate(runs), ncols=3)
+
+
+def runs_to_mask(runs:Union[Sequence[Sequence[int]], np.ndarray], siglen:int, fill_value:int=0, start:int=0, dtype:type=np.int8) -> np.ndarray:
+    """ finished, checked,
+
+    expand runs to a mask via `np.repeat`, without filling interval by interval
+
+    Parameters
+    ----------
+    runs: sequence of sequence of int, or ndarray,
+        the runs, each being [start, end, label], should be disjoint
+    siglen: int,
+        length of the mask
+    fill_value: int, default 0,
+        value of the mask out of the runs
+    start: int, default 0,
+        (absolute) index of the first element of the mask
+    dtype: type, default np.int8,
+        dtype of the mask
+
+    Returns
+    -------
+    mask: ndarray,
+        the mask, of shape (siglen,)
+    """
+    runs = clip_intervals(as_intervals(runs, ncols=3), start, start+siglen)
+    if runs.shape[0] == 0:
+        return np.full((siglen,), fill_value, dtype=dtype)
+    runs[:, :2] -= start
+    # for overlapping runs, the later ones are truncated
+    run_starts = np.maximum(runs[:, 0], np.r_[0, np.maximum.accumulate(runs[:-1, 1])])
+    run_ends = np.maximum(runs[:, 1], run_starts)
+    # bounds of the runs together with the gaps in between
+    bounds = np.column_stack([run_starts, run_ends]).ravel()
+    bounds = np.r_[0, bounds, siglen]
+    values = np.column_stack([np.full_like(runs[:, 2], fill_value), runs[:, 2]]).ravel()
+    values = np.r_[values, fill_value]
+    return np.repeat(values.astype(dtype), np.diff(bounds))
+
+
+def intervals_to_mask(intervals:Union[Sequence[Sequence[int]], np.ndarray], siglen:int, value:int=1, fill_value:int=0, start:int=0, dtype:type=np.int8) -> np.ndarray:
+    """ finished, checked,
+
+    convert (unlabelled) intervals to a mask,
+    using cumsum of the +1/-1 bound indicators, hence intervals are allowed to overlap
+
+    Parameters
+    ----------
+    intervals: sequence of sequence of int, or ndarray,
+        the intervals
+    siglen: int,
+        length of the mask
+    value: int, default 1,
+        value of the mask in the intervals
+    fill_value: int, default 0,
+        value of the mask out of the intervals
+    start: int, default 0,
+        (absolute) index of the first element of the mask
+    dtype: type, default np.int8,
+        dtype of the mask
+
+    Returns
+    -------
+    mask: ndarray,
+        the mask, of shape (siglen,)
+    """
+    arr = clip_intervals(intervals, start, start+siglen) - start
+    indicator = np.zeros((siglen+1,), dtype=np.int32)
+    np.add.at(indicator, arr[:, 0], 1)
+    np.add.at(indicator, arr[:, 1], -1)
+    covered = np.cumsum(indicator[:-1]) > 0
+    mask = np.full((siglen,), fill_value, dtype=dtype)
+    mask[covered] = value
+    return mask
+
+
+def mask_to_runs(mask:np.ndarray, start:int=0, skip_value:Optional[int]=None) -> np.ndarray:
+    """ finished, checked,
+
+    run-length encoding of a mask
+
+    Parameters
+    ----------
+    mask: ndarray,
+        the 1d mask
+    start: int, default 0,
+        (absolute) index of the first element of the mask
+    skip_value: int, optional,
+        if set, runs with this value (e.g. the background) are dropped
+
+    Returns
+    -------
+    runs: ndarray,
+        of shape (n, 3), each row being [start, end, label]
+    """
+    mask = np.asarray(mask).ravel()
+    if mask.shape[0] == 0:
+        return np.zeros((0, 3), dtype=np.int64)
+    change_points = np.flatnonzero(mask[1:] != mask[:-1]) + 1
+    run_starts = np.r_[0, change_points]
+    run_ends = np.r_[change_points, mask.shape[0]]
+    runs = np.column_stack([run_starts + start, run_ends + start, mask[run_starts].astype(np.int64)])
+    if skip_value is not None:
+        runs = runs[runs[:, 2] != skip_value]
+    return runs
@@ -3,11 +3,24 @@
 docstring, to write
 """
 
-from .shhs import *
-from .chat import *
-from .mesa import *
-from .oya import *
-from .numom2b import *
+from .._lazy import attach
 
 
-__all__ = [s for s in dir() if not s.startswith('_')]
+# the modules (and their dependencies) are imported at the first access of the exported names
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=[
+        'shhs',
+        'chat',
+        'mesa',
+        'oya',
+        'numom2b',
+    ],
+    submod_attrs={
+        'shhs': ['SHHS'],
+        'chat': ['CHAT'],
+        'mesa': ['MESA'],
+        'oya': ['OYA'],
+        'numom2b': ['nuMoM2b'],
+    },
+)
@@ -3,22 +3,25 @@
 docstring, to write
 """
 import os
+import json
+import shutil
 from datetime import datetime
-from typing import Union, Optional, Any, List, Dict, Iterable, Sequence, NoReturn
+from typing import Union, Optional, Any, List, Tuple, Dict, Iterable, Sequence, NoReturn
 from numbers import Real
 
 import numpy as np
 np.set_printoptions(precision=5, suppress=True)
 import pandas as pd
-import xmltodict as xtd
-from pyedflib import EdfReader
+from easydict import EasyDict as ED
 
 from ..utils.common import (
     ArrayLike,
     get_record_list_recursive,
 )
 from ..utils.utils_universal import intervals_union
-from ..base import NSRRDataBase
+from ..base import NSRRDataBase, LRUCache
+from ..version import version as __version__
+from ..sleep_events import make_sleep_events, sleep_events_from_pairs, sleep_events_to_df
 
 
 __all__ = [
@@ -203,6 +206,8 @@ class SHHS(NSRRDataBase):
     [9] http://healthysleep.med.harvard.edu/sleep-apnea/diagnosing-osa/understanding-results
     [10] https://sleepdata.org/datasets/shhs/pages/full-description.md
     """
+    _ann_sidecar_version = 2  # beat types stored as int8
+
     def __init__(self, db_dir:str, working_dir:Optional[str]=None, verbose:int=2, **kwargs:Any) -> NoReturn:
         """
         
@@ -233,13 +238,13 @@ class SHHS(NSRRDataBase):
         self.form_paths()
         
         self.fs = None
-        self.file_opened = None
 
-        # stats
-        try:
-            self.rec_with_hrv_ann = [f"shhs{int(row['visitnumber'])}-{int(row['nsrrid'])}" for _,row in self.load_hrv_summary_ann().iterrows()]
-        except:
-            self.rec_with_hrv_ann = []
+        # columnar stores of the cohort-wide HRV csv files, built lazily in `working_dir`
+        self._hrv_stores = {}
+        # row offsets of each record in the stores, {file path: {(visitnumber, nsrrid): (start, stop)}}
+        self._hrv_offsets = {}
+        # beat tables (from the wave delineation annotations) of the recently used records
+        self._beat_cache = LRUCache(maxsize=kwargs.get("beat_cache_size", 64))
 
         self.all_signals = [
             "SaO2", "H.R.", "EEG(sec)", "ECG", "EMG", "EOG(L)", "EOG(R)", "EEG", "SOUND", "AIRFLOW", "THOR RES", "ABDO RES", "POSITION", "LIGHT", "NEW AIR", "OX stat",
@@ -446,6 +451,19 @@ class SHHS(NSRRDataBase):
         self.event_profusion_ann_path = os.path.join(self.db_dir, "polysomnography", "annotations-events-profusion")
 
 
+    def _ls_rec(self) -> NoReturn:
+        """ finished, checked,
+
+        find all records (with PSG data) in `self.psg_data_path`
+        """
+        self._all_records = []
+        for visit in ["shhs1", "shhs2"]:
+            folder = os.path.join(self.psg_data_path, visit)
+            if not os.path.isdir(folder):
+                continue
+            self._all_records += sorted([os.path.splitext(fn)[0] for fn in os.listdir(folder) if fn.endswith(".edf")])
+
+
     def update_sleep_stage_names(self) -> NoReturn:
         """ finished,
 
@@ -532,10 +550,8 @@ class SHHS(NSRRDataBase):
             the sampling frequency of the signal `sig` of the record `rec`
         """
         frp = self.match_full_rec_path(rec, rec_path)
-        self.safe_edf_file_operation("open", frp)
-        chn_num = self.file_opened.getSignalLabels().index(self.match_channel(sig))
-        fs = self.file_opened.getSampleFrequency(chn_num)
-        self.safe_edf_file_operation("close")
+        header = self._get_edf_header(frp)
+        fs = header.fs[header.labels.index(self.match_channel(sig))]
         return fs
 
     
@@ -558,9 +574,7 @@ class SHHS(NSRRDataBase):
             the number of channel of the signal `sig` of the record `rec`
         """
         frp = self.match_full_rec_path(rec, rec_path)
-        self.safe_edf_file_operation("open", frp)
-        chn_num = self.file_opened.getSignalLabels().index(self.match_channel(sig))
-        self.safe_edf_file_operation("close")
+        chn_num = self._get_edf_header(frp).labels.index(self.match_channel(sig))
         return chn_num
 
 
@@ -621,16 +635,85 @@ class SHHS(NSRRDataBase):
         elif rec_type.split("_")[0] in ["hrv", "eeg"]:
             rp = folder_or_file[rec_type]
         else:
-            rp = os.path.join(folder_or_file[rec_type]+rec.split("-")[0], rec+extension[rec_type])
+            rp = os.path.join(folder_or_file[rec_type], rec.split("-")[0], rec+extension[rec_type])
 
         return rp
 
 
-    def database_stats(self) -> NoReturn:
+    def database_stats(self, records:Optional[Sequence[str]]=None, workers:int=4, executor:str="process", resume:bool=True) -> pd.DataFrame:
+        """ finished, checked,
+
+        statistics of the records (duration, channels, sleep stages, apnea events, etc.),
+        computed in parallel via `self.map_records`, and checkpointed in `working_dir`
+
+        Parameters
+        ----------
+        records: sequence of str, optional,
+            names of the records, defaults to all records with PSG data
+        workers: int, default 4,
+            number of workers of the pool
+        executor: str, default "process",
+            type of the pool, "thread" or "process"
+        resume: bool, default True,
+            if True, statistics of records computed in previous (interrupted) runs are reused
+
+        Returns
+        -------
+        df_stats: DataFrame,
+            statistics of the records, one row per record
         """
+        df_stats, failed = self.map_records("_rec_stats", records=records, workers=workers, executor=executor, name="database_stats", resume=resume)
+        if len(failed) > 0:
+            print(f"statistics of {len(failed)} record(s) failed to compute, see the log file for details")
+        return df_stats
+
+
+    def _rec_stats(self, rec:str) -> Dict[str, Real]:
+        """ finished, checked,
 
+        statistics of one record, the extractor of `self.database_stats`,
+        statistics whose source files are unavailable are NaN
+
+        Parameters
+        ----------
+        rec: str,
+            record name, typically in the form "shhs1-200001"
+
+        Returns
+        -------
+        stats: dict,
+            statistics of `rec`
         """
-        raise NotImplementedError
+        stats = {
+            "visitnumber": self.get_visit_number(rec),
+            "nsrrid": self.get_nsrrid(rec),
+            "duration_sec": np.nan,
+            "nb_channels": np.nan,
+            "ecg_fs": np.nan,
+            "nb_epochs": np.nan,
+            "sleep_sec": np.nan,
+            "nb_apnea_events": np.nan,
+            "ahi": np.nan,
+        }
+        stats.update({f"frac_{n}": np.nan for n in self.all_sleep_stage_names[:5]})
+        frp = self.match_full_rec_path(rec, rec_type="psg")
+        if os.path.isfile(frp):
+            header = self._get_edf_header(frp)
+            stats["duration_sec"] = header.duration
+            stats["nb_channels"] = len(header.labels)
+            if self.match_channel("ecg") in header.labels:
+                stats["ecg_fs"] = self.get_fs(rec, "ECG")
+        if os.path.isfile(self.match_full_rec_path(rec, rec_type="event")):
+            _, epochs = self.load_sleep_stage_ann(rec, source="event", sleep_stage_protocol="aasm", with_stage_names=False, return_epochs=True)
+            stats["nb_epochs"] = len(epochs)
+            for i, n in enumerate(self.all_sleep_stage_names[:5]):
+                stats[f"frac_{n}"] = np.mean(epochs==i) if len(epochs) > 0 else np.nan
+            stats["sleep_sec"] = self.sleep_epoch_len_sec * np.sum(epochs!=0)
+            df_apnea = self.load_event_ann(rec, event_concepts=self.long_event_names_from_event[:4])
+            stats["nb_apnea_events"] = len(df_apnea)
+            if stats["sleep_sec"] > 0:
+                stats["ahi"] = stats["nb_apnea_events"] / (stats["sleep_sec"] / 3600)
+        return stats
 
 
     def database_info(self, detailed:bool=False) -> NoReturn:
@@ -670,50 +753,56 @@ class SHHS(NSRRDataBase):
 
         """
         frp = self.match_full_rec_path(rec, rec_path, rec_type="psg")
-        self.safe_edf_file_operation("open", frp)
-        for chn,lb in enumerate(self.file_opened.getSignalLabels()):
+        header = self._get_edf_header(frp)
+        for chn,lb in enumerate(header.labels):
             print("SignalLabel:",lb)
-            print("Prefilter:",self.file_opened.getPrefilter(chn))
-            print("Transducer:",self.file_opened.getTransducer(chn))
-            print("PhysicalDimension:",self.file_opened.getPhysicalDimension(chn))
-            print("SampleFrequency:",self.file_opened.getSampleFrequency(chn))
+            print("Prefilter:",header.prefilter[chn])
+            print("Transducer:",header.transducer[chn])
+            print("PhysicalDimension:",header.physical_dimension[chn])
+            print("SampleFrequency:",header.fs[chn])
             print("*"*40)
-        self.safe_edf_file_operation("close")
 
 
-    def load_psg_data(self, rec:str, channel:str="all", rec_path:Optional[str]=None) -> Dict[str, np.ndarray]:
+    def load_psg_data(self, rec:str, channel:Union[str,Sequence[str]]="all", rec_path:Optional[str]=None, start_sec:Real=0, duration_sec:Optional[Real]=None, dtype:type=np.float64) -> Dict[str, np.ndarray]:
         """ finished,
 
         Parameters
         ----------
         rec: str,
             record name, typically in the form "shhs1-200001"
-        channel: str, default "all",
-            name of the channel of PSG,
-            if is "all", then all channels will be returned
+        channel: str or sequence of str, default "all",
+            name(s) of the channel(s) of PSG,
+            if is "all", then all channels will be returned,
+            only the selected channels are read from the EDF file
         rec_path: str, optional,
             path of the file which contains the psg data,
             if not given, default path will be used
+        start_sec: real number, default 0,
+            start time (in seconds) of the data to load
+        duration_sec: real number, optional,
+            duration (in seconds) of the data to load,
+            if not given, data till the end of the record will be loaded
+        dtype: type, default np.float64,
+            dtype of the data, e.g. np.float32
         
         Returns
         -------
         dict, psg data
         """
-        chn = self.match_channel(channel) if channel.lower() != "all" else "all"
+        if isinstance(channel, str) and channel.lower() == "all":
+            chn = None
+        elif isinstance(channel, str):
+            chn = [self.match_channel(channel)]
+        else:
+            chn = [self.match_channel(c) for c in channel]
         frp = self.match_full_rec_path(rec, rec_path, rec_type="psg")
-        self.safe_edf_file_operation("open", frp)
 
-        data_dict = {k: self.file_opened.readSignal(idx) for idx,k in enumerate(self.file_opened.getSignalLabels())}
+        data_dict = self._read_edf_signals(frp, channels=chn, start_sec=start_sec, duration_sec=duration_sec, dtype=dtype)
 
-        self.safe_edf_file_operation("close")
-
-        if chn == "all":
-            return data_dict
-        else:
-            return {chn: data_dict[chn]}
+        return data_dict
 
 
-    def load_ecg_data(self, rec:str, rec_path:Optional[str]=None) -> np.ndarray:
+    def load_ecg_data(self, rec:str, rec_path:Optional[str]=None, start_sec:Real=0, duration_sec:Optional[Real]=None, dtype:type=np.float64) -> np.ndarray:
         """ finished,
 
         Parameters
@@ -723,15 +812,22 @@ class SHHS(NSRRDataBase):
         rec_path: str, optional,
             path of the file which contains the ecg data,
             if not given, default path will be used
+        start_sec: real number, default 0,
+            start time (in seconds) of the data to load
+        duration_sec: real number, optional,
+            duration (in seconds) of the data to load,
+            if not given, data till the end of the record will be loaded
+        dtype: type, default np.float64,
+            dtype of the data, e.g. np.float32
         
         Returns
         -------
 
         """
-        return self.load_psg_data(rec=rec, channel="ecg", rec_path=rec_path)[self.match_channel("ecg")]
+        return self.load_psg_data(rec=rec, channel="ecg", rec_path=rec_path, start_sec=start_sec, duration_sec=duration_sec, dtype=dtype)[self.match_channel("ecg")]
 
 
-    def load_event_ann(self, rec:str, event_ann_path:Optional[str]=None, simplify:bool=False) -> pd.DataFrame:
+    def load_event_ann(self, rec:str, event_ann_path:Optional[str]=None, simplify:bool=False, event_types:Optional[Sequence[str]]=None, event_concepts:Optional[Sequence[str]]=None) -> pd.DataFrame:
         """ finished,
 
         Parameters
@@ -741,25 +837,40 @@ class SHHS(NSRRDataBase):
         event_ann_path: str, optional,
             path of the file which contains the events-nsrr annotations,
             if not given, default path will be used
+        simplify: bool, default False,
+            if True, the prefixes of "EventType" and "EventConcept" (e.g. "Stages|") are removed
+        event_types: sequence of str, optional,
+            if specified, only events of these types (e.g. "Stages|Stages") are kept,
+            others are skipped while parsing
+        event_concepts: sequence of str, optional,
+            if specified, only events of these concepts (e.g. "Hypopnea|Hypopnea") are kept,
+            others are skipped while parsing
         
         Returns
         -------
 
         """
         file_path = self.match_full_rec_path(rec, event_ann_path, rec_type="event")
-        with open(file_path) as fd:
-            doc = xtd.parse(fd.read())
-        df_events = pd.DataFrame(doc["PSGAnnotation"]["ScoredEvents"]["ScoredEvent"][1:])
+        keep = {}
+        if event_types is not None:
+            keep["EventType"] = event_types
+        if event_concepts is not None:
+            keep["EventConcept"] = event_concepts
+        df_events, _ = self._iterparse_xml_events(
+            file_path,
+            numeric_fields=["Start", "Duration", "SpO2Nadir", "SpO2Baseline"],
+            keep=keep,
+            skip_first=True,
+            fields=["EventType", "EventConcept", "Start", "Duration", "SignalLocation"],
+        )
         if simplify:
             df_events["EventType"] = df_events["EventType"].apply(lambda s: s.split("|")[1])
             df_events["EventConcept"] = df_events["EventConcept"].apply(lambda s: s.split("|")[1])
-        for c in ["Start", "Duration", "SpO2Nadir", "SpO2Baseline"]:
-            df_events[c] = df_events[c].apply(self.str_to_real_number)
 
         return df_events
 
 
-    def load_event_profusion_ann(self, rec:str, event_profusion_ann_path:Optional[str]=None) -> dict:
+    def load_event_profusion_ann(self, rec:str, event_profusion_ann_path:Optional[str]=None, event_names:Optional[Sequence[str]]=None) -> dict:
         """ finished,
 
         Parameters
@@ -769,6 +880,9 @@ class SHHS(NSRRDataBase):
         event_profusion_ann_path: str, optional,
             path of the file which contains the events-profusion annotations,
             if not given, default path will be used
+        event_names: sequence of str, optional,
+            if specified, only events of these names (e.g. "Hypopnea") are kept,
+            others are skipped while parsing
         
         Returns
         -------
@@ -777,20 +891,184 @@ class SHHS(NSRRDataBase):
             merge "sleep_stage_list" and "df_events" into one DataFrame
         """
         file_path = self.match_full_rec_path(rec, event_profusion_ann_path, rec_type="event_profusion")
-        with open(file_path) as fd:
-            doc = xtd.parse(fd.read())
-        sleep_stage_list = [int(ss) for ss in doc["CMPStudyConfig"]["SleepStages"]["SleepStage"]]
-        df_events = pd.DataFrame(doc["CMPStudyConfig"]["ScoredEvents"]["ScoredEvent"])
-        for c in ["Start", "Duration", "LowestSpO2", "Desaturation"]:
-            df_events[c] = df_events[c].apply(self.str_to_real_number)
+        df_events, lists = self._iterparse_xml_events(
+            file_path,
+            numeric_fields=["Start", "Duration", "LowestSpO2", "Desaturation"],
+            keep=None if event_names is None else {"Name": event_names},
+            list_tags=["SleepStage"],
+            fields=["Name", "Start", "Duration", "Input"],
+        )
         ret = {
-            "sleep_stage_list": sleep_stage_list,
+            "sleep_stage_list": lists["SleepStage"],
             "df_events": df_events
         }
 
         return ret
 
 
+    @property
+    def rec_with_hrv_ann(self) -> List[str]:
+        """ finished, checked,
+
+        records that have HRV annotations,
+        read from the row-offset index of the (columnar store of the) summary HRV annotations
+        """
+        rec_with_hrv_ann = []
+        for visit in [1, 2]:
+            file_path = self.match_full_rec_path(f"shhs{visit}-200001", None, rec_type="hrv_summary")
+            if not os.path.isfile(file_path):
+                continue
+            try:
+                index = self._get_hrv_store(file_path).index
+            except:
+                continue
+            rec_with_hrv_ann += [f"shhs{int(v)}-{int(n)}" for v, n in zip(index["visitnumber"], index["nsrrid"])]
+        return rec_with_hrv_ann
+
+
+    def _get_hrv_store(self, file_path:str) -> ED:
+        """ finished, checked,
+
+        get the columnar store of a cohort-wide HRV annotation csv file,
+        converting the csv file at the first call (or when the csv file, or the version of the package changes),
+        the store (in `working_dir`) consists of one memory-mapped .npy file per column,
+        with rows sorted by ("visitnumber", "nsrrid"), and an index of the row offsets of each record
+
+        Parameters
+        ----------
+        file_path: str,
+            path of the HRV annotation csv file
+
+        Returns
+        -------
+        store: ED,
+            with items
+            - "columns": list of the column names (in the order of the csv file)
+            - "data": dict of (memory-mapped) ndarrays of the columns
+            - "nulls": dict of boolean masks of null values of the string columns
+            - "order": indices restoring the original order of the rows of the csv file
+            - "index": structured ndarray with fields "visitnumber", "nsrrid", "start", "stop",
+            the offsets in "index" are also kept in `self._hrv_offsets[file_path]` as a dict,
+            in the form of {(visitnumber, nsrrid): (start, stop)}, with visitnumber 0 if the csv file has no such column
+        """
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        source = ED(version=__version__, source=file_path, mtime=stat.st_mtime, size=stat.st_size)
+        store = self._hrv_stores.get(file_path, None)
+        if store is not None and store.source == source:
+            return store
+        store_dir = os.path.join(self.working_dir, "hrv_stores", self.db_name, os.path.splitext(os.path.basename(file_path))[0])
+        try:
+            with open(os.path.join(store_dir, "meta.json"), "r") as f:
+                meta = ED(json.load(f))
+            if meta.source != source:
+                raise ValueError("outdated store")
+        except:
+            self._build_hrv_store(file_path, store_dir, source)
+            with open(os.path.join(store_dir, "meta.json"), "r") as f:
+                meta = ED(json.load(f))
+        store = ED(
+            source=meta.source,
+            columns=meta.columns,
+            data={c: np.load(os.path.join(store_dir, f"{i}.npy"), mmap_mode="r") for i, c in enumerate(meta.columns)},
+            nulls={c: np.load(os.path.join(store_dir, f"{meta.columns.index(c)}.nulls.npy")) for c in meta.str_columns},
+            order=np.load(os.path.join(store_dir, "order.npy"), mmap_mode="r"),
+            index=np.load(os.path.join(store_dir, "index.npy")),
+        )
+        self._hrv_stores[file_path] = store
+        self._hrv_offsets[file_path] = {
+            (int(visitnumber), int(nsrrid)): (int(start), int(stop)) \
+                for visitnumber, nsrrid, start, stop in store.index.tolist()
+        }
+        return store
+
+
+    def _build_hrv_store(self, file_path:str, store_dir:str, source:dict) -> NoReturn:
+        """ finished, checked,
+
+        convert a cohort-wide HRV annotation csv file into the columnar store in `store_dir`,
+        the csv file is parsed only once, with the C engine of pandas
+
+        Parameters
+        ----------
+        file_path: str,
+            path of the HRV annotation csv file
+        store_dir: str,
+            directory of the store
+        source: dict,
+            information (version, path, modification time, size) of the source csv file
+        """
+        self.logger.info(f"converting {file_path} into a columnar store in {store_dir}")
+        df = pd.read_csv(file_path, low_memory=False)
+        visitnumber = df["visitnumber"].values.astype(np.int64) if "visitnumber" in df.columns else np.zeros((len(df),), dtype=np.int64)
+        nsrrid = df["nsrrid"].values.astype(np.int64)
+        sort_inds = np.lexsort((nsrrid, visitnumber))
+        visitnumber, nsrrid = visitnumber[sort_inds], nsrrid[sort_inds]
+        if len(df) > 0:
+            starts = np.flatnonzero(np.r_[True, (np.diff(visitnumber)!=0) | (np.diff(nsrrid)!=0)])
+        else:
+            starts = np.zeros((0,), dtype=np.int64)
+        stops = np.r_[starts[1:], len(df)].astype(np.int64)
+        index = np.zeros((len(starts),), dtype=[("visitnumber", np.int64), ("nsrrid", np.int64), ("start", np.int64), ("stop", np.int64)])
+        index["visitnumber"], index["nsrrid"], index["start"], index["stop"] = visitnumber[starts], nsrrid[starts], starts, stops
+
+        tmp_dir = f"{store_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        columns, str_columns = df.columns.tolist(), []
+        for i, c in enumerate(columns):
+            values = df[c].to_numpy()[sort_inds]
+            if values.dtype.kind not in "biuf":  # strings, stored as fixed-width unicode
+                str_columns.append(c)
+                nulls = pd.isna(values)
+                values = np.where(nulls, "", values).astype(str)
+                np.save(os.path.join(tmp_dir, f"{i}.nulls.npy"), nulls)
+            np.save(os.path.join(tmp_dir, f"{i}.npy"), values)
+        np.save(os.path.join(tmp_dir, "order.npy"), np.argsort(sort_inds).astype(np.int64))
+        np.save(os.path.join(tmp_dir, "index.npy"), index)
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({"source": source, "columns": columns, "str_columns": str_columns}, f)
+        shutil.rmtree(store_dir, ignore_errors=True)
+        os.makedirs(os.path.dirname(store_dir), exist_ok=True)
+        os.replace(tmp_dir, store_dir)
+
+
+    def _load_hrv_table(self, file_path:str, rec:Optional[str]=None) -> pd.DataFrame:
+        """ finished, checked,
+
+        load (the rows of `rec` in) a cohort-wide HRV annotation csv file from its columnar store,
+        reading only the rows of `rec` if it is given
+
+        Parameters
+        ----------
+        file_path: str,
+            path of the HRV annotation csv file
+        rec: str, optional,
+            record name, typically in the form "shhs1-200001",
+            if not given, the whole table is loaded (in the original order of the rows)
+
+        Returns
+        -------
+        df: DataFrame,
+            the HRV annotations
+        """
+        file_path = os.path.abspath(file_path)
+        store = self._get_hrv_store(file_path)
+        if rec is None:
+            rows = np.asarray(store.order)
+        else:
+            visitnumber = self.get_visit_number(rec) if "visitnumber" in store.columns else 0
+            rows = slice(*self._hrv_offsets[file_path].get((visitnumber, self.get_nsrrid(rec)), (0, 0)))
+        df = {}
+        for c in store.columns:
+            values = np.array(store.data[c][rows])
+            if c in store.nulls:
+                values = values.astype(object)
+                values[store.nulls[c][rows]] = np.nan
+            df[c] = values
+        return pd.DataFrame(df, columns=store.columns)
+
+
     def load_hrv_summary_ann(self, rec:Optional[str]=None, hrv_ann_path:Optional[str]=None) -> pd.DataFrame:
         """ finished,
 
@@ -810,17 +1088,13 @@ class SHHS(NSRRDataBase):
         """
         if rec is None:
             file_path = self.match_full_rec_path("shhs1-200001", hrv_ann_path, rec_type="hrv_summary")
-            df_hrv_ann = pd.read_csv(file_path, engine="python")
+            df_hrv_ann = self._load_hrv_table(file_path)
             file_path = self.match_full_rec_path("shhs2-200001", hrv_ann_path, rec_type="hrv_summary")
-            df_hrv_ann = pd.concat([df_hrv_ann, pd.read_csv(file_path, engine="python")])
+            df_hrv_ann = pd.concat([df_hrv_ann, self._load_hrv_table(file_path)])
             return df_hrv_ann
         file_path = self.match_full_rec_path(rec, hrv_ann_path, rec_type="hrv_summary")
 
-        df_hrv_ann = pd.read_csv(file_path, engine="python")
-        if rec is None:
-            return df_hrv_ann
-        
-        df_hrv_ann = df_hrv_ann[df_hrv_ann["nsrrid"]==self.get_nsrrid(rec)].reset_index(drop=True)
+        df_hrv_ann = self._load_hrv_table(file_path, rec)
         return df_hrv_ann
 
 
@@ -847,8 +1121,7 @@ class SHHS(NSRRDataBase):
 
         self.logger.info(f"HRV annotations of record {rec} will be loaded from the file\n{file_path}")
 
-        df_hrv_ann = pd.read_csv(file_path, engine="python")
-        df_hrv_ann = df_hrv_ann[df_hrv_ann["nsrrid"]==self.get_nsrrid(rec)].reset_index(drop=True)
+        df_hrv_ann = self._load_hrv_table(file_path, rec)
 
         self.logger.info(f"Record {rec} has {len(df_hrv_ann)} HRV annotations, with {len(self.hrv_ann_detailed_keys)} column(s)")
 
@@ -891,7 +1164,7 @@ class SHHS(NSRRDataBase):
         return df_sleep_ann
 
 
-    def load_sleep_stage_ann(self, rec:str, source:str, sleep_stage_ann_path:Optional[str]=None, sleep_stage_protocol:str="aasm", with_stage_names:bool=True) -> pd.DataFrame:
+    def load_sleep_stage_ann(self, rec:str, source:str, sleep_stage_ann_path:Optional[str]=None, sleep_stage_protocol:str="aasm", with_stage_names:bool=True, return_epochs:bool=False) -> Union[pd.DataFrame, Tuple[pd.DataFrame, np.ndarray]]:
         """ finished,
 
         Parameters
@@ -908,74 +1181,77 @@ class SHHS(NSRRDataBase):
             the only difference lies in the number of different stages of the NREM periods
         with_stage_names: bool, default True,
             as the argument name implies
+        return_epochs: bool, default False,
+            if True, the sleep stages of the epochs (of length `self.sleep_epoch_len_sec`) are also returned,
+            as a compact int8 array
 
         Returns
         -------
         df_sleep_stage_ann, DataFrame,
             all annotations on sleep stage of `rec`
+        epochs: ndarray,
+            the sleep stages of the epochs, of dtype int8,
+            returned only if `return_epochs` is True
         """
         self.sleep_stage_protocol = sleep_stage_protocol
         self.update_sleep_stage_names()
 
-        df_sleep_ann = self.load_sleep_ann(rec=rec, source=source, sleep_ann_path=sleep_stage_ann_path)
+        if source.lower() == "event":
+            # only the sleep stage annotations are kept while parsing
+            df_sleep_ann = self.load_event_ann(rec, event_ann_path=sleep_stage_ann_path, event_types=["Stages|Stages"])
+        else:
+            df_sleep_ann = self.load_sleep_ann(rec=rec, source=source, sleep_ann_path=sleep_stage_ann_path)
 
-        df_sleep_stage_ann = pd.DataFrame(columns=self.sleep_stage_keys)
+        # expansion of the (raw) annotations into epochs, all rows at once
         if source.lower() == "hrv":
             df_tmp = df_sleep_ann[self.sleep_stage_ann_keys_from_hrv].reset_index(drop=True)
-            for _, row in df_tmp.iterrows():
-                start_sec = row["Start__sec_"]
-                l_start_sec = np.arange(start_sec, start_sec+self.hrv_ann_epoch_len_sec, self.sleep_epoch_len_sec)
-                l_sleep_stage = np.array([row[self.sleep_stage_ann_keys_from_hrv[i]] for i in range(1, 1+self.hrv_ann_epoch_len_sec//self.sleep_epoch_len_sec)])
-                df_to_concat = pd.DataFrame(
-                    {
-                        "start_sec": l_start_sec,
-                        "sleep_stage": l_sleep_stage
-                    }
-                )
-                df_sleep_stage_ann = pd.concat([df_sleep_stage_ann, df_to_concat], axis=0, ignore_index=True)
+            nb_epochs = self.hrv_ann_epoch_len_sec // self.sleep_epoch_len_sec
+            start_sec = df_tmp["Start__sec_"].values[:, np.newaxis] + self.sleep_epoch_len_sec * np.arange(nb_epochs)[np.newaxis, :]
+            start_sec = start_sec.ravel()
+            sleep_stage = df_tmp[self.sleep_stage_ann_keys_from_hrv[1:1+nb_epochs]].values.ravel()
         elif source.lower() == "event":
             df_tmp = df_sleep_ann[df_sleep_ann["EventType"]=="Stages|Stages"][["EventConcept","Start","Duration"]].reset_index(drop=True)
-            df_tmp["EventConcept"] = df_tmp["EventConcept"].apply(lambda s: int(s.split("|")[1]))
-            for _, row in df_tmp.iterrows():
-                start_sec = int(row["Start"])
-                duration = int(row["Duration"])
-                l_start_sec = np.arange(start_sec, start_sec+duration, self.sleep_epoch_len_sec)
-                l_sleep_stage = np.full(shape=len(l_start_sec), fill_value=int(row["EventConcept"]))
-                df_to_concat = pd.DataFrame(
-                    {
-                        "start_sec": l_start_sec,
-                        "sleep_stage": l_sleep_stage
-                    }
-                )
-                df_sleep_stage_ann = pd.concat([df_sleep_stage_ann, df_to_concat], axis=0, ignore_index=True)
+            event_start = df_tmp["Start"].values.astype(np.int64)
+            duration = df_tmp["Duration"].values.astype(np.int64)
+            # number of epochs of `np.arange(start, start+duration, self.sleep_epoch_len_sec)`
+            nb_epochs = np.maximum(0, -(-duration // self.sleep_epoch_len_sec))
+            epoch_inds = np.arange(nb_epochs.sum()) - np.repeat(np.cumsum(nb_epochs) - nb_epochs, nb_epochs)
+            start_sec = np.repeat(event_start, nb_epochs) + self.sleep_epoch_len_sec * epoch_inds
+            sleep_stage = np.repeat(df_tmp["EventConcept"].str.split("|").str[1].astype(int).values, nb_epochs)
         elif source.lower() == "event_profusion":
-            df_sleep_stage_ann = pd.DataFrame(
-                {
-                    "start_sec": 30*np.arange(len(df_sleep_ann["sleep_stage_list"])),
-                    "sleep_stage": df_sleep_ann["sleep_stage_list"]
-                }
-            )
-
-        df_sleep_stage_ann = df_sleep_stage_ann[self.sleep_stage_keys]
-
-        if self.sleep_stage_protocol == "aasm":
-            df_sleep_stage_ann["sleep_stage"] = df_sleep_stage_ann["sleep_stage"].apply(lambda a: self._to_aasm_states[a])
-        elif self.sleep_stage_protocol == "simplified":
-            df_sleep_stage_ann["sleep_stage"] = df_sleep_stage_ann["sleep_stage"].apply(lambda a: self._to_simplified_states[a])
-        elif self.sleep_stage_protocol == "shhs":
-            df_sleep_stage_ann["sleep_stage"] = df_sleep_stage_ann["sleep_stage"].apply(lambda a: self._to_shhs_states[a])
+            sleep_stage = np.array(df_sleep_ann["sleep_stage_list"], dtype=np.int64)
+            start_sec = 30 * np.arange(len(sleep_stage))
+
+        # mapping of the stages according to the protocol, via lookup array
+        mapping = {
+            "aasm": self._to_aasm_states,
+            "simplified": self._to_simplified_states,
+            "shhs": self._to_shhs_states,
+        }[self.sleep_stage_protocol]
+        lookup = np.full((max(mapping.keys())+1,), -1, dtype=np.int64)
+        lookup[list(mapping.keys())] = list(mapping.values())
+        sleep_stage = np.asarray(sleep_stage).astype(np.int64)
+        illegal = (sleep_stage < 0) | (sleep_stage >= len(lookup))
+        illegal[~illegal] = lookup[sleep_stage[~illegal]] < 0
+        if illegal.any():
+            raise KeyError(f"illegal sleep stage(s) {np.unique(sleep_stage[illegal]).tolist()}")
+        sleep_stage = lookup[sleep_stage]
+
+        df_sleep_stage_ann = pd.DataFrame({"start_sec": start_sec, "sleep_stage": sleep_stage}, columns=self.sleep_stage_keys)
 
         if with_stage_names:
-            df_sleep_stage_ann["sleep_stage_name"] = df_sleep_stage_ann["sleep_stage"].apply(lambda a: self.sleep_stage_names[a])
+            df_sleep_stage_ann["sleep_stage_name"] = np.array(self.sleep_stage_names)[sleep_stage]
         
         if source.lower() != "event_profusion":
             self.logger.info(f"record {rec} has {len(df_tmp)} raw (epoch_len = 5min) sleep stage annotations, with {len(self.sleep_stage_ann_keys_from_hrv)} column(s)")
             self.logger.info(f"after being transformed (epoch_len = 30sec), record {rec} has {len(df_sleep_stage_ann)} sleep stage annotations, with {len(self.sleep_stage_keys)} column(s)")
 
+        if return_epochs:
+            return df_sleep_stage_ann, sleep_stage.astype(np.int8)
         return df_sleep_stage_ann
 
 
-    def load_sleep_event_ann(self, rec:str, source:str, event_types:Optional[List[str]]=None, sleep_event_ann_path:Optional[str]=None) -> pd.DataFrame:
+    def load_sleep_event_ann(self, rec:str, source:str, event_types:Optional[List[str]]=None, sleep_event_ann_path:Optional[str]=None, fmt:str="dataframe") -> Union[pd.DataFrame, np.ndarray]:
         """ finished,
 
         Parameters
@@ -992,15 +1268,17 @@ class SHHS(NSRRDataBase):
         sleep_event_ann_path: str, optional,
             path of the file which contains the sleep event annotations,
             if not given, default path will be used
+        fmt: str, default "dataframe",
+            format of the returned events, can be "dataframe" or "array",
+            the latter being a structured array of dtype `SLEEP_EVENT_DTYPE`
 
         Returns
         -------
-        df_sleep_event_ann, DataFrame,
+        df_sleep_event_ann, DataFrame or ndarray,
             all annotations on sleep events of `rec`
         """
-        df_sleep_ann = self.load_sleep_ann(rec=rec, source=source, sleep_ann_path=sleep_event_ann_path)
-
-        df_sleep_event_ann = pd.DataFrame(columns=self.sleep_event_keys)
+        if fmt.lower() not in ["dataframe", "array"]:
+            raise ValueError(f"format `{fmt}` not supported")
 
         _et = []
         if source.lower() != "hrv":
@@ -1012,21 +1290,14 @@ class SHHS(NSRRDataBase):
         self.logger.info(f"for record {rec}, _et (event_types) = {_et}")
 
         if source.lower() == "hrv":
+            df_sleep_ann = self.load_sleep_ann(rec=rec, source=source, sleep_ann_path=sleep_event_ann_path)
             df_sleep_ann = df_sleep_ann[self.sleep_event_ann_keys_from_hrv].reset_index(drop=True)
-            df_sleep_event_ann = pd.DataFrame(columns=self.sleep_event_keys[1:3])
-            for _, row in df_sleep_ann.iterrows():
-                if row["hasrespevent"] == 0:
-                    continue
-                l_events = row[self.sleep_event_ann_keys_from_hrv[1:-1]].values.reshape((len(self.sleep_event_ann_keys_from_hrv)//2-1, 2))
-                l_events = l_events[~np.isnan(l_events[:,0])]
-                df_to_concat = pd.DataFrame(l_events, columns=self.sleep_event_keys[1:3])
-                df_sleep_event_ann = pd.concat([df_sleep_event_ann, df_to_concat], axis=0, ignore_index=True)
-            df_sleep_event_ann["event_name"] = None
-            df_sleep_event_ann["event_duration"] = df_sleep_event_ann.apply(lambda row: row["event_end"]-row["event_start"], axis=1)
-            df_sleep_event_ann = df_sleep_event_ann[self.sleep_event_keys]
+            # the (start, end) pairs of all rows with respiratory events, reshaped in one step
+            pairs = df_sleep_ann[df_sleep_ann["hasrespevent"]!=0][self.sleep_event_ann_keys_from_hrv[1:-1]].values
+            sleep_events = sleep_events_from_pairs(pairs)
 
             self.logger.info(f"record {rec} has {len(df_sleep_ann)} raw (epoch_len = 5min) sleep event annotations from hrv, with {len(self.sleep_event_ann_keys_from_hrv)} column(s)")
-            self.logger.info(f"after being transformed, record {rec} has {len(df_sleep_event_ann)} sleep event(s)")
+            self.logger.info(f"after being transformed, record {rec} has {len(sleep_events)} sleep event(s)")
         elif source.lower() == "event":
             _cols = set()
             if "respiratory" in _et:
@@ -1049,13 +1320,17 @@ class SHHS(NSRRDataBase):
 
             print(f"for record {rec}, _cols = {_cols}")
 
-            df_sleep_event_ann = df_sleep_ann[df_sleep_ann["EventConcept"].isin(_cols)].reset_index(drop=True)
-            df_sleep_event_ann = df_sleep_event_ann.rename({"EventConcept":"event_name", "Start":"event_start", "Duration":"event_duration"}, axis=1)
-            df_sleep_event_ann["event_name"] = df_sleep_event_ann["event_name"].apply(lambda s: s.split("|")[1])
-            df_sleep_event_ann["event_end"] = df_sleep_event_ann.apply(lambda row: row["event_start"]+row["event_duration"],axis=1)
-            df_sleep_event_ann = df_sleep_event_ann[self.sleep_event_keys]
+            # events of other concepts are skipped while parsing
+            df_sleep_ann = self.load_event_ann(rec, event_ann_path=sleep_event_ann_path, event_concepts=_cols)
+            if len(df_sleep_ann) == 0:
+                sleep_events = make_sleep_events("", [], event_duration=[])
+            else:
+                sleep_events = make_sleep_events(
+                    df_sleep_ann["EventConcept"].str.split("|").str[1].values.astype(str),
+                    df_sleep_ann["Start"].values,
+                    event_duration=df_sleep_ann["Duration"].values,
+                )
         elif source.lower() == "event_profusion":
-            df_sleep_ann = df_sleep_ann["df_events"]
             _cols = set()
             if "respiratory" in _et:
                 _cols = (_cols | set(self.event_names_from_event_profusion[:6]))
@@ -1077,15 +1352,26 @@ class SHHS(NSRRDataBase):
 
             print(f"for record {rec}, _cols = {_cols}")
 
-            df_sleep_event_ann = df_sleep_ann[df_sleep_ann["Name"].isin(_cols)].reset_index(drop=True)
-            df_sleep_event_ann = df_sleep_event_ann.rename({"Name":"event_name", "Start":"event_start", "Duration":"event_duration"}, axis=1)
-            df_sleep_event_ann["event_end"] = df_sleep_event_ann.apply(lambda row: row["event_start"]+row["event_duration"],axis=1)
-            df_sleep_event_ann = df_sleep_event_ann[self.sleep_event_keys]
+            # events of other names are skipped while parsing
+            df_sleep_ann = self.load_event_profusion_ann(rec, event_profusion_ann_path=sleep_event_ann_path, event_names=_cols)["df_events"]
+            if len(df_sleep_ann) == 0:
+                sleep_events = make_sleep_events("", [], event_duration=[])
+            else:
+                sleep_events = make_sleep_events(
+                    df_sleep_ann["Name"].values.astype(str),
+                    df_sleep_ann["Start"].values,
+                    event_duration=df_sleep_ann["Duration"].values,
+                )
+        else:
+            raise ValueError(f"source `{source}` not supported")
 
+        if fmt.lower() == "array":
+            return sleep_events
+        df_sleep_event_ann = sleep_events_to_df(sleep_events)[self.sleep_event_keys]
         return df_sleep_event_ann
 
 
-    def load_apnea_ann(self, rec:str, source:str, apnea_types:Optional[List[str]]=None, apnea_ann_path:Optional[str]=None) -> pd.DataFrame:
+    def load_apnea_ann(self, rec:str, source:str, apnea_types:Optional[List[str]]=None, apnea_ann_path:Optional[str]=None, fmt:str="dataframe") -> Union[pd.DataFrame, np.ndarray]:
         """ finished,
 
         Parameters
@@ -1100,10 +1386,13 @@ class SHHS(NSRRDataBase):
         apnea_ann_path: str, optional,
             path of the file which contains the apnea event annotations,
             if not given, default path will be used
+        fmt: str, default "dataframe",
+            format of the returned events, can be "dataframe" or "array",
+            the latter being a structured array of dtype `SLEEP_EVENT_DTYPE`
 
         Returns
         -------
-        df_apnea_ann, DataFrame,
+        df_apnea_ann, DataFrame or ndarray,
             all annotations on apnea events of `rec`
         """
         event_types = ["apnea"] if apnea_types is None else apnea_types
@@ -1113,7 +1402,8 @@ class SHHS(NSRRDataBase):
             rec=rec,
             source=source,
             event_types=event_types,
-            sleep_event_ann_path=apnea_ann_path)
+            sleep_event_ann_path=apnea_ann_path,
+            fmt=fmt)
         return df_apnea_ann
 
 
@@ -1140,11 +1430,102 @@ class SHHS(NSRRDataBase):
         if not os.path.isfile(file_path):
             raise FileNotFoundError(f"The annotation file of wave delineation of record {rec} has not been downloaded yet. Or the path {file_path} is not correct. Please check!")
 
-        df_wave_delineation = pd.read_csv(file_path,engine="python")
+        df_wave_delineation = pd.read_csv(file_path, usecols=self.wave_deli_keys)
         df_wave_delineation = df_wave_delineation[self.wave_deli_keys].reset_index(drop=True)
         return df_wave_delineation
 
 
+    def _load_beats(self, rec:str, wave_deli_path:Optional[str]=None) -> Dict[str, np.ndarray]:
+        """ finished, checked,
+
+        load the columns "Type", "rpointadj", "samplingrate" of the wave delineation annotations,
+        parsed once (with the C engine of pandas, reading only these columns),
+        then cached in the annotation sidecar (in `working_dir`) and in memory (LRU)
+
+        Parameters
+        ----------
+        rec: str,
+            record name, typically in the form "shhs1-200001"
+        wave_deli_path: str, optional,
+            path of the file which contains wave delineation annotations,
+            if not given, default path will be used
+
+        Returns
+        -------
+        beats: dict of ndarray,
+            type (int8), location (float64, in samples) and sampling frequency of each beat (R peak) of `rec`,
+            keyed by "Type", "rpointadj", "samplingrate"
+        """
+        file_path = self.match_full_rec_path(rec, wave_deli_path, rec_type="wave_delineation")
+        if not os.path.isfile(file_path):
+            raise FileNotFoundError(f"The annotation file of wave delineation of record {rec} has not been downloaded yet. Or the path {file_path} is not correct. Please check!")
+        key = (os.path.abspath(file_path), os.path.getmtime(file_path))
+        beats = self._beat_cache.get(key)
+        if beats is not None:
+            return beats
+        info_items = ["Type", "rpointadj", "samplingrate"]
+
+        def _parse() -> Dict[str, np.ndarray]:
+            df = pd.read_csv(file_path, usecols=info_items, dtype={"rpointadj": np.float64, "samplingrate": np.float64})
+            return {
+                "Type": df["Type"].values.astype(np.int8),
+                "rpointadj": df["rpointadj"].values,
+                "samplingrate": df["samplingrate"].values,
+            }
+
+        beats = self._load_ann_sidecar(rec, "beats", [file_path], _parse)
+        self._beat_cache.put(key, beats)
+        return beats
+
+
+    def load_beat_ann(self, rec:str, rpeak_ann_path:Optional[str]=None) -> Dict[str, np.ndarray]:
+        """ finished, checked,
+
+        load the R peaks, beat types, RR and NN intervals of a record in one call,
+        the wave delineation annotation file being read at most once
+
+        Parameters
+        ----------
+        rec: str,
+            record name, typically in the form "shhs1-200001"
+        rpeak_ann_path: str, optional,
+            annotation file path,
+            if not given, default path will be used
+
+        Returns
+        -------
+        beat_ann: dict,
+            with items
+            - "rpeaks": indices (in samples) of all the beats (R peaks)
+            - "beat_types": types of the beats, 0 = Artifact, 1 = Normal Sinus Beat, 2 = VE, 3 = SVE
+            - "fs": sampling frequency of "rpeaks"
+            - "rr": RR intervals of the normal sinus beats, as `self.load_rr_ann`
+            - "nn": NN intervals, as `self.load_nn_ann`
+        """
+        beats = self._load_beats(rec, rpeak_ann_path)
+        beat_types, rpointadj = beats["Type"], beats["rpointadj"]
+        fs = beats["samplingrate"][0]
+
+        # 0 = Artifact, 1 = Normal Sinus Beat, 2 = VE, 3 = SVE
+        rpeaks_ts = np.round(rpointadj[beat_types==1] * 1000 / fs).astype(int)
+        rr = np.column_stack((rpeaks_ts[:-1], np.diff(rpeaks_ts)))
+
+        all_rpeaks_ts = np.round(rpointadj * 1000 / fs).astype(int)
+        all_rr = np.column_stack((all_rpeaks_ts[:-1], np.diff(all_rpeaks_ts)))
+        normal_sinus_rpeak_indices = np.where(beat_types==1)[0]
+        keep_indices = np.where(np.diff(normal_sinus_rpeak_indices)==1)[0]
+        nn = all_rr[normal_sinus_rpeak_indices[keep_indices]]
+
+        beat_ann = {
+            "rpeaks": np.round(rpointadj).astype(int),
+            "beat_types": beat_types,
+            "fs": fs,
+            "rr": rr,
+            "nn": nn,
+        }
+        return beat_ann
+
+
     def load_rpeak_ann(self, rec:str, rpeak_ann_path:Optional[str]=None, exclude_artifacts:bool=True, exclude_abnormal_beats:bool=True, to_ts:bool=False) -> np.ndarray:
         """ finished,
 
@@ -1165,8 +1546,7 @@ class SHHS(NSRRDataBase):
         -------
 
         """
-        info_items = ["Type", "rpointadj", "samplingrate"]
-        df_rpeaks_with_type_info = self.load_wave_delineation(rec, rpeak_ann_path)[info_items]
+        beats = self._load_beats(rec, rpeak_ann_path)
         exclude_beat_types = []
         # 0 = Artifact, 1 = Normal Sinus Beat, 2 = VE, 3 = SVE
         if exclude_artifacts:
@@ -1174,10 +1554,10 @@ class SHHS(NSRRDataBase):
         if exclude_abnormal_beats:
             exclude_beat_types += [2,3]
 
-        ret = df_rpeaks_with_type_info[~df_rpeaks_with_type_info["Type"].isin(exclude_beat_types)]["rpointadj"].values
+        ret = beats["rpointadj"][~np.isin(beats["Type"], exclude_beat_types)]
 
         if to_ts:
-            fs = df_rpeaks_with_type_info.iloc[0]["samplingrate"]
+            fs = beats["samplingrate"][0]
             ret = ret * 1000 / fs
         
         return (np.round(ret)).astype(int)
@@ -1198,16 +1578,7 @@ class SHHS(NSRRDataBase):
         -------
 
         """
-        rpeaks_ts = self.load_rpeak_ann(
-            rec=rec,
-            rpeak_ann_path=rpeak_ann_path,
-            exclude_artifacts=True,
-            exclude_abnormal_beats=True,
-            to_ts=True
-        )
-        rr = np.diff(rpeaks_ts)
-        rr = np.column_stack((rpeaks_ts[:-1],rr))
-        return rr
+        return self.load_beat_ann(rec, rpeak_ann_path)["rr"]
 
 
     def load_nn_ann(self, rec:str, rpeak_ann_path:Optional[str]=None) -> np.ndarray:
@@ -1225,17 +1596,7 @@ class SHHS(NSRRDataBase):
         -------
 
         """
-        info_items = ["Type", "rpointadj", "samplingrate"]
-        df_rpeaks_with_type_info = self.load_wave_delineation(rec, rpeak_ann_path)[info_items]
-        fs = df_rpeaks_with_type_info.iloc[0]["samplingrate"]
-        rpeaks_ts = (np.round(df_rpeaks_with_type_info["rpointadj"]*1000/fs)).astype(int)
-        rr = np.diff(rpeaks_ts)
-        rr = np.column_stack((rpeaks_ts[:-1],rr))
-
-        normal_sinus_rpeak_indices = np.where(df_rpeaks_with_type_info["Type"].values==1)[0]  # 1 = Normal Sinus Beat
-        keep_indices = np.where(np.diff(normal_sinus_rpeak_indices)==1)[0].tolist()
-        nn = rr[normal_sinus_rpeak_indices[keep_indices]]
-        return nn
+        return self.load_beat_ann(rec, rpeak_ann_path)["nn"]
 
 
     def locate_artifacts(self, rec:str, wave_deli_path:Optional[str]=None) -> np.ndarray:
@@ -1253,9 +1614,9 @@ class SHHS(NSRRDataBase):
         -------
 
         """
-        df_rpeaks_with_type_info = self.load_wave_delineation(rec, wave_deli_path)[["Type", "rpointadj"]]
+        beats = self._load_beats(rec, wave_deli_path)
 
-        return (np.round( df_rpeaks_with_type_info[df_rpeaks_with_type_info["Type"]==0]["rpointadj"].values )).astype(int)
+        return (np.round( beats["rpointadj"][beats["Type"]==0] )).astype(int)
 
 
     def locate_abnormal_beats(self, rec:str, wave_deli_path:Optional[str]=None, abnormal_type:Optional[str]=None) -> Dict[str, np.ndarray]:
@@ -1279,11 +1640,11 @@ class SHHS(NSRRDataBase):
         if abnormal_type is not None and abnormal_type not in ["VE", "SVE"]:
             raise ValueError(f"No abnormal type of {abnormal_type} in wave delineation annotation files")
 
-        df_rpeaks_with_type_info = self.load_wave_delineation(rec, wave_deli_path)[["Type", "rpointadj"]]
+        beats = self._load_beats(rec, wave_deli_path)
 
         # 2 = VE, 3 = SVE
-        ve = (np.round( df_rpeaks_with_type_info[df_rpeaks_with_type_info["Type"]==2]["rpointadj"].values )).astype(int)
-        sve = (np.round( df_rpeaks_with_type_info[df_rpeaks_with_type_info["Type"]==3]["rpointadj"].values )).astype(int)
+        ve = (np.round( beats["rpointadj"][beats["Type"]==2] )).astype(int)
+        sve = (np.round( beats["rpointadj"][beats["Type"]==3] )).astype(int)
 
         abnormal_rpeaks = {
             "VE": ve,
@@ -3,10 +3,22 @@
 docstring, to write
 """
 
-from .ppg_bp import *
-from .sleep_accel import *
-from .tele import *
-from .prcv2021 import *
+from .._lazy import attach
 
 
-__all__ = [s for s in dir() if not s.startswith('_')]
+# the modules (and their dependencies) are imported at the first access of the exported names
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=[
+        'ppg_bp',
+        'sleep_accel',
+        'tele',
+        'prcv2021',
+    ],
+    submod_attrs={
+        'ppg_bp': ['PPGBP'],
+        'sleep_accel': ['SleepAccel'],
+        'tele': ['TELE'],
+        'prcv2021': ['PRCV2021'],
+    },
+)
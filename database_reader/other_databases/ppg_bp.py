@@ -2,6 +2,8 @@
 """
 """
 import os
+import json
+import shutil
 from datetime import datetime
 from typing import Union, Optional, Any, List, NoReturn
 from numbers import Real
@@ -9,12 +11,14 @@ from numbers import Real
 import numpy as np
 np.set_printoptions(precision=5, suppress=True)
 import pandas as pd
+from easydict import EasyDict as ED
 
 from ..utils.common import (
     ArrayLike,
     get_record_list_recursive,
 )
 from ..base import OtherDataBase
+from ..version import version as __version__
 
 
 __all__ = [
@@ -65,7 +69,9 @@ class PPGBP(OtherDataBase):
             working directory, to store intermediate files and log file
         verbose: int, default 2,
             log verbosity
-        kwargs: auxilliary key word arguments
+        kwargs: auxilliary key word arguments,
+            e.g. `binary_store` (default False), whether or not to load the ppg data from the consolidated binary store,
+            built (in `working_dir`) at the first use from all the text files of the segments
 
         typical "db_dir": "/export/servers/kuangzhexiang/data/PPG_BP/"
         ------------------
@@ -89,6 +95,11 @@ class PPGBP(OtherDataBase):
             "Hypertension", "Diabetes", "cerebral infarction", "cerebrovascular disease",
         ]
 
+        self.binary_store = kwargs.get("binary_store", False)
+        self._ppg_store = None
+        self._ppg_offsets = None
+        self._df_ann = None
+
 
     def form_paths(self) -> NoReturn:
         """ finished, checked, to be improved,
@@ -147,11 +158,15 @@ class PPGBP(OtherDataBase):
             the ppg data
         """
         verbose = self.verbose if verbose is None else verbose
-        rec_fn = f"{self._all_records[rec_no]}_{seg_no}.txt"
-        data = []
-        with open(self.ppg_data_dir+rec_fn, "r") as f:
-            data = f.readlines()
-        data = np.array([float(i) for i in data[0].split("\t") if len(i)>0]).astype(int)
+        if self.binary_store:
+            store = self._get_ppg_store()
+            bounds = self._ppg_offsets.get((self.get_subject_id(rec_no), seg_no), None)
+            if bounds is None:
+                raise FileNotFoundError(f"segment {seg_no} of subject {self._all_records[rec_no]} not found")
+            data = np.asarray(store.data[bounds[0]:bounds[1]]).astype(int)
+        else:
+            rec_fn = f"{self._all_records[rec_no]}_{seg_no}.{self.rec_ext}"
+            data = self._parse_ppg_txt(os.path.join(self.ppg_data_dir, rec_fn))
         
         if verbose >= 2:
             import matplotlib.pyplot as plt
@@ -162,6 +177,167 @@ class PPGBP(OtherDataBase):
         return data
 
 
+    def load_all_ppg_data(self) -> ED:
+        """ finished, checked,
+
+        load the ppg data of all the segments from the consolidated binary store,
+        building the store at the first call (or when the text files, or the version of the package changes)
+
+        Returns
+        -------
+        store: ED,
+            with items
+            - "data": memory-mapped ndarray of the ppg data of all the segments, concatenated in the order of `index`
+            - "index": structured ndarray with fields "subject_id", "seg_no", "start", "stop"
+        """
+        store = self._get_ppg_store(check=True)
+        return ED(data=store.data, index=store.index)
+
+
+    def _parse_ppg_txt(self, file_path:str) -> np.ndarray:
+        """ finished, checked,
+
+        parse the (first line of the) tab-separated text file of a segment
+
+        Parameters
+        ----------
+        file_path: str,
+            path of the text file
+
+        Returns
+        -------
+        data: ndarray,
+            the ppg data, of dtype int
+        """
+        with open(file_path, "r") as f:
+            line = f.readline()
+        data = np.fromstring(line, sep="\t").astype(int)
+        return data
+
+
+    def _get_ppg_store(self, check:bool=False) -> ED:
+        """ finished, checked,
+
+        get the consolidated binary store of the ppg data,
+        the store (in `working_dir`) consists of a .npy file of the concatenated data of all the segments,
+        of dtype int16 (or int32 if the values do not fit), loaded memory-mapped,
+        and an index of the offsets of the segments
+
+        Parameters
+        ----------
+        check: bool, default False,
+            if True, check the freshness of an already opened store against the text files (by listing them),
+            the freshness is always checked when the store is opened
+
+        Returns
+        -------
+        store: ED,
+            with items "source", "data", "index",
+            the offsets of the segments are also kept in `self._ppg_offsets`,
+            in the form of {(subject_id, seg_no): (start, stop)}
+        """
+        if self._ppg_store is not None and not check:
+            return self._ppg_store
+        files = sorted(
+            [e for e in os.scandir(self.ppg_data_dir) if e.is_file() and e.name.endswith(f".{self.rec_ext}")],
+            key=lambda e: e.name,
+        )
+        stats = [e.stat() for e in files]
+        source = ED(
+            version=__version__,
+            source=os.path.abspath(self.ppg_data_dir),
+            n_files=len(files),
+            mtime=max([st.st_mtime for st in stats], default=0),
+            size=sum([st.st_size for st in stats]),
+        )
+        if self._ppg_store is not None and self._ppg_store.source == source:
+            return self._ppg_store
+        store_dir = os.path.join(self.working_dir, "ppg_stores", self.db_name)
+        try:
+            with open(os.path.join(store_dir, "meta.json"), "r") as f:
+                meta = ED(json.load(f))
+            if meta.source != source:
+                raise ValueError("outdated store")
+        except:
+            self._build_ppg_store([e.path for e in files], store_dir, source)
+            with open(os.path.join(store_dir, "meta.json"), "r") as f:
+                meta = ED(json.load(f))
+        index = np.load(os.path.join(store_dir, "index.npy"))
+        self._ppg_store = ED(
+            source=meta.source,
+            data=np.load(os.path.join(store_dir, "data.npy"), mmap_mode="r"),
+            index=index,
+        )
+        self._ppg_offsets = {
+            (int(subject_id), int(seg_no)): (int(start), int(stop)) \
+                for subject_id, seg_no, start, stop in index.tolist()
+        }
+        return self._ppg_store
+
+
+    def _build_ppg_store(self, file_paths:List[str], store_dir:str, source:dict) -> NoReturn:
+        """ finished, checked,
+
+        parse the text files of all the segments and write the consolidated binary store in `store_dir`
+
+        Parameters
+        ----------
+        file_paths: list of str,
+            paths of the text files of the segments
+        store_dir: str,
+            directory of the store
+        source: dict,
+            information (version, path, number of files, modification time, size) of the text files
+        """
+        self.logger.info(f"converting {len(file_paths)} segments in {self.ppg_data_dir} into a binary store in {store_dir}")
+        segments, keys = [], []
+        for fp in file_paths:
+            subject_id, seg_no = os.path.splitext(os.path.basename(fp))[0].split("_")
+            keys.append((int(subject_id), int(seg_no)))
+            segments.append(self._parse_ppg_txt(fp))
+        order = sorted(range(len(keys)), key=lambda i: keys[i])
+        lengths = np.array([len(segments[i]) for i in order], dtype=np.int64)
+        index = np.zeros((len(order),), dtype=[("subject_id", np.int64), ("seg_no", np.int64), ("start", np.int64), ("stop", np.int64)])
+        index["subject_id"] = [keys[i][0] for i in order]
+        index["seg_no"] = [keys[i][1] for i in order]
+        index["stop"] = np.cumsum(lengths)
+        index["start"] = index["stop"] - lengths
+        data = np.concatenate([segments[i] for i in order]) if len(order) > 0 else np.zeros((0,), dtype=int)
+        iinfo = np.iinfo(np.int16)
+        if len(data) == 0 or (data.min() >= iinfo.min and data.max() <= iinfo.max):
+            data = data.astype(np.int16)
+        else:
+            data = data.astype(np.int32)
+
+        tmp_dir = f"{store_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        np.save(os.path.join(tmp_dir, "data.npy"), data)
+        np.save(os.path.join(tmp_dir, "index.npy"), index)
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({"source": source}, f)
+        shutil.rmtree(store_dir, ignore_errors=True)
+        os.makedirs(os.path.dirname(store_dir), exist_ok=True)
+        os.replace(tmp_dir, store_dir)
+
+
+    def _get_ann_df(self) -> pd.DataFrame:
+        """ finished, checked,
+
+        the annotation workbook, parsed only once per instance
+
+        Returns
+        -------
+        df_ann: DataFrame,
+            the annotations of all the subjects
+        """
+        if self._df_ann is None:
+            df_ann = pd.read_excel(self.ann_file)
+            df_ann.columns = df_ann.iloc[0]
+            self._df_ann = df_ann[1:].reset_index(drop=True)
+        return self._df_ann
+
+
     def load_ann(self, rec_no:Optional[int]=None) -> pd.DataFrame:
         """ finished, checked,
         
@@ -176,12 +352,10 @@ class PPGBP(OtherDataBase):
         df_ann: DataFrame,
             the annotations
         """
-        df_ann = pd.read_excel(self.ann_file)
-        df_ann.columns = df_ann.iloc[0]
-        df_ann = df_ann[1:].reset_index(drop=True)
+        df_ann = self._get_ann_df()
         
         if rec_no is None:
-            return df_ann
+            return df_ann.copy()
         
         df_ann = df_ann[df_ann["subject_ID"]==int(self._all_records[rec_no])].reset_index(drop=True)
         return df_ann
@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 import os
+import json
+import shutil
 from datetime import datetime
-from typing import Union, Optional, Any, List, Tuple, NoReturn
+from typing import Union, Optional, Any, List, Tuple, Dict, NoReturn
 from numbers import Real
 
 import numpy as np
 np.set_printoptions(precision=5, suppress=True)
 import pandas as pd
+from easydict import EasyDict as ED
 from scipy import interpolate
 
 from ..utils.common import (
@@ -15,6 +18,7 @@ from ..utils.common import (
 )
 from ..utils.utils_signal import resample_irregular_timeseries
 from ..base import OtherDataBase
+from ..version import version as __version__
 
 
 __all__ = [
@@ -65,7 +69,9 @@ class SleepAccel(OtherDataBase):
             working directory, to store intermediate files and log file
         verbose: int, default 2,
             log verbosity
-        kwargs: auxilliary key word arguments
+        kwargs: auxilliary key word arguments,
+            e.g. `columnar_cache` (default True), whether or not to convert the text files into per-subject binary columnar files (in `working_dir`),
+            from which time ranges of the data are read via memory maps
 
         typical "db_dir":  "/export/servers/data/sleep_accel/"
         """
@@ -112,8 +118,31 @@ class SleepAccel(OtherDataBase):
             1: 1,  # sleep
         }
 
+        # sep, column names, dtypes of the columns in the columnar files (None for the dtypes parsed by pandas),
+        # whether or not sorted and deduplicated by "sec"
+        self._tables = {
+            "labels": ED(
+                dir=self.lb_dir, suffix=self.lb_file_suffix, sep=" ", sort=False,
+                columns=["sec", "sleep_stage"], dtypes=[None, None],
+            ),
+            "motion": ED(
+                dir=self.motion_dir, suffix=self.motion_file_suffix, sep=" ", sort=True,
+                columns=["sec", "x", "y", "z"], dtypes=[None, np.float32, np.float32, np.float32],
+            ),
+            "hr": ED(
+                dir=self.hr_dir, suffix=self.hr_file_suffix, sep=",", sort=True,
+                columns=["sec", "hr"], dtypes=[None, None],
+            ),
+            "steps": ED(
+                dir=self.steps_dir, suffix=self.steps_file_suffix, sep=",", sort=True,
+                columns=["sec", "step_count"], dtypes=[None, None],
+            ),
+        }
+        self.columnar_cache = kwargs.get("columnar_cache", True)
+        self._columnar_stores = {}
+
 
-    def load_labels(self, subject_id:str) -> pd.DataFrame:
+    def load_labels(self, subject_id:str, start_sec:Optional[Real]=None, end_sec:Optional[Real]=None) -> pd.DataFrame:
         """ finished, checked,
 
         load labels of sleep stages
@@ -122,19 +151,21 @@ class SleepAccel(OtherDataBase):
         ----------
         subject_id: str,
             subject id in `self.all_subjects`
+        start_sec: real number, optional,
+            start time (in seconds, inclusive) of the labels to load, defaults to the start of the labels
+        end_sec: real number, optional,
+            end time (in seconds, inclusive) of the labels to load, defaults to the end of the labels
         
         Returns
         -------
         df_lb: DataFrame, with columns "sec","sleep_stage"
         """
-        fp = os.path.join(self.lb_dir, subject_id+self.lb_file_suffix)
-        df_lb = pd.read_csv(fp,sep=" ",header=None,names=["sec","sleep_stage"])
-        df_lb["sleep_stage"] = \
-            df_lb["sleep_stage"].apply(lambda ss: self.to_conventional_lables[ss])
+        df_lb = self._load_table(subject_id, "labels", start_sec, end_sec)
+        df_lb["sleep_stage"] = df_lb["sleep_stage"].map(self.to_conventional_lables)
         return df_lb
 
 
-    def load_motion_data(self, subject_id:str) -> pd.DataFrame:
+    def load_motion_data(self, subject_id:str, start_sec:Optional[Real]=None, end_sec:Optional[Real]=None) -> pd.DataFrame:
         """ finished, checked,
 
         load motion (accelerometer) data
@@ -143,20 +174,20 @@ class SleepAccel(OtherDataBase):
         ----------
         subject_id: str,
             subject id in `self.all_subjects`
+        start_sec: real number, optional,
+            start time (in seconds, inclusive) of the data to load, defaults to the start of the data
+        end_sec: real number, optional,
+            end time (in seconds, inclusive) of the data to load, defaults to the end of the data
         
         Returns
         -------
         df_mt: DataFrame, with columns "sec","x","y","z"
         """
-        mt_fp = os.path.join(self.motion_dir, subject_id+self.motion_file_suffix)
-        df_mt = pd.read_csv(mt_fp, sep=" ", header=None, names=["sec","x","y","z"])
-        df_mt = df_mt.sort_values(by="sec")
-        df_mt = df_mt.drop_duplicates(subset="sec")
-        df_mt = df_mt.reset_index(drop=True)
+        df_mt = self._load_table(subject_id, "motion", start_sec, end_sec)
         return df_mt
 
 
-    def load_hr_data(self, subject_id:str) -> pd.DataFrame:
+    def load_hr_data(self, subject_id:str, start_sec:Optional[Real]=None, end_sec:Optional[Real]=None) -> pd.DataFrame:
         """ finished, checked,
 
         load heart rate data
@@ -165,20 +196,20 @@ class SleepAccel(OtherDataBase):
         ----------
         subject_id: str,
             subject id in `self.all_subjects`
+        start_sec: real number, optional,
+            start time (in seconds, inclusive) of the data to load, defaults to the start of the data
+        end_sec: real number, optional,
+            end time (in seconds, inclusive) of the data to load, defaults to the end of the data
         
         Returns
         -------
         df_hr: DataFrame, with columns "sec","hr"
         """
-        hr_fp = os.path.join(self.hr_dir, subject_id+self.hr_file_suffix)
-        df_hr = pd.read_csv(hr_fp,sep=",",header=None,names=["sec","hr"])
-        df_hr = df_hr.sort_values(by="sec")
-        df_hr = df_hr.drop_duplicates(subset="sec")
-        df_hr = df_hr.reset_index(drop=True)
+        df_hr = self._load_table(subject_id, "hr", start_sec, end_sec)
         return df_hr
 
 
-    def load_step_data(self, subject_id:str) -> pd.DataFrame:
+    def load_step_data(self, subject_id:str, start_sec:Optional[Real]=None, end_sec:Optional[Real]=None) -> pd.DataFrame:
         """ finished, checked,
 
         load step count data
@@ -187,19 +218,146 @@ class SleepAccel(OtherDataBase):
         ----------
         subject_id: str,
             subject id in `self.all_subjects`
+        start_sec: real number, optional,
+            start time (in seconds, inclusive) of the data to load, defaults to the start of the data
+        end_sec: real number, optional,
+            end time (in seconds, inclusive) of the data to load, defaults to the end of the data
         
         Returns
         -------
         df_sp: DataFrame, with columns "sec","step_count"
         """
-        sp_fp = os.path.join(self.steps_dir, subject_id+self.steps_file_suffix)
-        df_sp = pd.read_csv(sp_fp, sep=",", header=None, names=["sec","step_count"])
-        df_sp = df_sp.sort_values(by="sec")
-        df_sp = df_sp.drop_duplicates(subset="sec")
-        df_sp = df_sp.reset_index(drop=True)
+        df_sp = self._load_table(subject_id, "steps", start_sec, end_sec)
         return df_sp
 
 
+    def _load_table(self, subject_id:str, kind:str, start_sec:Optional[Real]=None, end_sec:Optional[Real]=None) -> pd.DataFrame:
+        """ finished, checked,
+
+        load (the time range [`start_sec`, `end_sec`] of) the data of some kind of a subject,
+        from the columnar files if `self.columnar_cache` is True, otherwise from the text file,
+        tables other than the labels are sorted and deduplicated by "sec"
+
+        Parameters
+        ----------
+        subject_id: str,
+            subject id in `self.all_subjects`
+        kind: str,
+            one of "labels", "motion", "hr", "steps"
+        start_sec: real number, optional,
+            start time (in seconds, inclusive) of the data to load
+        end_sec: real number, optional,
+            end time (in seconds, inclusive) of the data to load
+
+        Returns
+        -------
+        df: DataFrame,
+            the data, with columns `self._tables[kind].columns`
+        """
+        table = self._tables[kind]
+        if self.columnar_cache:
+            store = self._get_columnar_store(subject_id, kind)
+        else:
+            store = self._read_table(subject_id, kind)
+        sec = store["sec"]
+        if table.sort:  # sorted, hence a slice
+            start = 0 if start_sec is None else np.searchsorted(sec, start_sec, side="left")
+            end = len(sec) if end_sec is None else np.searchsorted(sec, end_sec, side="right")
+            inds = slice(start, end)
+        elif start_sec is None and end_sec is None:
+            inds = slice(None)
+        else:
+            inds = np.ones((len(sec),), dtype=bool)
+            if start_sec is not None:
+                inds &= (sec >= start_sec)
+            if end_sec is not None:
+                inds &= (sec <= end_sec)
+        df = pd.DataFrame({c: np.array(store[c][inds]) for c in table.columns}, columns=table.columns)
+        return df
+
+
+    def _read_table(self, subject_id:str, kind:str) -> Dict[str, np.ndarray]:
+        """ finished, checked,
+
+        read the text file of the data of some kind of a subject into columns,
+        with the C engine of pandas
+
+        Parameters
+        ----------
+        subject_id: str,
+            subject id in `self.all_subjects`
+        kind: str,
+            one of "labels", "motion", "hr", "steps"
+
+        Returns
+        -------
+        columns: dict of ndarray,
+            the columns of the data, sorted and deduplicated by "sec" if `self._tables[kind].sort` is True
+        """
+        table = self._tables[kind]
+        fp = os.path.join(table.dir, subject_id+table.suffix)
+        df = pd.read_csv(fp, sep=table.sep, header=None, names=table.columns, engine="c")
+        if table.sort:
+            df = df.sort_values(by="sec")
+            df = df.drop_duplicates(subset="sec")
+        columns = {c: df[c].to_numpy(dtype=dt) for c, dt in zip(table.columns, table.dtypes)}
+        return columns
+
+
+    def _get_columnar_store(self, subject_id:str, kind:str) -> Dict[str, np.ndarray]:
+        """ finished, checked,
+
+        get the columnar files of the data of some kind of a subject,
+        converting the text file at the first call (or when the text file, or the version of the package changes),
+        the store (in `working_dir`) consists of one memory-mapped .npy file per column
+
+        Parameters
+        ----------
+        subject_id: str,
+            subject id in `self.all_subjects`
+        kind: str,
+            one of "labels", "motion", "hr", "steps"
+
+        Returns
+        -------
+        store: dict of ndarray,
+            the (memory-mapped) columns of the data
+        """
+        table = self._tables[kind]
+        file_path = os.path.abspath(os.path.join(table.dir, subject_id+table.suffix))
+        stat = os.stat(file_path)
+        source = ED(version=__version__, source=file_path, mtime=stat.st_mtime, size=stat.st_size)
+        key = (subject_id, kind)
+        store = self._columnar_stores.get(key, None)
+        if store is not None and store.source == source:
+            return store.data
+        store_dir = os.path.join(self.working_dir, "columnar_stores", self.db_name, subject_id, kind)
+        try:
+            with open(os.path.join(store_dir, "meta.json"), "r") as f:
+                meta = ED(json.load(f))
+            if meta.source != source:
+                raise ValueError("outdated store")
+        except:
+            self.logger.info(f"converting {file_path} into columnar files in {store_dir}")
+            columns = self._read_table(subject_id, kind)
+            tmp_dir = f"{store_dir}.{os.getpid()}.tmp"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            for c in table.columns:
+                np.save(os.path.join(tmp_dir, f"{c}.npy"), columns[c])
+            with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+                json.dump({"source": source}, f)
+            shutil.rmtree(store_dir, ignore_errors=True)
+            os.makedirs(os.path.dirname(store_dir), exist_ok=True)
+            os.replace(tmp_dir, store_dir)
+        store = ED(
+            source=source,
+            data={c: np.load(os.path.join(store_dir, f"{c}.npy"), mmap_mode="r") for c in table.columns},
+        )
+        self._columnar_stores[key] = store
+        return store.data
+
+
     def plot_lb(self, subject_id:str, style:str, **kwargs) -> pd.DataFrame:
         """ finished, checked,
 
@@ -266,11 +424,12 @@ class SleepAccel(OtherDataBase):
             ax_lb.set_yticklabels(["unscored","N4","N3","N2","N1","REM","wake"])
         
         lb_rg_t = df_lb.iloc[[0,-1]]["sec"].values
-        df_mt = self.load_motion_data(subject_id)
         if lag is not None:
             lb_rg_t[0] = lb_rg_t[0]-lag
             lb_rg_t[-1] = lb_rg_t[-1]+lag
-            df_mt = df_mt[(df_mt["sec"]>=lb_rg_t[0])&(df_mt["sec"]<=lb_rg_t[1])]
+            df_mt = self.load_motion_data(subject_id, start_sec=lb_rg_t[0], end_sec=lb_rg_t[1])
+        else:
+            df_mt = self.load_motion_data(subject_id)
         ax_mt = ax_lb.twinx()
         ax_mt.plot(df_mt["sec"].values, df_mt["x"].values, label="x")
         ax_mt.plot(df_mt["sec"].values, df_mt["y"].values, label="y")
@@ -318,11 +477,12 @@ class SleepAccel(OtherDataBase):
             ax_lb.set_yticks(np.arange(0,7,1))
             ax_lb.set_yticklabels(["unscored","N4","N3","N2","N1","REM","wake"])
         lb_rg_t = df_lb.iloc[[0,-1]]["sec"].values
-        df_mt = self.load_motion_data(subject_id)
         if lag is not None:
             lb_rg_t[0] = lb_rg_t[0]-lag
             lb_rg_t[-1] = lb_rg_t[-1]+lag
-            df_mt = df_mt[(df_mt["sec"]>=lb_rg_t[0])&(df_mt["sec"]<=lb_rg_t[1])]
+            df_mt = self.load_motion_data(subject_id, start_sec=lb_rg_t[0], end_sec=lb_rg_t[1])
+        else:
+            df_mt = self.load_motion_data(subject_id)
         df_rsmpl = self.resample_motion_data(df_mt, output_fs=50)
         epoch_len = 60  # seconds
         ct_vals = self.acc_to_count(df_rsmpl, acc_fs=50, epoch_len=epoch_len)
@@ -9,30 +9,62 @@ About the header (.hea) files:
 https://physionet.org/physiotools/wag/header-5.htm
 """
 
-from .afdb import *
-from .aftdb import *
-from .apnea_ecg import *
-from .bidmc import *
-from .butqdb import *
-from .capslpdb import *
-from .cinc2017 import *
-from .cinc2018 import *
-from .cinc2020 import *
-from .cinc2021 import *
-from .edb import *
-from .ltafdb import *
-from .ltstdb import *
-from .ludb import *
-from .mimic3 import *
-from .mitdb import *
-from .nstdb import *
-from .qtdb import *
-from .slpdb import *
-from .stdb import *
-from .ucddb import *
-from .incartdb import *
-from .ptbdb import *
-from .ptb_xl import *
+from .._lazy import attach
 
 
-__all__ = [s for s in dir() if not s.startswith("_")]
+# the modules (and their dependencies) are imported at the first access of the exported names
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=[
+        "afdb",
+        "aftdb",
+        "apnea_ecg",
+        "bidmc",
+        "butqdb",
+        "capslpdb",
+        "cinc2017",
+        "cinc2018",
+        "cinc2020",
+        "cinc2021",
+        "edb",
+        "ltafdb",
+        "ltstdb",
+        "ludb",
+        "mimic3",
+        "mitdb",
+        "nstdb",
+        "qtdb",
+        "slpdb",
+        "stdb",
+        "ucddb",
+        "incartdb",
+        "ptbdb",
+        "ptb_xl",
+    ],
+    submod_attrs={
+        "afdb": ["AFDB"],
+        "aftdb": ["AFTDB"],
+        "apnea_ecg": ["ApneaECG"],
+        "bidmc": ["BIDMC"],
+        "butqdb": ["BUTQDB"],
+        "capslpdb": ["CAPSLPDB"],
+        "cinc2017": ["CINC2017"],
+        "cinc2018": ["CINC2018"],
+        "cinc2020": ["CINC2020", "compute_metrics", "compute_all_metrics"],
+        "cinc2021": ["CINC2021"],
+        "edb": ["EDB"],
+        "ltafdb": ["LTAFDB"],
+        "ltstdb": ["LTSTDB"],
+        "ludb": ["LUDB"],
+        "mimic3": ["MIMIC3"],
+        "mitdb": ["MITDB"],
+        "nstdb": ["NSTDB"],
+        "qtdb": ["QTDB"],
+        "slpdb": ["SLPDB"],
+        "stdb": ["STDB"],
+        "ucddb": ["UCDDB"],
+        "incartdb": ["INCARTDB"],
+        "ptbdb": ["PTBDB"],
+        "ptb_xl": ["PTB_XL"],
+    },
+)
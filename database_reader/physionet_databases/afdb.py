@@ -5,12 +5,13 @@ import os
 import json
 import math
 from datetime import datetime
-from typing import Union, Optional, Any, List, Tuple, Dict, Sequence, NoReturn
+from typing import Union, Optional, Any, List, Tuple, Dict, Sequence, Iterator, NoReturn
 from numbers import Real
 
 import numpy as np
 np.set_printoptions(precision=5, suppress=True)
 import pandas as pd
+from scipy.signal import resample_poly
 import wfdb
 from easydict import EasyDict as ED
 
@@ -21,6 +22,10 @@ from ..utils.common import (
 )
 from ..utils.utils_universal import generalized_intervals_intersection
 from ..base import PhysioNetDataBase
+from ..intervals import (
+    clip_intervals, union_intervals, shift_intervals,
+    label_intervals, runs_to_mask,
+)
 
 
 __all__ = [
@@ -157,7 +162,7 @@ class AFDB(PhysioNetDataBase):
         return data
 
     
-    def load_ann(self, rec:str, sampfrom:Optional[int]=None, sampto:Optional[int]=None, fmt:str="interval", keep_original:bool=False) -> Union[Dict[str, list], np.ndarray]:
+    def load_ann(self, rec:str, sampfrom:Optional[int]=None, sampto:Optional[int]=None, fmt:str="interval", keep_original:bool=False, mask_dtype:type=int) -> Union[Dict[str, list], np.ndarray]:
         """ finished, checked,
 
         load annotations (header) stored in the .hea files
@@ -171,55 +176,94 @@ class AFDB(PhysioNetDataBase):
         sampto: int, optional,
             end index of the annotations to be loaded
         fmt: str, default "interval", case insensitive,
-            format of returned annotation, can also be "mask"
+            format of returned annotation, can also be "mask",
+            or "runs" (alias "rle"), the run-length representation,
+            i.e. an array of shape (n, 3), each row being [start, end, label]
         keep_original: bool, default False,
-            if True, in the "interval" `fmt`,
+            if True, in the "interval" (or "runs") `fmt`,
             intervals (in the form [a,b]) will keep the same with the annotation file
             otherwise subtract `sampfrom` if specified
+        mask_dtype: type, default int,
+            dtype of the mask, for example `np.int8` to reduce memory footprint,
+            used only when `fmt` is "mask"
         
         Returns
         -------
         ann, dict or ndarray,
-            the annotations in the format of intervals, or in the format of mask
+            the annotations in the format of intervals, or in the format of mask, or runs
         """
-        fp = os.path.join(self.db_dir, rec)
-        wfdb_ann = wfdb.rdann(fp, extension=self.ann_ext)
-        header = wfdb.rdheader(fp)
-        sig_len = header.sig_len
+        runs, sig_len = self._load_rhythm_runs(rec)
         sf = sampfrom or 0
         st = sampto or sig_len
         assert st > sf, "`sampto` should be greater than `sampfrom`!"
 
-        ann = ED({k:[] for k in self.class_map.keys()})
-        critical_points = wfdb_ann.sample.tolist() + [sig_len]
-        aux_note = wfdb_ann.aux_note
-        if aux_note[0] == "(N":
-            # ref. the doc string of the class
-            critical_points[0] = 0
-        else:
-            critical_points.insert(0, 0)
-            aux_note.insert(0, "(N")
-
-        for idx, rhythm in enumerate(aux_note):
-            ann[rhythm.replace("(", "")].append([critical_points[idx], critical_points[idx+1]])
         ann = ED({
-            k: generalized_intervals_intersection(l_itv, [[sf,st]]) \
-                for k, l_itv in ann.items()
+            k: clip_intervals(runs[runs[:, 2]==v, :2], sf, st) \
+                for k, v in self.class_map.items()
         })
 
         if fmt.lower() == "mask":
-            tmp = deepcopy(ann)
-            ann = np.full(shape=(st-sf,), fill_value=self.class_map.N, dtype=int)
-            for rhythm, l_itv in tmp.items():
-                for itv in l_itv:
-                    ann[itv[0]-sf: itv[1]-sf] = self.class_map[rhythm]
-        elif not keep_original:
-            for k, l_itv in ann.items():
-                ann[k] = [[itv[0]-sf, itv[1]-sf] for itv in l_itv]
+            ann = runs_to_mask(
+                label_intervals(ann, self.class_map), siglen=st-sf,
+                fill_value=self.class_map.N, start=sf, dtype=mask_dtype,
+            )
+        elif fmt.lower() in ["runs", "rle",]:
+            ann = label_intervals(ann, self.class_map)
+            if not keep_original:
+                ann = shift_intervals(ann, -sf)
+        else:
+            if not keep_original:
+                ann = ED({k: shift_intervals(itvs, -sf) for k, itvs in ann.items()})
+            ann = ED({k: itvs.tolist() for k, itvs in ann.items()})
 
         return ann
 
 
+    def _load_rhythm_runs(self, rec:str) -> Tuple[np.ndarray, int]:
+        """ finished, checked,
+
+        load the rhythm annotations of the whole record, as runs,
+        cached in the annotation sidecar
+
+        Parameters
+        ----------
+        rec: str,
+            name of the record
+
+        Returns
+        -------
+        runs: ndarray,
+            of shape (n, 3), each row being [start, end, label], with labels in `self.class_map`
+        sig_len: int,
+            length of the record
+        """
+        fp = os.path.join(self.db_dir, rec)
+
+        def _parse() -> Dict[str, np.ndarray]:
+            wfdb_ann = wfdb.rdann(fp, extension=self.ann_ext)
+            sig_len = wfdb.rdheader(fp).sig_len
+            critical_points = np.append(wfdb_ann.sample, sig_len)
+            aux_note = np.array(wfdb_ann.aux_note)
+            if aux_note[0] == "(N":
+                # ref. the doc string of the class
+                critical_points[0] = 0
+            else:
+                critical_points = np.insert(critical_points, 0, 0)
+                aux_note = np.insert(aux_note, 0, "(N")
+            rhythms = np.char.replace(aux_note, "(", "")
+            intervals = np.column_stack([critical_points[:-1], critical_points[1:]])
+            runs = label_intervals(
+                {k: union_intervals(intervals[rhythms==k]) for k in self.class_map.keys()},
+                self.class_map,
+            )
+            return {"runs": runs.astype(np.int32), "sig_len": np.array(sig_len)}
+
+        arrays = self._load_ann_sidecar(
+            rec, "rhythm", [f"{fp}.{self.ann_ext}", f"{fp}.{self.header_ext}"], _parse,
+        )
+        return arrays["runs"], int(arrays["sig_len"])
+
+
     def load_beat_ann(self, rec:str, sampfrom:Optional[int]=None, sampto:Optional[int]=None, use_manual:bool=True, keep_original:bool=False) -> np.ndarray:
         """ finished, checked,
 
@@ -250,13 +294,13 @@ class AFDB(PhysioNetDataBase):
             ext = self.manual_beat_ann_ext
         else:
             ext = self.auto_beat_ann_ext
-        ann = wfdb.rdann(
-            fp,
-            extension=ext,
-            sampfrom=sampfrom or 0,
-            sampto=sampto,
-        )
-        ann = ann.sample
+        ann = self._load_ann_sidecar(
+            rec, f"beats_{ext}", [f"{fp}.{ext}"],
+            lambda: {"sample": wfdb.rdann(fp, extension=ext).sample.astype(np.int32)},
+        )["sample"].astype(int)
+        # in accordance with `wfdb.rdann`, `sampto` is inclusive
+        ann = ann[np.searchsorted(ann, sampfrom or 0, side="left"): \
+            np.searchsorted(ann, sampto, side="right") if sampto is not None else None]
         if not keep_original and sampfrom is not None:
             ann -= sampfrom
         return ann
@@ -269,6 +313,75 @@ class AFDB(PhysioNetDataBase):
         return self.load_beat_ann(rec, sampfrom, sampto, use_manual, keep_original)
 
 
+    def iter_windows(self, rec:str, win_len:int, hop:int, leads:Optional[Union[str, List[str]]]=None, fs:Optional[Real]=None, sampfrom:Optional[int]=None, sampto:Optional[int]=None, data_format:str="channel_first", units:str="mV", use_manual:bool=True, block_len:Optional[int]=None) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """ finished, checked,
+
+        iterate over sliding windows of a record,
+        the signal is read sequentially in blocks, with constant memory footprint
+
+        Parameters
+        ----------
+        rec: str,
+            name of the record
+        win_len: int,
+            length of the windows, in number of samples (w.r.t. `fs`)
+        hop: int,
+            step between the starts of consecutive windows, in number of samples (w.r.t. `fs`)
+        leads: str or list of str, optional,
+            the leads to load
+        fs: real number, optional,
+            if not None, the windows (and the annotations) will be resampled to this frequency
+        sampfrom: int, optional,
+            start index (w.r.t. `self.fs`) of the part of the record to iterate over
+        sampto: int, optional,
+            end index (w.r.t. `self.fs`) of the part of the record to iterate over
+        data_format: str, default "channel_first",
+            format of the ecg data,
+            "channel_last" (alias "lead_last"), or
+            "channel_first" (alias "lead_first")
+        units: str, default "mV",
+            units of the output signal, can also be "μV", with an alias of "uV"
+        use_manual: bool, default True,
+            use manually annotated beat annotations (qrs),
+            instead of those generated by algorithms
+        block_len: int, optional,
+            number of samples (w.r.t. `self.fs`) of each sequential read of the signal file
+
+        Yields
+        ------
+        sig: ndarray,
+            the ecg data of the window
+        mask: ndarray,
+            rhythm mask of the window, with values in `self.class_map`
+        rpeaks: ndarray,
+            indices of the rpeaks in the window, relative to the start of the window
+        """
+        if not leads:
+            _leads = self.all_leads
+        elif isinstance(leads, str):
+            _leads = [leads]
+        else:
+            _leads = leads
+        assert set(_leads).issubset(self.all_leads)
+        rhythm_intervals = self.load_ann(rec, fmt="runs", keep_original=True)
+        rpeaks = self.load_rpeak_indices(rec, use_manual=use_manual, keep_original=True)
+        yield from self._iter_wfdb_windows(
+            os.path.join(self.db_dir, rec),
+            win_len=win_len,
+            hop=hop,
+            channels=[self.all_leads.index(l) for l in _leads],
+            fs=fs,
+            sampfrom=sampfrom,
+            sampto=sampto,
+            rhythm_intervals=rhythm_intervals,
+            fill_value=self.class_map.N,
+            rpeaks=np.sort(rpeaks),
+            data_format=data_format,
+            units=units,
+            block_len=block_len,
+        )
+
+
     def plot(self, rec:str, data:Optional[np.ndarray]=None, ann:Optional[Dict[str, np.ndarray]]=None, rpeak_inds:Optional[Union[Sequence[int],np.ndarray]]=None, ticks_granularity:int=0, leads:Optional[Union[str, List[str]]]=None, sampfrom:Optional[int]=None, sampto:Optional[int]=None, same_range:bool=False, **kwargs) -> NoReturn:
         """ finished, checked,
 
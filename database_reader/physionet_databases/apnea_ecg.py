@@ -17,6 +17,7 @@ from ..utils.common import (
     get_record_list_recursive,
 )
 from ..base import PhysioNetDataBase
+from ..sleep_events import make_sleep_events, sleep_events_to_df
 
 
 __all__ = [
@@ -220,7 +221,7 @@ class ApneaECG(PhysioNetDataBase):
         return detailed_ann
 
 
-    def load_apnea_event_ann(self, rec:str, ann_path:Optional[str]=None) -> pd.DataFrame:
+    def load_apnea_event_ann(self, rec:str, ann_path:Optional[str]=None, fmt:str="dataframe") -> Union[pd.DataFrame, np.ndarray]:
         """
 
         Parameters
@@ -230,46 +231,37 @@ class ApneaECG(PhysioNetDataBase):
         ann_path: str, optional,
             path of the file which contains the annotations,
             if not given, default path will be used
+        fmt: str, default "dataframe",
+            format of the returned events, can be "dataframe" or "array",
+            the latter being a structured array of dtype `SLEEP_EVENT_DTYPE`
 
         Returns
         -------
-        df_apnea_ann: DataFrame,
+        df_apnea_ann: DataFrame or ndarray,
             apnea annotations with columns "event_start","event_end", "event_name", "event_duration"
         """
         detailed_anno = self.load_ann(rec, ann_path, extension="apn")
         apnea = np.array([p[0] for p in detailed_anno if p[1] == "A"])
 
         if len(apnea) > 0:
-            apnea_endpoints = [apnea[0]]
-            # TODO: check if split_indices is correctly computed
-            split_indices = np.where(np.diff(apnea)>1)[0].tolist()
-            for i in split_indices:
-                apnea_endpoints += [apnea[i], apnea[i+1]]
-            apnea_endpoints.append(apnea[-1])
-
-            apnea_periods = []
-            for i in range(len(apnea_endpoints)//2):
-                pe = [apnea_endpoints[2*i], apnea_endpoints[2*i+1]]
-                apnea_periods.append(pe)
+            # runs of consecutive minutes
+            split_indices = np.where(np.diff(apnea)>1)[0]
+            apnea_periods = np.column_stack([apnea[np.r_[0, split_indices+1]], apnea[np.r_[split_indices, len(apnea)-1]]])
         else:
-            apnea_periods = []
+            apnea_periods = np.zeros((0, 2), dtype=int)
         
         if len(apnea_periods) > 0:
-            self.logger.info(f"apnea period(s) (units in minutes) of record {rec} is(are): {apnea_periods}")
+            self.logger.info(f"apnea period(s) (units in minutes) of record {rec} is(are): {apnea_periods.tolist()}")
         else:
             self.logger.info(f"record {rec} has no apnea period")
 
-        if len(apnea_periods) == 0:
-            return pd.DataFrame(columns=self.sleep_event_keys)
-
-        apnea_periods = np.array([[60*p[0], 60*p[1]] for p in apnea_periods])  # minutes to seconds
-        apnea_periods = np.array(apnea_periods,dtype=int).reshape((len(apnea_periods),2))
+        apnea_periods = 60 * apnea_periods.astype(int)  # minutes to seconds
 
-        df_apnea_ann = pd.DataFrame(apnea_periods,columns=["event_start","event_end"])
-        df_apnea_ann["event_name"] = "Obstructive Apnea"
-        df_apnea_ann["event_duration"] = df_apnea_ann.apply(lambda row: row["event_end"]-row["event_start"], axis=1)
+        apnea_events = make_sleep_events("Obstructive Apnea", apnea_periods[:, 0], event_end=apnea_periods[:, 1])
+        if fmt.lower() == "array":
+            return apnea_events
 
-        df_apnea_ann = df_apnea_ann[self.sleep_event_keys]
+        df_apnea_ann = sleep_events_to_df(apnea_events)[self.sleep_event_keys]
 
         return df_apnea_ann
 
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """
 """
-import os, io, sys
+import os, sys
 import re
 import json
 import time
@@ -34,7 +34,11 @@ from ..utils.utils_misc.cinc2020_aux_data import (
     equiv_class_dict,
 )
 from ..utils.utils_universal.utils_str import dict_to_str
-from ..base import PhysioNetDataBase
+from ..base import PhysioNetDataBase, LRUCache
+from .cinc_header_index import (
+    build_header_index, header_index_multihot,
+    get_header_entry, parse_header_entry, get_header_arrays, copy_header_ann, parse_leads,
+)
 
 
 __all__ = [
@@ -175,7 +179,9 @@ class CINC2020(PhysioNetDataBase):
             working directory, to store intermediate files and log file
         verbose: int, default 2,
             log verbosity
-        kwargs: auxilliary key word arguments
+        kwargs: auxilliary key word arguments,
+            e.g. `header_cache_size` (default 1024), the maximum number of parsed headers kept in memory,
+            `n_workers` (default `os.cpu_count()`), number of processes for building the header index
         """
         super().__init__(db_name="CINC2020", db_dir=db_dir, working_dir=working_dir, verbose=verbose, **kwargs)
         
@@ -198,6 +204,12 @@ class CINC2020(PhysioNetDataBase):
         self.db_dir_base = db_dir
         self.db_dirs = ED({tranche:"" for tranche in self.db_tranches})
         self._all_records = None
+        # parsed headers, keyed by (record name, mtime of the header file)
+        self._header_cache = LRUCache(maxsize=kwargs.get("header_cache_size", 1024))
+        self._header_index = None
+        self._header_index_fp = os.path.join(self.working_dir, f"{self.db_name}_header_index.npz")
+        self._dx_codes = dx_mapping_all["SNOMED CT Code"].astype(str).tolist()
+        self._n_workers = kwargs.get("n_workers", None)
         self._ls_rec()  # loads file system structures into self.db_dirs and self._all_records
 
         self._diagnoses_records_list = None
@@ -297,18 +309,67 @@ class CINC2020(PhysioNetDataBase):
             print("Please wait several minutes patiently to let the reader list records for each diagnosis...")
             start = time.time()
             self._diagnoses_records_list = {d: [] for d in df_weights_abbr.columns.values.tolist()}
-            for tranche, l_rec in self._all_records.items():
-                for rec in l_rec:
-                    ann = self.load_ann(rec)
-                    ld = ann["diagnosis_scored"]["diagnosis_abbr"]
-                    for d in ld:
-                        self._diagnoses_records_list[d].append(rec)
+            multihot = self._get_dx_multihot()
+            abbr = dx_mapping_all["Abbreviation"].values
+            scored = np.isin(self._dx_codes, dx_mapping_scored["SNOMED CT Code"].astype(str).values)
+            for d in df_weights_abbr.columns.values.tolist():
+                cols = np.where((abbr == d) & scored)[0]
+                self._diagnoses_records_list[d] = \
+                    self.header_index["record"][multihot[:, cols].any(axis=1)].tolist()
             print(f"Done in {time.time() - start:.5f} seconds!")
             with open(dr_fp, "w") as f:
                 json.dump(self._diagnoses_records_list, f)
         self._all_records = ED(self._all_records)
 
 
+    def build_header_index(self, force:bool=False) -> np.ndarray:
+        """ finished, checked,
+
+        build (or incrementally update) the columnar index of all the header files,
+        ref. `cinc_header_index.build_header_index`
+
+        Parameters
+        ----------
+        force: bool, default False,
+            if True, all header files are re-parsed
+
+        Returns
+        -------
+        index: ndarray,
+            the structured array of the index, one row per record
+        """
+        records = [
+            (rec, tranche, self.get_header_filepath(rec, with_ext=True)) \
+                for tranche in self.db_tranches for rec in self._all_records[tranche]
+        ]
+        self._header_index = build_header_index(
+            records, self._dx_codes, self._header_index_fp,
+            n_workers=self._n_workers, force=force, verbose=self.verbose,
+        )
+        return self._header_index
+
+
+    @property
+    def header_index(self) -> np.ndarray:
+        """ finished, checked,
+        """
+        if self._header_index is None:
+            self.build_header_index()
+        return self._header_index
+
+
+    def _get_dx_multihot(self) -> np.ndarray:
+        """ finished, checked,
+
+        Returns
+        -------
+        multihot: ndarray,
+            boolean array of shape (nb_records, nb_classes),
+            rows in the order of `self.header_index`, columns in the order of `dx_mapping_all`
+        """
+        return header_index_multihot(self.header_index, len(self._dx_codes))
+
+
     @property
     def diagnoses_records_list(self):
         """ finished, checked,
@@ -446,9 +507,7 @@ class CINC2020(PhysioNetDataBase):
             # loadmat of "lead_first" format
             rec_fp = self.get_data_filepath(rec, with_ext=True)
             data = loadmat(rec_fp)["val"]
-            header_info = self.load_ann(rec, raw=False)["df_leads"]
-            baselines = header_info["baseline"].values.reshape(data.shape[0], -1)
-            adc_gain = header_info["adc_gain"].values.reshape(data.shape[0], -1)
+            _, adc_gain, baselines = self._get_header_arrays(rec)
             data = np.asarray(data-baselines) / adc_gain
             leads_ind = [self.all_leads.index(item) for item in _leads]
             data = data[leads_ind,:]
@@ -491,24 +550,25 @@ class CINC2020(PhysioNetDataBase):
         ann_dict, dict or str,
             the annotations with items: ref. `self.ann_items`
         """
-        tranche = self._get_tranche(rec)
-        ann_fp = self.get_ann_filepath(rec, with_ext=True)
-        with open(ann_fp, "r") as f:
-            header_data = f.read().splitlines()
+        header_entry = self._get_header_entry(rec)
         
         if raw:
-            ann_dict = "\n".join(header_data)
+            ann_dict = "\n".join(header_entry["header_data"])
             return ann_dict
 
-        if backend.lower() == "wfdb":
-            ann_dict = self._load_ann_wfdb(rec, header_data)
-        elif backend.lower() == "naive":
-            ann_dict = self._load_ann_naive(header_data)
-        else:
-            raise ValueError(f"backend `{backend.lower()}` not supported for loading annotations")
+        ann_dict = self._parse_header_entry(rec, header_entry, backend)
+        # copied, so that modifications from the caller would not pollute the cache
+        ann_dict = copy_header_ann(ann_dict)
         return ann_dict
 
 
+    # helpers of the header cache, shared by `CINC2020` and `CINC2021`, ref. `cinc_header_index`
+    _get_header_entry = get_header_entry
+    _parse_header_entry = parse_header_entry
+    _get_header_arrays = get_header_arrays
+    _parse_leads = staticmethod(parse_leads)
+
+
     def _load_ann_wfdb(self, rec:str, header_data:List[str]) -> dict:
         """ finished, checked,
 
@@ -675,34 +735,6 @@ class CINC2020(PhysioNetDataBase):
         return diag_dict, diag_scored_dict
 
 
-    def _parse_leads(self, l_leads_data:List[str]) -> pd.DataFrame:
-        """ finished, checked,
-
-        Parameters
-        ----------
-        l_leads_data: list of str,
-            raw information of each lead, read from a header file
-
-        Returns
-        -------
-        df_leads: DataFrame,
-            infomation of each leads in the format of DataFrame
-        """
-        df_leads = pd.read_csv(io.StringIO("\n".join(l_leads_data)), delim_whitespace=True, header=None)
-        df_leads.columns = ["filename", "fmt+byte_offset", "adc_gain+units", "adc_res", "adc_zero", "init_value", "checksum", "block_size", "lead_name",]
-        df_leads["fmt"] = df_leads["fmt+byte_offset"].apply(lambda s: s.split("+")[0])
-        df_leads["byte_offset"] = df_leads["fmt+byte_offset"].apply(lambda s: s.split("+")[1])
-        df_leads["adc_gain"] = df_leads["adc_gain+units"].apply(lambda s: s.split("/")[0])
-        df_leads["adc_units"] = df_leads["adc_gain+units"].apply(lambda s: s.split("/")[1])
-        for k in ["byte_offset", "adc_gain", "adc_res", "adc_zero", "init_value", "checksum",]:
-            df_leads[k] = df_leads[k].apply(lambda s: int(s))
-        df_leads["baseline"] = df_leads["adc_zero"]
-        df_leads = df_leads[["filename", "fmt", "byte_offset", "adc_gain", "adc_units", "adc_res", "adc_zero", "baseline", "init_value", "checksum", "block_size", "lead_name"]]
-        df_leads.index = df_leads["lead_name"]
-        df_leads.index.name = None
-        return df_leads
-
-
     def load_header(self, rec:str, raw:bool=False) -> Union[dict,str]:
         """
         alias for `load_ann`, as annotations are also stored in header files
@@ -1023,7 +1055,7 @@ class CINC2020(PhysioNetDataBase):
         plt.show()
 
 
-    def get_tranche_class_distribution(self, tranches:Sequence[str], scored_only:bool=True) -> Dict[str, int]:
+    def get_tranche_class_distribution(self, tranches:Sequence[str], scored_only:bool=True, from_index:bool=False) -> Dict[str, int]:
         """ finished, checked,
 
         Parameters
@@ -1032,12 +1064,25 @@ class CINC2020(PhysioNetDataBase):
             tranche symbols (A-F)
         scored_only: bool, default True,
             only get class distributions that are scored in the CINC2020 official phase
+        from_index: bool, default False,
+            if True, the distribution is counted from the header files (via `self.header_index`),
+            otherwise from the precomputed counts in `dx_mapping_scored` (`dx_mapping_all`)
         
         Returns
         -------
         distribution: dict,
             keys are abbrevations of the classes, values are appearance of corr. classes in the tranche.
         """
+        if from_index:
+            rows = np.isin(self.header_index["tranche"], list(tranches))
+            counts = self._get_dx_multihot()[rows].sum(axis=0)
+            if scored_only:
+                counts[~np.isin(self._dx_codes, dx_mapping_scored["SNOMED CT Code"].astype(str).values)] = 0
+            distribution = ED()
+            for d, num in zip(dx_mapping_all["Abbreviation"].values, counts):
+                if num > 0:
+                    distribution[d] = distribution.get(d, 0) + int(num)
+            return distribution
         tranche_names = [self.tranche_names[t] for t in tranches]
         df = dx_mapping_scored if scored_only else dx_mapping_all
         distribution = ED()
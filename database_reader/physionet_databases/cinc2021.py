@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """
 """
-import os, io, sys
+import os, sys
 import re
 import json
 import time
@@ -35,8 +35,12 @@ from ..utils.utils_misc.cinc2020_aux_data import (
     equiv_class_dict,
 )
 from ..utils.utils_universal.utils_str import dict_to_str
-from ..utils.common import list_sum
-from ..base import PhysioNetDataBase
+from ..base import PhysioNetDataBase, LRUCache
+from ..version import version as __version__
+from .cinc_header_index import (
+    build_header_index, header_index_multihot, compute_cooccurrence,
+    get_header_entry, parse_header_entry, get_header_arrays, copy_header_ann, parse_leads,
+)
 
 
 __all__ = [
@@ -193,7 +197,9 @@ class CINC2021(PhysioNetDataBase):
             working directory, to store intermediate files and log file
         verbose: int, default 2,
             log verbosity
-        kwargs: auxilliary key word arguments
+        kwargs: auxilliary key word arguments,
+            e.g. `header_cache_size` (default 1024), the maximum number of parsed headers kept in memory,
+            `n_workers` (default `os.cpu_count()`), number of processes for building the header index
         """
         super().__init__(db_name="CinC2021", db_dir=db_dir, working_dir=working_dir, verbose=verbose, **kwargs)
         
@@ -217,6 +223,8 @@ class CINC2021(PhysioNetDataBase):
         self.db_dir_base = db_dir
         self.db_dirs = ED({tranche:"" for tranche in self.db_tranches})
         self._all_records = None
+        # parsed headers, keyed by (record name, mtime of the header file)
+        self._header_cache = LRUCache(maxsize=kwargs.get("header_cache_size", 1024))
         self._stats = pd.DataFrame()
         self._stats_columns = {
             "record", "tranche", "tranche_name",
@@ -225,6 +233,11 @@ class CINC2021(PhysioNetDataBase):
             "medical_prescription", "history", "symptom_or_surgery",
             "diagnosis", "diagnosis_scored",  # in the form of abbreviations
         }
+        self._header_index = None
+        self._header_index_fp = os.path.join(self.working_dir, f"{self.db_name}_header_index.npz")
+        self._dx_codes = dx_mapping_all["SNOMEDCTCode"].astype(str).tolist()
+        self._n_workers = kwargs.get("n_workers", None)
+        self._resampled_stores = {}  # memory maps, not pickled, ref. `self.__getstate__`
         self._ls_rec()  # loads file system structures into self.db_dirs and self._all_records
         self._aggregate_stats(fast=True)
 
@@ -264,6 +277,16 @@ class CINC2021(PhysioNetDataBase):
         ]
 
 
+    def __getstate__(self) -> dict:
+        """
+        the memory maps of the resampled stores are not pickled (e.g. sent to worker processes),
+        they are reopened lazily in each process, ref. `self._open_resampled_store`
+        """
+        state = self.__dict__.copy()
+        state["_resampled_stores"] = {}
+        return state
+
+
     def get_subject_id(self, rec:str) -> int:
         """ finished, checked,
 
@@ -350,17 +373,7 @@ class CINC2021(PhysioNetDataBase):
         if self._stats.empty or self._stats_columns != set(self._stats.columns):
             print("Please wait patiently to let the reader collect statistics on the whole dataset...")
             start = time.time()
-            self._stats = pd.DataFrame(list_sum(self._all_records.values()), columns=["record"])
-            self._stats["tranche"] = self._stats["record"].apply(lambda rec: self._get_tranche(rec))
-            self._stats["tranche_name"] = self._stats["tranche"].apply(lambda t: self.tranche_names[t])
-            for k in ["diagnosis", "diagnosis_scored",]:
-                self._stats[k] = ""  # otherwise cells in the first row would be str instead of list
-            for idx, row in self._stats.iterrows():
-                ann_dict = self.load_ann(row["record"])
-                for k in ["nb_leads", "fs", "nb_samples", "age", "sex", "medical_prescription", "history", "symptom_or_surgery",]:
-                    self._stats.at[idx, k] = ann_dict[k]
-                for k in ["diagnosis", "diagnosis_scored",]:
-                    self._stats.at[idx, k] = ann_dict[k]["diagnosis_abbr"]
+            self._stats = self._stats_from_header_index()
             _stats_to_save = self._stats.copy()
             for k in ["diagnosis", "diagnosis_scored",]:
                 _stats_to_save[k] = _stats_to_save[k].apply(lambda l: list_sep.join(l))
@@ -368,8 +381,94 @@ class CINC2021(PhysioNetDataBase):
             print(f"Done in {time.time() - start:.5f} seconds!")
         else:
             for k in ["diagnosis", "diagnosis_scored",]:
-                for idx, row in self._stats.iterrows():
-                    self._stats.at[idx, k] = row[k].split(list_sep)
+                self._stats[k] = [
+                    l.split(list_sep) if isinstance(l, str) else [] for l in self._stats[k]
+                ]
+
+
+    def build_header_index(self, force:bool=False) -> np.ndarray:
+        """ finished, checked,
+
+        build (or incrementally update) the columnar index of all the header files,
+        ref. `cinc_header_index.build_header_index`
+
+        Parameters
+        ----------
+        force: bool, default False,
+            if True, all header files are re-parsed
+
+        Returns
+        -------
+        index: ndarray,
+            the structured array of the index, one row per record
+        """
+        records = [
+            (rec, tranche, self.get_header_filepath(rec, with_ext=True)) \
+                for tranche in self.db_tranches for rec in self._all_records[tranche]
+        ]
+        self._header_index = build_header_index(
+            records, self._dx_codes, self._header_index_fp,
+            n_workers=self._n_workers, force=force, verbose=self.verbose,
+        )
+        return self._header_index
+
+
+    @property
+    def header_index(self) -> np.ndarray:
+        """ finished, checked,
+        """
+        if self._header_index is None:
+            self.build_header_index()
+        return self._header_index
+
+
+    def _get_dx_multihot(self) -> np.ndarray:
+        """ finished, checked,
+
+        Returns
+        -------
+        multihot: ndarray,
+            boolean array of shape (nb_records, nb_classes),
+            rows in the order of `self.header_index`, columns in the order of `dx_mapping_all`
+        """
+        return header_index_multihot(self.header_index, len(self._dx_codes))
+
+
+    def _stats_from_header_index(self) -> pd.DataFrame:
+        """ finished, checked,
+
+        derive the stats of the whole dataset (ref. `self._stats_columns`) from the header index
+
+        Returns
+        -------
+        df_stats: DataFrame,
+            the stats, with diagnoses in the form of lists of abbreviations,
+            in the same order as in the header files (ref. `self._parse_diagnosis`)
+        """
+        index = self.header_index
+        code_to_abbr = dict(zip(self._dx_codes, dx_mapping_all["Abbreviation"].tolist()))
+        scored_codes = set(dx_mapping_scored["SNOMEDCTCode"].astype(str).tolist())
+        df_stats = pd.DataFrame({
+            "record": index["record"],
+            "tranche": index["tranche"],
+        })
+        df_stats["tranche_name"] = df_stats["tranche"].map(self.tranche_names)
+        for k in ["nb_leads", "fs", "nb_samples", "sex", "medical_prescription", "history", "symptom_or_surgery",]:
+            df_stats[k] = index[k]
+        # ages are stored as float (nan for missing ages) in the index,
+        # made consistent with the dtype of the column read from the saved stats file
+        age = index["age"].astype(np.float64)
+        df_stats["age"] = age if np.isnan(age).any() else age.astype(np.int64)
+        # codes not listed in `dx_mapping_all` are kept as they are (and put at the end), ref. ISSUE 7
+        diagnosis, diagnosis_scored = [], []
+        for raw in index["dx_raw"].tolist():
+            codes = raw.split(",") if raw else []
+            listed = [c for c in codes if c in code_to_abbr]
+            diagnosis.append([code_to_abbr[c] for c in listed] + [c for c in codes if c not in code_to_abbr])
+            diagnosis_scored.append([code_to_abbr[c] for c in listed if c in scored_codes])
+        df_stats["diagnosis"] = diagnosis
+        df_stats["diagnosis_scored"] = diagnosis_scored
+        return df_stats
 
 
     def _find_dir(self, root:str, tranche:str, level:int=0) -> str:
@@ -435,12 +534,13 @@ class CINC2021(PhysioNetDataBase):
                     self._diagnoses_records_list[d] = \
                         sorted(self._stats[self._stats["diagnosis_scored"].apply(lambda l: d in l)]["record"].tolist())
             else:
-                for tranche, l_rec in self._all_records.items():
-                    for rec in l_rec:
-                        ann = self.load_ann(rec)
-                        ld = ann["diagnosis_scored"]["diagnosis_abbr"]
-                        for d in ld:
-                            self._diagnoses_records_list[d].append(rec)
+                multihot = self._get_dx_multihot()
+                abbr = dx_mapping_all["Abbreviation"].values
+                scored = np.isin(self._dx_codes, dx_mapping_scored["SNOMEDCTCode"].astype(str).values)
+                for d in df_weights_abbr.columns.values.tolist():
+                    cols = np.where((abbr == d) & scored)[0]
+                    self._diagnoses_records_list[d] = \
+                        sorted(self.header_index["record"][multihot[:, cols].any(axis=1)].tolist())
             print(f"Done in {time.time() - start:.5f} seconds!")
             with open(dr_fp, "w") as f:
                 json.dump(self._diagnoses_records_list, f)
@@ -588,9 +688,7 @@ class CINC2021(PhysioNetDataBase):
             # loadmat of "lead_first" format
             rec_fp = self.get_data_filepath(rec, with_ext=True)
             data = loadmat(rec_fp)["val"]
-            header_info = self.load_ann(rec, raw=False)["df_leads"]
-            baselines = header_info["baseline"].values.reshape(data.shape[0], -1)
-            adc_gain = header_info["adc_gain"].values.reshape(data.shape[0], -1)
+            _, adc_gain, baselines = self._get_header_arrays(rec)
             data = np.asarray(data-baselines) / adc_gain
             leads_ind = [self.all_leads.index(item) for item in _leads]
             data = data[leads_ind,:]
@@ -636,24 +734,25 @@ class CINC2021(PhysioNetDataBase):
         ann_dict, dict or str,
             the annotations with items: ref. `self.ann_items`
         """
-        tranche = self._get_tranche(rec)
-        ann_fp = self.get_ann_filepath(rec, with_ext=True)
-        with open(ann_fp, "r") as f:
-            header_data = f.read().splitlines()
+        header_entry = self._get_header_entry(rec)
         
         if raw:
-            ann_dict = "\n".join(header_data)
+            ann_dict = "\n".join(header_entry["header_data"])
             return ann_dict
 
-        if backend.lower() == "wfdb":
-            ann_dict = self._load_ann_wfdb(rec, header_data)
-        elif backend.lower() == "naive":
-            ann_dict = self._load_ann_naive(header_data)
-        else:
-            raise ValueError(f"backend `{backend.lower()}` not supported for loading annotations")
+        ann_dict = self._parse_header_entry(rec, header_entry, backend)
+        # copied, so that modifications from the caller would not pollute the cache
+        ann_dict = copy_header_ann(ann_dict)
         return ann_dict
 
 
+    # helpers of the header cache, shared by `CINC2020` and `CINC2021`, ref. `cinc_header_index`
+    _get_header_entry = get_header_entry
+    _parse_header_entry = parse_header_entry
+    _get_header_arrays = get_header_arrays
+    _parse_leads = staticmethod(parse_leads)
+
+
     def _load_ann_wfdb(self, rec:str, header_data:List[str]) -> dict:
         """ finished, checked,
 
@@ -851,34 +950,6 @@ class CINC2021(PhysioNetDataBase):
         return diag_dict, diag_scored_dict
 
 
-    def _parse_leads(self, l_leads_data:List[str]) -> pd.DataFrame:
-        """ finished, checked,
-
-        Parameters
-        ----------
-        l_leads_data: list of str,
-            raw information of each lead, read from a header file
-
-        Returns
-        -------
-        df_leads: DataFrame,
-            infomation of each leads in the format of DataFrame
-        """
-        df_leads = pd.read_csv(io.StringIO("\n".join(l_leads_data)), delim_whitespace=True, header=None)
-        df_leads.columns = ["filename", "fmt+byte_offset", "adc_gain+units", "adc_res", "adc_zero", "init_value", "checksum", "block_size", "lead_name",]
-        df_leads["fmt"] = df_leads["fmt+byte_offset"].apply(lambda s: s.split("+")[0])
-        df_leads["byte_offset"] = df_leads["fmt+byte_offset"].apply(lambda s: s.split("+")[1])
-        df_leads["adc_gain"] = df_leads["adc_gain+units"].apply(lambda s: s.split("/")[0])
-        df_leads["adc_units"] = df_leads["adc_gain+units"].apply(lambda s: s.split("/")[1])
-        for k in ["byte_offset", "adc_gain", "adc_res", "adc_zero", "init_value", "checksum",]:
-            df_leads[k] = df_leads[k].apply(lambda s: int(s))
-        df_leads["baseline"] = df_leads["adc_zero"]
-        df_leads = df_leads[["filename", "fmt", "byte_offset", "adc_gain", "adc_units", "adc_res", "adc_zero", "baseline", "init_value", "checksum", "block_size", "lead_name"]]
-        df_leads.index = df_leads["lead_name"]
-        df_leads.index.name = None
-        return df_leads
-
-
     def load_header(self, rec:str, raw:bool=False) -> Union[dict,str]:
         """
         alias for `load_ann`, as annotations are also stored in header files
@@ -961,7 +1032,7 @@ class CINC2021(PhysioNetDataBase):
             sampling frequency of the record `rec`
         """
         if from_hea:
-            fs = self.load_ann(rec)["fs"]
+            fs = self._get_header_arrays(rec)[0]
         else:
             tranche = self._get_tranche(rec)
             fs = self.fs[tranche]
@@ -1234,7 +1305,8 @@ class CINC2021(PhysioNetDataBase):
 
     def get_tranche_class_distribution(self,
                                        tranches:Sequence[str],
-                                       scored_only:bool=True) -> Dict[str, int]:
+                                       scored_only:bool=True,
+                                       from_index:bool=False) -> Dict[str, int]:
         """ finished, checked,
 
         Parameters
@@ -1243,12 +1315,25 @@ class CINC2021(PhysioNetDataBase):
             tranche symbols (A-F)
         scored_only: bool, default True,
             only get class distributions that are scored in the CinC2021 official phase
+        from_index: bool, default False,
+            if True, the distribution is counted from the header files (via `self.header_index`),
+            otherwise from the precomputed counts in `dx_mapping_scored` (`dx_mapping_all`)
         
         Returns
         -------
         distribution: dict,
             keys are abbrevations of the classes, values are appearance of corr. classes in the tranche.
         """
+        if from_index:
+            rows = np.isin(self.header_index["tranche"], list(tranches))
+            counts = self._get_dx_multihot()[rows].sum(axis=0)
+            if scored_only:
+                counts[~np.isin(self._dx_codes, dx_mapping_scored["SNOMEDCTCode"].astype(str).values)] = 0
+            distribution = ED()
+            for d, num in zip(dx_mapping_all["Abbreviation"].values, counts):
+                if num > 0:
+                    distribution[d] = distribution.get(d, 0) + int(num)
+            return distribution
         tranche_names = [self.tranche_names[t] for t in tranches]
         df = dx_mapping_scored if scored_only else dx_mapping_all
         distribution = ED()
@@ -1293,8 +1378,9 @@ class CINC2021(PhysioNetDataBase):
                             siglen:Optional[int]=None) -> np.ndarray:
         """ finished, checked,
 
-        resample the data of `rec` to 500Hz,
-        or load the resampled data in 500Hz, if the corr. data file already exists
+        load the data of `rec` resampled to 500Hz,
+        from the consolidated store (ref. `self.build_resampled_store`) if it exists,
+        otherwise the data is resampled on the fly
 
         Parameters
         ----------
@@ -1314,7 +1400,9 @@ class CINC2021(PhysioNetDataBase):
         Returns
         -------
         data: ndarray,
-            the resampled (and perhaps sliced) signal data
+            the resampled (and perhaps sliced) signal data,
+            if loaded from the store, it is a read-only view (of dtype float32) of the memory-mapped file,
+            which is NOT copied if the leads are consecutive (or equally spaced)
         """
         if leads is None or leads == "all":
             _leads = self.all_leads
@@ -1324,39 +1412,19 @@ class CINC2021(PhysioNetDataBase):
             _leads = leads
         assert set(_leads).issubset(self._all_leads_set)
         _leads = [self.all_leads.index(item) for item in _leads]
+        if len(_leads) == 1 or (len(set(np.diff(_leads))) == 1 and _leads[1] > _leads[0]):
+            # equally spaced leads, selected via slicing, which produces a view
+            _leads = slice(_leads[0], _leads[-1]+1, (_leads[1]-_leads[0]) if len(_leads) > 1 else 1)
 
         tranche = self._get_tranche(rec)
-        if siglen is None:
-            rec_fp = os.path.join(self.db_dirs[tranche], f"{rec}_500Hz.npy")
+        store = self._open_resampled_store(tranche, siglen)
+        if store is not None and rec in store["pos"]:
+            pos = store["pos"][rec]
+            offset, length = store["offsets"][pos], store["lengths"][pos]
+            nb_leads = len(self.all_leads)
+            data = np.asarray(store["data"][offset: offset+nb_leads*length]).reshape(nb_leads, length)
         else:
-            rec_fp = os.path.join(self.db_dirs[tranche], f"{rec}_500Hz_siglen_{siglen}.npy")
-        if not os.path.isfile(rec_fp):
-            # print(f"corresponding file {os.basename(rec_fp)} does not exist")
-            # NOTE: if not exists, create the data file,
-            # so that the ordering of leads keeps in accordance with `Standard12Leads`
-            data = self.load_data(
-                rec,
-                leads="all",
-                data_format="channel_first",
-                units="mV",
-                fs=None
-            )
-            rec_fs = self.get_fs(rec, from_hea=True)
-            if rec_fs != 500:
-                data = resample_poly(data, 500, rec_fs, axis=1)
-            # if self.fs[tranche] != 500:
-            #     data = resample_poly(data, 500, self.fs[tranche], axis=1)
-            if siglen is not None and data.shape[1] >= siglen:
-                # slice_start = (data.shape[1] - siglen)//2
-                # slice_end = slice_start + siglen
-                # data = data[..., slice_start:slice_end]
-                data = ensure_siglen(data, siglen=siglen, fmt="channel_first")
-                np.save(rec_fp, data)
-            elif siglen is None:
-                np.save(rec_fp, data)
-        else:
-            # print(f"loading from local file...")
-            data = np.load(rec_fp)
+            data = self._resample_record(rec, siglen)
         # choose data of specific leads
         data = data[_leads, ...]
         if data_format.lower() in ["channel_last", "lead_last"]:
@@ -1364,6 +1432,214 @@ class CINC2021(PhysioNetDataBase):
         return data
 
 
+    def _resample_record(self, rec:str, siglen:Optional[int]=None) -> np.ndarray:
+        """ finished, checked,
+
+        resample the data (all leads) of `rec` to 500Hz, and slice to `siglen` if applicable
+
+        Parameters
+        ----------
+        rec: str,
+            name of the record
+        siglen: int, optional,
+            signal length, units in number of samples,
+            if set, signal with length longer will be sliced to the length of `siglen`
+
+        Returns
+        -------
+        data: ndarray,
+            the resampled (and perhaps sliced) signal data, in the format of "channel_first"
+        """
+        # NOTE: all leads are loaded,
+        # so that the ordering of leads keeps in accordance with `Standard12Leads`
+        data = self.load_data(
+            rec,
+            leads=None,
+            data_format="channel_first",
+            units="mV",
+            fs=None
+        )
+        rec_fs = self.get_fs(rec, from_hea=True)
+        if rec_fs != 500:
+            data = resample_poly(data, 500, rec_fs, axis=1)
+        if siglen is not None and data.shape[1] >= siglen:
+            data = ensure_siglen(data, siglen=siglen, fmt="channel_first")
+        return data
+
+
+    def _get_resampled_store_fp(self, tranche:str, siglen:Optional[int]=None) -> Tuple[str, str]:
+        """ finished, checked,
+
+        Parameters
+        ----------
+        tranche: str,
+            tranche symbol, one of "A"-"G"
+        siglen: int, optional,
+            signal length of the store, ref. `self.load_resampled_data`
+
+        Returns
+        -------
+        data_fp: str,
+            path of the (raw float32) data file of the store
+        index_fp: str,
+            path of the index file (.npz) of the store
+        """
+        variant = "500Hz" if siglen is None else f"500Hz_siglen_{siglen}"
+        store_dir = os.path.join(self.working_dir, "resampled")
+        data_fp = os.path.join(store_dir, f"{self.db_name}_{tranche}_{variant}.f32")
+        index_fp = os.path.join(store_dir, f"{self.db_name}_{tranche}_{variant}_index.npz")
+        return data_fp, index_fp
+
+
+    def _open_resampled_store(self, tranche:str, siglen:Optional[int]=None, check:bool=False) -> Optional[dict]:
+        """ finished, checked,
+
+        open (read-only) the store of resampled data of `tranche`,
+        each process (e.g. workers of a `DataLoader`) opens its own memory map,
+        the result (including None) is cached in each process, until the store is rebuilt by this reader
+
+        Parameters
+        ----------
+        tranche: str,
+            tranche symbol, one of "A"-"G"
+        siglen: int, optional,
+            signal length of the store, ref. `self.load_resampled_data`
+        check: bool, default False,
+            if True, the store is (re-)opened, and checked against the modification times of the data files
+            of the tranche (one `stat` per record, hence expensive on network file systems),
+            otherwise only the version of the store is checked
+
+        Returns
+        -------
+        store: dict or None,
+            with items "data" (the memory map), "pos" (record name to position),
+            "offsets", "lengths" (in number of elements and samples respectively),
+            None if the store does not exist, or is outdated
+            (built by another version, or some data file of the tranche is modified after building if `check`)
+        """
+        key = (tranche, siglen, os.getpid())
+        if key in self._resampled_stores and not check:
+            return self._resampled_stores[key]
+        self._resampled_stores[key] = store = self._load_resampled_store(tranche, siglen, check)
+        return store
+
+
+    def _load_resampled_store(self, tranche:str, siglen:Optional[int]=None, check:bool=False) -> Optional[dict]:
+        """ finished, checked,
+
+        load the store of resampled data of `tranche`, without caching, ref. `self._open_resampled_store`
+        """
+        data_fp, index_fp = self._get_resampled_store_fp(tranche, siglen)
+        if not os.path.isfile(index_fp) or not os.path.isfile(data_fp):
+            return None
+        try:
+            with np.load(index_fp, allow_pickle=False) as f:
+                version, mtimes = str(f["version"]), f["mtimes"]
+                records, offsets, lengths = f["records"], f["offsets"], f["lengths"]
+        except:
+            return None  # corrupted or outdated index
+        if version != __version__:
+            return None
+        if check and not np.array_equal(mtimes, self._get_data_mtimes(records)):
+            return None
+        store = {
+            "data": np.memmap(data_fp, dtype=np.float32, mode="r"),
+            "pos": {rec: idx for idx, rec in enumerate(records.tolist())},
+            "offsets": offsets,
+            "lengths": lengths,
+        }
+        return store
+
+
+    def _get_data_mtimes(self, records:Sequence[str]) -> np.ndarray:
+        """ finished, checked,
+
+        Parameters
+        ----------
+        records: sequence of str,
+            names of the records
+
+        Returns
+        -------
+        mtimes: ndarray,
+            modification times of the data files of `records`, NaN for missing files
+        """
+        mtimes = np.full((len(records),), np.nan, dtype=np.float64)
+        for idx, rec in enumerate(records):
+            try:
+                mtimes[idx] = os.path.getmtime(self.get_data_filepath(rec))
+            except OSError:
+                pass
+        return mtimes
+
+
+    def build_resampled_store(self,
+                              tranches:Optional[str]=None,
+                              siglen:Optional[int]=None,
+                              force:bool=False) -> NoReturn:
+        """ finished, checked,
+
+        resample all records of `tranches` to 500Hz (and slice to `siglen` if applicable),
+        and store them into one float32 memory-mapped file per tranche, along with an index of offsets,
+        which replaces the per-record .npy files
+
+        Parameters
+        ----------
+        tranches: str, optional,
+            the tranches to build, e.g. "AB", "ABEF", "G", etc.,
+            defaults to all tranches
+        siglen: int, optional,
+            signal length, units in number of samples,
+            if set, signal with length longer will be sliced to the length of `siglen`
+        force: bool, default False,
+            if True, the store will be rebuilt even if it already exists (and is up to date),
+            outdated stores (checked against the modification times of the data files) are always rebuilt,
+            NOTE that `self.load_resampled_data` only checks the version of the store, for efficiency,
+            hence stores should be rebuilt via this method after the data files are modified
+        """
+        nb_leads = len(self.all_leads)
+        index = self.header_index
+        for tranche in (tranches or "".join(self.db_tranches)).upper():
+            data_fp, index_fp = self._get_resampled_store_fp(tranche, siglen)
+            if not force and self._open_resampled_store(tranche, siglen, check=True) is not None:
+                continue
+            print(f"building the store of resampled data of tranche {self.tranche_names[tranche]}...")
+            start = time.time()
+            rows = np.where(index["tranche"] == tranche)[0]
+            records = index["record"][rows]
+            # length of the output of `resample_poly`
+            lengths = -(-index["nb_samples"][rows] * 500 // index["fs"][rows])
+            if siglen is not None:
+                lengths = np.where(lengths >= siglen, siglen, lengths)
+            offsets = np.concatenate([[0], np.cumsum(nb_leads * lengths)[:-1]]).astype(np.int64)
+            mtimes = self._get_data_mtimes(records)
+            os.makedirs(os.path.dirname(data_fp), exist_ok=True)
+            tmp_fp = f"{data_fp}.{os.getpid()}.tmp"
+            mm = np.memmap(tmp_fp, dtype=np.float32, mode="w+", shape=(max(1, int(nb_leads * lengths.sum())),))
+            for idx, rec in enumerate(records):
+                data = self._resample_record(rec, siglen)
+                if data.shape != (nb_leads, lengths[idx]):
+                    raise ValueError(f"shape of the resampled data of {rec} is {data.shape}, while {(nb_leads, lengths[idx])} is expected")
+                mm[offsets[idx]: offsets[idx]+data.size] = data.ravel()
+                print(f"tranche {tranche} <-- {idx+1} / {len(records)}", end="\r")
+            mm.flush()
+            del mm
+            if os.path.isfile(index_fp):
+                # readers fall back to resampling on the fly until the new index is written
+                os.remove(index_fp)
+            os.replace(tmp_fp, data_fp)
+            tmp_index_fp = f"{index_fp[:-4]}.{os.getpid()}.tmp.npz"
+            np.savez(
+                tmp_index_fp,
+                records=records, offsets=offsets, lengths=lengths.astype(np.int64),
+                mtimes=mtimes, version=np.array(__version__),
+            )
+            os.replace(tmp_index_fp, index_fp)
+            # drop stores opened before rebuilding
+            self._resampled_stores = {k: v for k, v in self._resampled_stores.items() if k[:2] != (tranche, siglen)}
+            print(f"\nDone in {time.time() - start:.5f} seconds!")
+
+
     def load_raw_data(self, rec:str, backend:str="scipy") -> np.ndarray:
         """ finished, checked,
 
@@ -1417,60 +1693,54 @@ class CINC2021(PhysioNetDataBase):
                     print(f"record {rec} from tranche {t} has nan values")
 
 
-    def _compute_cooccurrence(self, tranches:Optional[str]=None) -> pd.DataFrame:
+    def _compute_cooccurrence(self,
+                              tranches:Optional[str]=None,
+                              scored_only:bool=False,
+                              conditional:bool=False) -> pd.DataFrame:
         """ finished, checked,
 
-        compute the coocurrence matrix (DataFrame) of all classes in the whole of the CinC2021 database
+        compute the coocurrence matrix (DataFrame) of all classes in the whole of the CinC2021 database,
+        as X^T X, with X the (sparse) record-by-class multi-hot matrix derived from `self.header_index`
 
         Parameters
         ----------
         tranches: str, optional,
             if specified, computation will be limited to these tranches, case insensitive,
             e.g. "AB", "ABEF", "G", etc.
+        scored_only: bool, default False,
+            if True, computation will be limited to the classes scored in the CinC2021 official phase
+        conditional: bool, default False,
+            if True, the conditional coocurrence is computed,
+            i.e. the cell of row i and column j is the fraction of records of class i having also class j
 
         Returns
         -------
         dx_cooccurrence_all: DataFrame,
             the coocurrence matrix (DataFrame) desired
+
+        NOTE
+        ----
+        duplicate labels in one record (ref. ISSUE 5) are counted only once,
+        and Dx not listed in `dx_mapping_all` (ref. ISSUE 7) are ignored
         """
-        dx_cooccurrence_all_fp = os.path.join(utils._BASE_DIR, "utils", "dx_cooccurrence_all.csv")
-        if os.path.isfile(dx_cooccurrence_all_fp) and tranches is None:
-            dx_cooccurrence_all = pd.read_csv(dx_cooccurrence_all_fp)
-            return
-        dx_cooccurrence_all = pd.DataFrame(np.zeros((len(dx_mapping_all.Abbreviation), len(dx_mapping_all.Abbreviation)),dtype=int), columns=dx_mapping_all.Abbreviation.values)
-        dx_cooccurrence_all.index = dx_mapping_all.Abbreviation.values
         start = time.time()
         print("start computing the cooccurrence matrix...")
-        _tranches = (tranches or "").upper() or list(self.all_records.keys())
-        for tranche, l_rec in self.all_records.items():
-            if tranche not in _tranches:
-                continue
-            for idx, rec in enumerate(l_rec):
-                ann = self.load_ann(rec)
-                d = ann["diagnosis"]["diagnosis_abbr"]
-                for item in d:
-                    if item not in dx_cooccurrence_all.columns.values:
-                        # ref. ISSUE 7
-                        # print(f"{rec} has illegal Dx {item}!")
-                        continue
-                    dx_cooccurrence_all.loc[item,item] += 1
-                for i in range(len(d)-1):
-                    if d[i] not in dx_cooccurrence_all.columns.values:
-                        continue
-                    for j in range(i+1,len(d)):
-                        if d[j] not in dx_cooccurrence_all.columns.values:
-                            continue
-                        dx_cooccurrence_all.loc[d[i],d[j]] += 1
-                        dx_cooccurrence_all.loc[d[j],d[i]] += 1
-                print(f"tranche {tranche} <-- {idx+1} / {len(l_rec)}", end="\r")
-            print("\n")
-        print(f"finish computing the cooccurrence matrix in {(time.time()-start)/60:.3f} minutes")
-        if tranches is None:
-            dx_cooccurrence_all.to_csv(dx_cooccurrence_all_fp)
+        rows = None
+        if tranches:
+            rows = np.isin(self.header_index["tranche"], list(tranches.upper()))
+        cols = np.ones((len(self._dx_codes),), dtype=bool)
+        if scored_only:
+            cols = np.isin(self._dx_codes, dx_mapping_scored["SNOMEDCTCode"].astype(str).values)
+        abbr = dx_mapping_all["Abbreviation"].values[cols]
+        dx_cooccurrence_all = pd.DataFrame(
+            compute_cooccurrence(self._get_dx_multihot(), rows=rows, cols=cols, conditional=conditional),
+            columns=abbr,
+            index=abbr,
+        )
+        print(f"finish computing the cooccurrence matrix in {time.time()-start:.3f} seconds")
         return dx_cooccurrence_all
 
 
-
 def prepare_dataset(input_directory:str,
                     output_directory:Optional[str]=None,
                     tranches:Optional[Sequence[str]]=None,
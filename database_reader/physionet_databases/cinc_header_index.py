@@ -0,0 +1,532 @@
+# -*- coding: utf-8 -*-
+"""
+columnar index of the header files of the CinC2020 and CinC2021 databases
+
+all header files are parsed once (in parallel, using a process pool),
+and the results are stored as a NumPy structured array (one row per record),
+from which stats of the whole database, records of each diagnosis,
+class distributions, cooccurrence matrices, etc. could be derived in milliseconds
+
+the index is rebuilt incrementally: only header files with changed modification time are re-parsed
+
+also the per-record header cache (entries of the `LRUCache` of the readers) shared by `CINC2020` and `CINC2021`,
+whose functions take the reader as the first argument, and are bound as methods of the readers
+
+a benchmark of the cooccurrence computation (against the previous record-by-record loop)
+on synthetic labels could be run via
+>>> python cinc_header_index.py
+"""
+import os
+import time
+from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Any, List, Tuple, Sequence, NoReturn
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+__all__ = [
+    "build_header_index",
+    "load_header_index",
+    "header_index_multihot",
+    "compute_cooccurrence",
+    "get_header_entry",
+    "parse_header_entry",
+    "get_header_arrays",
+    "copy_header_ann",
+    "parse_leads",
+]
+
+
+_INDEX_VERSION = 2
+
+
+def _parse_header(header_fp:str) -> tuple:
+    """ finished, checked,
+
+    parse the items to be indexed from one header file,
+    executed in the worker processes
+
+    Parameters
+    ----------
+    header_fp: str,
+        path of the header file
+
+    Returns
+    -------
+    tuple of
+    (nb_leads, fs, nb_samples, age, sex, medical_prescription, history, symptom_or_surgery, l_Dx, adc_gain, baseline)
+    """
+    with open(header_fp, "r") as f:
+        header_data = f.read().splitlines()
+    first_line = header_data[0].split()
+    nb_leads, fs, nb_samples = int(first_line[1]), int(first_line[2]), int(first_line[3])
+    adc_gain, baseline = [], []
+    for l in header_data[1: 1+nb_leads]:
+        items = l.split()
+        gain = items[2].split("/")[0]
+        adc_gain.append(float(gain.split("(")[0]))
+        if "(" in gain:
+            baseline.append(int(gain.split("(")[1].rstrip(")")))
+        else:  # defaults to `adc_zero`, the same as `wfdb`
+            baseline.append(int(items[4]))
+    comments = {}
+    for l in header_data[1+nb_leads:]:
+        if not l.startswith("#") or ":" not in l:
+            continue
+        k, v = l.lstrip("#").split(":", 1)
+        comments[k.strip()] = v.strip()
+    try:
+        age = float(int(comments["Age"]))
+    except:
+        age = np.nan
+    sex = comments.get("Sex", "Unknown").replace("NaN", "Unknown") or "Unknown"
+    medical_prescription = comments.get("Rx", "Unknown") or "Unknown"
+    history = comments.get("Hx", "Unknown") or "Unknown"
+    symptom_or_surgery = comments.get("Sx", "Unknown") or "Unknown"
+    l_Dx = [d.strip() for d in comments.get("Dx", "").split(",") if len(d.strip()) > 0]
+    return (
+        nb_leads, fs, nb_samples, age, sex,
+        medical_prescription, history, symptom_or_surgery, l_Dx,
+        adc_gain, baseline,
+    )
+
+
+def load_header_index(index_fp:str, dx_codes:Optional[Sequence[str]]=None) -> Optional[np.ndarray]:
+    """ finished, checked,
+
+    Parameters
+    ----------
+    index_fp: str,
+        path of the index file (.npz)
+    dx_codes: sequence of str, optional,
+        the (ordered) diagnosis codes of the multi-hot bitset,
+        if given and inconsistent with those of the index file, the index is considered invalid
+
+    Returns
+    -------
+    index: ndarray or None,
+        the structured array of the index,
+        None if the index file does not exist or is invalid
+    """
+    if not os.path.isfile(index_fp):
+        return None
+    with np.load(index_fp, allow_pickle=False) as f:
+        if int(f["version"]) != _INDEX_VERSION:
+            return None
+        if dx_codes is not None and f["dx_codes"].tolist() != list(dx_codes):
+            return None
+        index = f["index"]
+    return index
+
+
+def build_header_index(records:Sequence[Tuple[str, str, str]],
+                       dx_codes:Sequence[str],
+                       index_fp:str,
+                       n_workers:Optional[int]=None,
+                       force:bool=False,
+                       verbose:int=0) -> np.ndarray:
+    """ finished, checked,
+
+    build (or update) the index of the header files
+
+    Parameters
+    ----------
+    records: sequence of tuple,
+        each of the form (record name, tranche, path of the header file),
+        the rows of the index keep this order
+    dx_codes: sequence of str,
+        the (ordered) diagnosis codes of the multi-hot bitset,
+        codes not in this list are stored in the field "dx_unlisted", separated by ","
+    index_fp: str,
+        path of the index file (.npz)
+    n_workers: int, optional,
+        number of worker processes for parsing the header files,
+        defaults to `os.cpu_count()`, if is 1, parsing is done in the current process
+    force: bool, default False,
+        if True, all header files are re-parsed, regardless of the existing index file
+    verbose: int, default 0,
+        printing verbosity
+
+    Returns
+    -------
+    index: ndarray,
+        structured array with fields
+        "record", "tranche", "mtime", "nb_leads", "fs", "nb_samples", "age", "sex",
+        "medical_prescription", "history", "symptom_or_surgery",
+        "dx_bits" (multi-hot bitset of `dx_codes`, packed by `np.packbits`), "dx_unlisted",
+        "dx_raw" (all the codes in the order of the header file, duplicates kept, separated by ","),
+        "adc_gain", "baseline" (per-lead, padded with nan and 0 respectively)
+    """
+    start = time.time()
+    existing = None if force else load_header_index(index_fp, dx_codes)
+    mtimes = np.array([os.path.getmtime(fp) for _, _, fp in records], dtype=np.float64)
+    if existing is not None:
+        existing_pos = {rec: idx for idx, rec in enumerate(existing["record"].tolist())}
+    else:
+        existing_pos = {}
+    # position in `existing` of each record, -1 for records to (re-)parse
+    reuse = np.array([existing_pos.get(rec, -1) for rec, _, _ in records], dtype=np.int64)
+    if existing is not None:
+        stale = reuse >= 0
+        stale[stale] = existing["mtime"][reuse[stale]] != mtimes[stale]
+        reuse[stale] = -1
+    to_parse = np.where(reuse < 0)[0]
+    if existing is not None and len(to_parse) == 0 and len(existing) == len(records):
+        return existing
+
+    if verbose >= 1:
+        print(f"parsing {len(to_parse)} header files...")
+    header_fps = [records[idx][2] for idx in to_parse]
+    if n_workers == 1 or len(header_fps) < 256:
+        parsed = [_parse_header(fp) for fp in header_fps]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            parsed = list(executor.map(_parse_header, header_fps, chunksize=256))
+
+    nb_records = len(records)
+    nb_leads_max = max(
+        [p[0] for p in parsed] + ([existing["adc_gain"].shape[1]] if existing is not None else []),
+        default=0,
+    )
+    code_to_col = {c: idx for idx, c in enumerate(dx_codes)}
+    dx_multihot = np.zeros((len(parsed), len(dx_codes)), dtype=bool)
+    dx_unlisted = []
+    adc_gain = np.full((len(parsed), nb_leads_max), np.nan, dtype=np.float32)
+    baseline = np.zeros((len(parsed), nb_leads_max), dtype=np.int32)
+    for row, p in enumerate(parsed):
+        cols = [code_to_col[d] for d in p[8] if d in code_to_col]
+        dx_multihot[row, cols] = True
+        dx_unlisted.append(",".join([d for d in p[8] if d not in code_to_col]))
+        adc_gain[row, :p[0]] = p[9]
+        baseline[row, :p[0]] = p[10]
+    new_columns = {
+        "nb_leads": np.array([p[0] for p in parsed], dtype=np.int16),
+        "fs": np.array([p[1] for p in parsed], dtype=np.int32),
+        "nb_samples": np.array([p[2] for p in parsed], dtype=np.int64),
+        "age": np.array([p[3] for p in parsed], dtype=np.float32),
+        "sex": np.array([p[4] for p in parsed], dtype=str),
+        "medical_prescription": np.array([p[5] for p in parsed], dtype=str),
+        "history": np.array([p[6] for p in parsed], dtype=str),
+        "symptom_or_surgery": np.array([p[7] for p in parsed], dtype=str),
+        "dx_bits": np.packbits(dx_multihot, axis=1),
+        "dx_unlisted": np.array(dx_unlisted, dtype=str),
+        "dx_raw": np.array([",".join(p[8]) for p in parsed], dtype=str),
+        "adc_gain": adc_gain,
+        "baseline": baseline,
+    }
+
+    columns = {
+        "record": np.array([rec for rec, _, _ in records], dtype=str),
+        "tranche": np.array([t for _, t, _ in records], dtype=str),
+        "mtime": mtimes,
+    }
+    kept = np.where(reuse >= 0)[0]
+    for k, new_col in new_columns.items():
+        if existing is not None and len(kept) > 0:
+            old_col = existing[k][reuse[kept]]
+            if k in ["adc_gain", "baseline",] and old_col.shape[1] < nb_leads_max:
+                pad_value = np.nan if k == "adc_gain" else 0
+                old_col = np.pad(
+                    old_col, ((0, 0), (0, nb_leads_max-old_col.shape[1])), constant_values=pad_value
+                )
+            col = np.empty((nb_records,)+new_col.shape[1:], dtype=np.result_type(new_col, old_col))
+            col[kept] = old_col
+        else:
+            col = np.empty((nb_records,)+new_col.shape[1:], dtype=new_col.dtype)
+        col[to_parse] = new_col
+        columns[k] = col
+
+    dtype = [(k, col.dtype, col.shape[1:]) for k, col in columns.items()]
+    index = np.empty((nb_records,), dtype=dtype)
+    for k, col in columns.items():
+        index[k] = col
+
+    os.makedirs(os.path.dirname(os.path.abspath(index_fp)), exist_ok=True)
+    np.savez(
+        index_fp,
+        index=index,
+        dx_codes=np.array(list(dx_codes), dtype=str),
+        version=np.array(_INDEX_VERSION),
+    )
+    if verbose >= 1:
+        print(f"header index of {nb_records} records built in {time.time()-start:.3f} seconds")
+    return index
+
+
+def header_index_multihot(index:np.ndarray, nb_classes:int) -> np.ndarray:
+    """ finished, checked,
+
+    unpack the multi-hot bitset of the diagnoses in the index
+
+    Parameters
+    ----------
+    index: ndarray,
+        the structured array of the index
+    nb_classes: int,
+        number of classes (diagnosis codes) of the bitset
+
+    Returns
+    -------
+    multihot: ndarray,
+        boolean array of shape (nb_records, nb_classes)
+    """
+    multihot = np.unpackbits(index["dx_bits"], axis=1, count=nb_classes).astype(bool)
+    return multihot
+
+
+def compute_cooccurrence(multihot:np.ndarray,
+                         rows:Optional[np.ndarray]=None,
+                         cols:Optional[np.ndarray]=None,
+                         conditional:bool=False) -> np.ndarray:
+    """ finished, checked,
+
+    compute the cooccurrence matrix of classes as X^T X,
+    with X the (sparse) record-by-class multi-hot matrix
+
+    Parameters
+    ----------
+    multihot: ndarray,
+        boolean array of shape (nb_records, nb_classes)
+    rows: ndarray, optional,
+        boolean mask or indices of the records (e.g. of specific tranches) to take into account
+    cols: ndarray, optional,
+        boolean mask or indices of the classes (e.g. the scored classes) to take into account,
+        records are NOT filtered by `cols`, i.e. the cooccurrence of the selected classes among all records
+    conditional: bool, default False,
+        if True, the conditional cooccurrence P(class j | class i) is computed,
+        i.e. each row is divided by its diagonal element (number of records of class i)
+
+    Returns
+    -------
+    cooccurrence: ndarray,
+        of shape (nb_selected_classes, nb_selected_classes),
+        of dtype int64 if `conditional` is False, otherwise float64
+    """
+    X = multihot
+    if rows is not None:
+        X = X[rows]
+    if cols is not None:
+        X = X[:, cols]
+    X = sparse.csr_matrix(X, dtype=np.int64)
+    cooccurrence = np.asarray((X.T @ X).todense())
+    if conditional:
+        diag = np.diag(cooccurrence).astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cooccurrence = np.where(diag[:, np.newaxis] > 0, cooccurrence / diag[:, np.newaxis], 0.0)
+    return cooccurrence
+
+
+def get_header_entry(db:Any, rec:str) -> dict:
+    """ finished, checked,
+
+    get the cached entry (in `db._header_cache`) of the header file of `rec`,
+    the cache is keyed by the record name and the modification time of the header file,
+    hence updated header files would be re-read
+
+    Parameters
+    ----------
+    db: CINC2020 or CINC2021,
+        the reader
+    rec: str,
+        name of the record
+
+    Returns
+    -------
+    header_entry: dict,
+        with items "header_data" (lines of the header file),
+        and "ann" (parsed annotations, keyed by the parsing backend),
+        items "fs", "adc_gain", "baseline" are added by `get_header_arrays`
+    """
+    ann_fp = db.get_ann_filepath(rec, with_ext=True)
+    key = (rec, os.path.getmtime(ann_fp))
+    header_entry = db._header_cache.get(key)
+    if header_entry is None:
+        with open(ann_fp, "r") as f:
+            header_data = f.read().splitlines()
+        header_entry = {"header_data": header_data, "ann": {}}
+        db._header_cache.put(key, header_entry)
+    return header_entry
+
+
+def parse_header_entry(db:Any, rec:str, header_entry:dict, backend:str="wfdb") -> dict:
+    """ finished, checked,
+
+    parse (if not parsed yet) the annotations in `header_entry` using `backend`
+
+    Parameters
+    ----------
+    db: CINC2020 or CINC2021,
+        the reader
+    rec: str,
+        name of the record
+    header_entry: dict,
+        the cached entry of the header file of `rec`, ref. `get_header_entry`
+    backend: str, default "wfdb", case insensitive,
+        backend for parsing the annotations, ref. `db.load_ann`
+
+    Returns
+    -------
+    ann_dict, dict,
+        the annotations with items: ref. `db.ann_items`,
+        NOTE that it is the cached object, which should not be modified, ref. `copy_header_ann`
+    """
+    _backend = backend.lower()
+    if _backend not in header_entry["ann"]:
+        if _backend == "wfdb":
+            header_entry["ann"][_backend] = db._load_ann_wfdb(rec, header_entry["header_data"])
+        elif _backend == "naive":
+            header_entry["ann"][_backend] = db._load_ann_naive(header_entry["header_data"])
+        else:
+            raise ValueError(f"backend `{_backend}` not supported for loading annotations")
+    return header_entry["ann"][_backend]
+
+
+def get_header_arrays(db:Any, rec:str) -> Tuple[int, np.ndarray, np.ndarray]:
+    """ finished, checked,
+
+    get the sampling frequency, adc gains and baselines of `rec` from the header cache
+
+    Parameters
+    ----------
+    db: CINC2020 or CINC2021,
+        the reader
+    rec: str,
+        name of the record
+
+    Returns
+    -------
+    fs: int,
+        sampling frequency of the record, read from the header file
+    adc_gain: ndarray,
+        adc gain of each lead, of shape (nb_leads, 1)
+    baseline: ndarray,
+        baseline of each lead, of shape (nb_leads, 1)
+    """
+    header_entry = get_header_entry(db, rec)
+    if "fs" not in header_entry:
+        ann_dict = parse_header_entry(db, rec, header_entry, "wfdb")
+        header_entry["adc_gain"] = ann_dict["df_leads"]["adc_gain"].values.reshape(-1, 1)
+        header_entry["baseline"] = ann_dict["df_leads"]["baseline"].values.reshape(-1, 1)
+        header_entry["fs"] = ann_dict["fs"]
+    return header_entry["fs"], header_entry["adc_gain"], header_entry["baseline"]
+
+
+def copy_header_ann(ann_dict:dict) -> dict:
+    """ finished, checked,
+
+    copy the cached annotations, so that modifications from the caller would not pollute the cache,
+    only the mutable items are copied: the (small) diagnosis dicts deeply, and "df_leads",
+    which is copied shallowly (hence costless) if copy-on-write of pandas is enabled (default since pandas 3.0)
+
+    Parameters
+    ----------
+    ann_dict: dict,
+        the cached annotations, ref. `parse_header_entry`
+
+    Returns
+    -------
+    ann_dict: dict,
+        the copy of `ann_dict`
+    """
+    ann_dict = dict(ann_dict)
+    for k, v in ann_dict.items():
+        if isinstance(v, pd.DataFrame):
+            ann_dict[k] = v.copy(deep=not _pandas_copy_on_write())
+        elif isinstance(v, (dict, list)):
+            ann_dict[k] = deepcopy(v)
+    return ann_dict
+
+
+def _pandas_copy_on_write() -> bool:
+    """
+    whether copy-on-write of pandas is enabled, with which shallow copies are never modified via the originals
+    """
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True
+    try:
+        return pd.get_option("mode.copy_on_write") is True
+    except:
+        return False
+
+
+def parse_leads(l_leads_data:List[str]) -> pd.DataFrame:
+    """ finished, checked,
+
+    Parameters
+    ----------
+    l_leads_data: list of str,
+        raw information of each lead, read from a header file
+
+    Returns
+    -------
+    df_leads: DataFrame,
+        infomation of each leads in the format of DataFrame
+    """
+    cols = ["filename", "fmt+byte_offset", "adc_gain+units", "adc_res", "adc_zero", "init_value", "checksum", "block_size", "lead_name",]
+    # plain string splitting, much faster than `pd.read_csv` for the 12 short lines
+    df_leads = pd.DataFrame([l.split(maxsplit=len(cols)-1) for l in l_leads_data], columns=cols)
+    df_leads["fmt"] = [s.split("+")[0] for s in df_leads["fmt+byte_offset"]]
+    df_leads["byte_offset"] = [s.split("+")[1] for s in df_leads["fmt+byte_offset"]]
+    df_leads["adc_gain"] = [s.split("/")[0] for s in df_leads["adc_gain+units"]]
+    df_leads["adc_units"] = [s.split("/")[1] for s in df_leads["adc_gain+units"]]
+    for k in ["byte_offset", "adc_gain", "adc_res", "adc_zero", "init_value", "checksum", "block_size",]:
+        df_leads[k] = df_leads[k].astype(int)
+    df_leads["baseline"] = df_leads["adc_zero"]
+    df_leads = df_leads[["filename", "fmt", "byte_offset", "adc_gain", "adc_units", "adc_res", "adc_zero", "baseline", "init_value", "checksum", "block_size", "lead_name"]]
+    df_leads.index = df_leads["lead_name"]
+    df_leads.index.name = None
+    return df_leads
+
+
+def _benchmark_cooccurrence(nb_records:int=20000, nb_classes:int=133, seed:int=0) -> NoReturn:
+    """ finished, checked,
+
+    compare `compute_cooccurrence` with the previous implementation of `CINC2021._compute_cooccurrence`,
+    which increments the cells of a DataFrame record by record, on synthetic labels
+
+    Parameters
+    ----------
+    nb_records: int, default 20000,
+        number of synthetic records
+    nb_classes: int, default 133,
+        number of classes
+    seed: int, default 0,
+        random seed
+    """
+    rng = np.random.default_rng(seed)
+    classes = [f"D{i}" for i in range(nb_classes)]
+    labels = [
+        rng.choice(nb_classes, size=rng.integers(1, 6), replace=False).tolist() for _ in range(nb_records)
+    ]
+
+    start = time.time()
+    df_loop = pd.DataFrame(np.zeros((nb_classes, nb_classes), dtype=int), columns=classes, index=classes)
+    for l in labels:
+        d = [classes[i] for i in l]
+        for item in d:
+            df_loop.loc[item, item] += 1
+        for i in range(len(d)-1):
+            for j in range(i+1, len(d)):
+                df_loop.loc[d[i], d[j]] += 1
+                df_loop.loc[d[j], d[i]] += 1
+    time_loop = time.time() - start
+
+    start = time.time()
+    multihot = np.zeros((nb_records, nb_classes), dtype=bool)
+    multihot[
+        np.repeat(np.arange(nb_records), [len(l) for l in labels]),
+        np.concatenate(labels),
+    ] = True
+    cooccurrence = compute_cooccurrence(multihot)
+    time_vec = time.time() - start
+
+    assert (df_loop.values == cooccurrence).all()
+    print(f"{nb_records} records, {nb_classes} classes")
+    print(f"loop: {time_loop:.3f} seconds, vectorized: {time_vec:.5f} seconds, speedup: {time_loop/time_vec:.1f}x")
+
+
+if __name__ == "__main__":
+    _benchmark_cooccurrence()
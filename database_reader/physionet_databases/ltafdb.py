@@ -2,18 +2,17 @@
 """
 """
 import os
-import json
 import math
 from datetime import datetime
-from typing import Union, Optional, Any, List, Tuple, Dict, Sequence, NoReturn
+from typing import Union, Optional, Any, List, Tuple, Dict, Sequence, Iterator, NoReturn
 from numbers import Real
 
 import numpy as np
 np.set_printoptions(precision=5, suppress=True)
 import pandas as pd
+from scipy.signal import resample_poly
 import wfdb
 from easydict import EasyDict as ED
-from matplotlib.pyplot import cm
 
 from ..utils.common import (
     ArrayLike,
@@ -22,6 +21,10 @@ from ..utils.common import (
 )
 from ..utils.utils_universal import generalized_intervals_intersection
 from ..base import PhysioNetDataBase
+from ..intervals import (
+    clip_intervals, union_intervals, shift_intervals,
+    label_intervals, runs_to_mask,
+)
 
 
 __all__ = [
@@ -95,6 +98,7 @@ class LTAFDB(PhysioNetDataBase):
         })
         self.palette = kwargs.get("palette", None)
         if self.palette is None:
+            from matplotlib import cm
             n_colors = len([k for k in self.rhythm_class_map.keys() if k not in ["N", "NOISE"]])
             colors = iter(cm.rainbow(np.linspace(0, 1, n_colors)))
             self.palette = ED()
@@ -181,7 +185,7 @@ class LTAFDB(PhysioNetDataBase):
         return data
 
 
-    def load_ann(self, rec:str, sampfrom:Optional[int]=None, sampto:Optional[int]=None, fmt:str="interval", keep_original:bool=False) -> Union[Dict[str, list], np.ndarray]:
+    def load_ann(self, rec:str, sampfrom:Optional[int]=None, sampto:Optional[int]=None, fmt:str="interval", keep_original:bool=False, mask_dtype:type=int) -> Union[Dict[str, list], np.ndarray]:
         """  finished, checked,
 
         load rhythm annotations,
@@ -197,73 +201,128 @@ class LTAFDB(PhysioNetDataBase):
         sampto: int, optional,
             end index of the annotations to be loaded
         fmt: str, default "interval", case insensitive,
-            format of returned annotation, can also be "mask"
+            format of returned annotation, can also be "mask",
+            or "runs" (alias "rle"), the run-length representation,
+            i.e. an array of shape (n, 3), each row being [start, end, label]
         keep_original: bool, default False,
             if True, indices will keep the same with the annotation file
             otherwise subtract `sampfrom` if specified
+        mask_dtype: type, default int,
+            dtype of the mask, for example `np.int8` to reduce memory footprint,
+            used only when `fmt` is "mask"
         
         Returns
         -------
         ann, dict or ndarray,
-            the annotations in the format of intervals, or in the format of mask
+            the annotations in the format of intervals, or in the format of mask, or runs
 
         NOTE that at head and tail of the record, segments named "NOISE" are added
         """
-        fp = os.path.join(self.db_dir, rec)
-        header = wfdb.rdheader(fp)
-        sig_len = header.sig_len
+        runs, sig_len = self._load_rhythm_runs(rec)
         sf = sampfrom or 0
         st = sampto or sig_len
         assert st > sf, "`sampto` should be greater than `sampfrom`!"
 
-        simplified_fp = os.path.join(self.db_dir, f"{rec}_ann.json")
-        if os.path.isfile(simplified_fp):
-            with open(simplified_fp, "r") as f:
-                ann = ED(json.load(f))
-        else:
-            wfdb_ann = wfdb.rdann(fp, extension=self.manual_ann_ext)
-
-            ann = ED({k: [] for k in self.rhythm_class_map.keys()})
-            critical_points = wfdb_ann.sample.tolist()
-            aux_note = wfdb_ann.aux_note
-            start = 0
-            current_rhythm = "NOISE"
-            for idx, rhythm in zip(critical_points, aux_note):
-                if rhythm not in self.all_rhythms:
-                    continue
-                ann[current_rhythm].append([start, idx])
-                current_rhythm = rhythm.replace("(", "")
-                start = idx
-            # all but one end with "" ("30" ends with "\x01 Aux")
-            # i.e. none ends with (start of) valid rhythm
-            ann[current_rhythm].append([start, critical_points[-1]])
-            ann["NOISE"].append([critical_points[-1], sig_len])
-
-            with open(simplified_fp, "w") as f:
-                json.dump(ann, f, ensure_ascii=False)
-        
         ann = ED({
-            k: generalized_intervals_intersection(l_itv, [[sf,st]]) \
-                for k, l_itv in ann.items()
+            k: clip_intervals(runs[runs[:, 2]==v, :2], sf, st) \
+                for k, v in self.rhythm_class_map.items()
         })
         if fmt.lower() == "mask":
-            tmp = deepcopy(ann)
-            ann = np.full(shape=(st-sf,), fill_value=self.rhythm_class_map.N, dtype=int)
-            for rhythm, l_itv in tmp.items():
-                for itv in l_itv:
-                    ann[itv[0]-sf: itv[1]-sf] = self.rhythm_class_map[rhythm]
-        elif not keep_original:
-            for k, l_itv in ann.items():
-                ann[k] = [[itv[0]-sf, itv[1]-sf] for itv in l_itv]
+            ann = runs_to_mask(
+                label_intervals(ann, self.rhythm_class_map), siglen=st-sf,
+                fill_value=self.rhythm_class_map.N, start=sf, dtype=mask_dtype,
+            )
+        elif fmt.lower() in ["runs", "rle",]:
+            ann = label_intervals(ann, self.rhythm_class_map)
+            if not keep_original:
+                ann = shift_intervals(ann, -sf)
+        else:
+            if not keep_original:
+                ann = ED({k: shift_intervals(itvs, -sf) for k, itvs in ann.items()})
+            ann = ED({k: itvs.tolist() for k, itvs in ann.items()})
         
         return ann
 
 
-    def load_rhythm_ann(self, rec:str, sampfrom:Optional[int]=None, sampto:Optional[int]=None, fmt:str="interval", keep_original:bool=False) -> Union[Dict[str, list], np.ndarray]:
+    def _load_rhythm_runs(self, rec:str) -> Tuple[np.ndarray, int]:
+        """ finished, checked,
+
+        load the rhythm annotations of the whole record, as runs,
+        cached in the annotation sidecar (in `working_dir`)
+
+        Parameters
+        ----------
+        rec: str,
+            name of the record
+
+        Returns
+        -------
+        runs: ndarray,
+            of shape (n, 3), each row being [start, end, label], with labels in `self.rhythm_class_map`
+        sig_len: int,
+            length of the record
+        """
+        fp = os.path.join(self.db_dir, rec)
+
+        def _parse() -> Dict[str, np.ndarray]:
+            wfdb_ann = wfdb.rdann(fp, extension=self.manual_ann_ext)
+            sig_len = wfdb.rdheader(fp).sig_len
+            aux_note = np.array(wfdb_ann.aux_note)
+            valid = np.isin(aux_note, self.all_rhythms)
+            # all but one end with "" ("30" ends with "\x01 Aux")
+            # i.e. none ends with (start of) valid rhythm
+            critical_points = np.concatenate([[0], wfdb_ann.sample[valid], wfdb_ann.sample[-1:], [sig_len]])
+            rhythms = np.concatenate([["NOISE"], np.char.replace(aux_note[valid], "(", ""), ["NOISE"]])
+            intervals = np.column_stack([critical_points[:-1], critical_points[1:]])
+            runs = label_intervals(
+                {k: union_intervals(intervals[rhythms==k]) for k in self.rhythm_class_map.keys()},
+                self.rhythm_class_map,
+            )
+            return {"runs": runs.astype(np.int32), "sig_len": np.array(sig_len)}
+
+        arrays = self._load_ann_sidecar(
+            rec, "rhythm", [f"{fp}.{self.manual_ann_ext}", f"{fp}.{self.header_ext}"], _parse,
+        )
+        return arrays["runs"], int(arrays["sig_len"])
+
+
+    def _load_beats(self, rec:str, ext:str) -> Tuple[np.ndarray, np.ndarray]:
+        """ finished, checked,
+
+        load the beats (of types in `self.all_beat_types`) of the whole record,
+        cached in the annotation sidecar (in `working_dir`)
+
+        Parameters
+        ----------
+        rec: str,
+            name of the record
+        ext: str,
+            extension of the annotation file, `self.manual_ann_ext` or `self.auto_ann_ext`
+
+        Returns
+        -------
+        sample: ndarray,
+            locations (indices) of the beats
+        symbol: ndarray,
+            beat types of the beats
+        """
+        fp = os.path.join(self.db_dir, rec)
+
+        def _parse() -> Dict[str, np.ndarray]:
+            wfdb_ann = wfdb.rdann(fp, extension=ext)
+            symbol = np.array(wfdb_ann.symbol)
+            is_beat = np.isin(symbol, self.all_beat_types)
+            return {"sample": wfdb_ann.sample[is_beat].astype(np.int32), "symbol": symbol[is_beat]}
+
+        arrays = self._load_ann_sidecar(rec, f"beats_{ext}", [f"{fp}.{ext}"], _parse)
+        return arrays["sample"].astype(int), arrays["symbol"]
+
+
+    def load_rhythm_ann(self, rec:str, sampfrom:Optional[int]=None, sampto:Optional[int]=None, fmt:str="interval", keep_original:bool=False, mask_dtype:type=int) -> Union[Dict[str, list], np.ndarray]:
         """
         alias of `self.load_ann`
         """
-        return self.load_ann(rec, sampfrom, sampto, fmt, keep_original)
+        return self.load_ann(rec, sampfrom, sampto, fmt, keep_original, mask_dtype)
 
 
     def load_beat_ann(self, rec:str, sampfrom:Optional[int]=None, sampto:Optional[int]=None, keep_original:bool=False) -> Dict[str, np.ndarray]:
@@ -296,21 +355,13 @@ class LTAFDB(PhysioNetDataBase):
         st = sampto or sig_len
         assert st > sf, "`sampto` should be greater than `sampfrom`!"
 
-        wfdb_ann = wfdb.rdann(
-            fp,
-            extension=self.manual_ann_ext,
-            sampfrom=sampfrom or 0,
-            sampto=sampto,
-        )
-        ann = ED({k: [] for k in self.all_beat_types})
-        for idx, bt in zip(wfdb_ann.sample, wfdb_ann.symbol):
-            if bt not in self.all_beat_types:
-                continue
-            ann[bt].append(idx)
+        sample, symbol = self._load_beats(rec, self.manual_ann_ext)
+        # in accordance with `wfdb.rdann`, `sampto` is inclusive
+        in_range = (sample >= sf) & (sample <= st)
+        sample, symbol = sample[in_range], symbol[in_range]
         if not keep_original and sampfrom is not None:
-            ann = ED({k: np.array(v, dtype=int) - sampfrom for k, v in ann.items()})
-        else:
-            ann = ED({k: np.array(v, dtype=int) for k, v in ann.items()})
+            sample = sample - sampfrom
+        ann = ED({k: sample[symbol==k] for k in self.all_beat_types})
         return ann
 
 
@@ -341,23 +392,88 @@ class LTAFDB(PhysioNetDataBase):
         ann, ndarray,
             locations (indices) of the all the rpeaks (qrs complexes)
         """
-        fp = os.path.join(self.db_dir, rec)
         if use_manual:
             ext = self.manual_ann_ext
         else:
             ext = self.auto_ann_ext
-        wfdb_ann = wfdb.rdann(
-            fp,
-            extension=ext,
-            sampfrom=sampfrom or 0,
-            sampto=sampto,
-        )
-        rpeak_inds = wfdb_ann.sample[np.isin(wfdb_ann.symbol, self.all_beat_types)]
+        rpeak_inds, _ = self._load_beats(rec, ext)
+        # in accordance with `wfdb.rdann`, `sampto` is inclusive
+        rpeak_inds = rpeak_inds[np.searchsorted(rpeak_inds, sampfrom or 0, side="left"): \
+            np.searchsorted(rpeak_inds, sampto, side="right") if sampto is not None else None]
         if not keep_original and sampfrom is not None:
             rpeak_inds = rpeak_inds - sampfrom
         return rpeak_inds
 
 
+    def iter_windows(self, rec:str, win_len:int, hop:int, leads:Optional[Union[int, List[int]]]=None, fs:Optional[Real]=None, sampfrom:Optional[int]=None, sampto:Optional[int]=None, data_format:str="channel_first", units:str="mV", use_manual:bool=True, block_len:Optional[int]=None) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """ finished, checked,
+
+        iterate over sliding windows of a (24 - 25 hours long) record,
+        the signal is read sequentially in blocks, with constant memory footprint
+
+        Parameters
+        ----------
+        rec: str,
+            name of the record
+        win_len: int,
+            length of the windows, in number of samples (w.r.t. `fs`)
+        hop: int,
+            step between the starts of consecutive windows, in number of samples (w.r.t. `fs`)
+        leads: int or list of int, optional,
+            the lead number(s) to load
+        fs: real number, optional,
+            if not None, the windows (and the annotations) will be resampled to this frequency
+        sampfrom: int, optional,
+            start index (w.r.t. `self.fs`) of the part of the record to iterate over
+        sampto: int, optional,
+            end index (w.r.t. `self.fs`) of the part of the record to iterate over
+        data_format: str, default "channel_first",
+            format of the ecg data,
+            "channel_last" (alias "lead_last"), or
+            "channel_first" (alias "lead_first")
+        units: str, default "mV",
+            units of the output signal, can also be "μV", with an alias of "uV"
+        use_manual: bool, default True,
+            use manually annotated beat annotations (qrs),
+            instead of those generated by algorithms
+        block_len: int, optional,
+            number of samples (w.r.t. `self.fs`) of each sequential read of the signal file
+
+        Yields
+        ------
+        sig: ndarray,
+            the ecg data of the window
+        mask: ndarray,
+            rhythm mask of the window, with values in `self.rhythm_class_map`
+        rpeaks: ndarray,
+            indices of the rpeaks in the window, relative to the start of the window
+        """
+        if not leads:
+            _leads = self.all_leads
+        elif isinstance(leads, int):
+            _leads = [leads]
+        else:
+            _leads = leads
+        assert set(_leads).issubset(self.all_leads)
+        rhythm_intervals = self.load_ann(rec, fmt="runs", keep_original=True)
+        rpeaks = self.load_rpeak_indices(rec, use_manual=use_manual, keep_original=True)
+        yield from self._iter_wfdb_windows(
+            os.path.join(self.db_dir, rec),
+            win_len=win_len,
+            hop=hop,
+            channels=list(_leads),
+            fs=fs,
+            sampfrom=sampfrom,
+            sampto=sampto,
+            rhythm_intervals=rhythm_intervals,
+            fill_value=self.rhythm_class_map.N,
+            rpeaks=np.sort(rpeaks),
+            data_format=data_format,
+            units=units,
+            block_len=block_len,
+        )
+
+
     def plot(self, rec:str, data:Optional[np.ndarray]=None, ann:Optional[Dict[str, np.ndarray]]=None, beat_ann:Optional[Dict[str, np.ndarray]]=None, rpeak_inds:Optional[Union[Sequence[int],np.ndarray]]=None, ticks_granularity:int=0, leads:Optional[Union[int, List[int]]]=None, sampfrom:Optional[int]=None, sampto:Optional[int]=None, same_range:bool=False, **kwargs) -> NoReturn:
         """ finished, checked,
 
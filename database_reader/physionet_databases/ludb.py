@@ -25,6 +25,16 @@ __all__ = [
 ]
 
 
+# dtype of the structured array of the wave delineation of a record
+_WAVES_DTYPE = np.dtype([
+    ("lead", "U3"),
+    ("wave_type", "U5"),
+    ("onset", np.int32),
+    ("peak", np.int32),
+    ("offset", np.int32),
+])
+
+
 class LUDB(PhysioNetDataBase):
     """ NOT Finished, 
 
@@ -262,7 +272,7 @@ class LUDB(PhysioNetDataBase):
         return data
 
 
-    def load_ann(self, rec:str, leads:Optional[Sequence[str]]=None, metadata:bool=False) -> dict:
+    def load_ann(self, rec:str, leads:Optional[Sequence[str]]=None, metadata:bool=False, waves_fmt:str="waveform") -> dict:
         """ finished, checked,
 
         load the wave delineation, along with metadata if specified
@@ -275,68 +285,26 @@ class LUDB(PhysioNetDataBase):
             the leads to load
         metadata: bool, default False,
             if True, load metadata from corresponding head file
+        waves_fmt: str, default "waveform", case insensitive,
+            format of the wave delineation, can be one of
+            "waveform": a dict of lists of `ECGWaveForm`, keyed by the leads,
+            "array": the structured array returned by `self.load_waves`
 
         Returns
         -------
         ann_dict: dict,
         """
         ann_dict = ED()
-        rec_fp = os.path.join(self.db_dir, rec)
 
         # wave delineation annotations
         _leads = self._normalize_leads(leads, standard_ordering=True, lower_cases=False)
-        _ann_ext = [f"atr_{l.lower()}" for l in _leads]
-        ann_dict["waves"] = ED({l:[] for l in _leads})
-        for l, e in zip(_leads, _ann_ext):
-            ann = wfdb.rdann(rec_fp, extension=e)
-            df_lead_ann = pd.DataFrame()
-            symbols = np.array(ann.symbol)
-            peak_inds = np.where(np.isin(symbols, ["p", "N", "t"]))[0]
-            df_lead_ann["peak"] = ann.sample[peak_inds]
-            df_lead_ann["onset"] = np.nan
-            df_lead_ann["offset"] = np.nan
-            for i, row in df_lead_ann.iterrows():
-                peak_idx = peak_inds[i]
-                if peak_idx == 0:
-                    df_lead_ann.loc[i, "onset"] = row["peak"]
-                    if symbols[peak_idx+1] == ")":
-                        df_lead_ann.loc[i, "offset"] = ann.sample[peak_idx+1]
-                    else:
-                        df_lead_ann.loc[i, "offset"] = row["peak"]
-                elif peak_idx == len(symbols) - 1:
-                    df_lead_ann.loc[i, "offset"] = row["peak"]
-                    if symbols[peak_idx-1] == "(":
-                        df_lead_ann.loc[i, "onset"] = ann.sample[peak_idx-1]
-                    else:
-                        df_lead_ann.loc[i, "onset"] = row["peak"]
-                else:
-                    if symbols[peak_idx-1] == "(":
-                        df_lead_ann.loc[i, "onset"] = ann.sample[peak_idx-1]
-                    else:
-                        df_lead_ann.loc[i, "onset"] = row["peak"]
-                    if symbols[peak_idx+1] == ")":
-                        df_lead_ann.loc[i, "offset"] = ann.sample[peak_idx+1]
-                    else:
-                        df_lead_ann.loc[i, "offset"] = row["peak"]
-            # df_lead_ann["onset"] = ann.sample[np.where(symbols=="(")[0]]
-            # df_lead_ann["offset"] = ann.sample[np.where(symbols==")")[0]]
-
-            df_lead_ann["duration"] = (df_lead_ann["offset"] - df_lead_ann["onset"]) * self.spacing
-            
-            df_lead_ann.index = symbols[peak_inds]
-
-            for c in ["peak", "onset", "offset"]:
-                df_lead_ann[c] = df_lead_ann[c].values.astype(int)
-            
-            for _, row in df_lead_ann.iterrows():
-                w = ECGWaveForm(
-                    name=self._symbol_to_wavename[row.name],
-                    onset=int(row.onset),
-                    offset=int(row.offset),
-                    peak=int(row.peak),
-                    duration=row.duration,
-                )
-                ann_dict["waves"][l].append(w)
+        waves = self.load_waves(rec, leads=_leads)
+        if waves_fmt.lower() == "array":
+            ann_dict["waves"] = waves
+        elif waves_fmt.lower() == "waveform":
+            ann_dict["waves"] = self._waves_to_waveforms(waves, _leads)
+        else:
+            raise ValueError(f"format `{waves_fmt}` of the waves is not supported!")
 
         if metadata:
             header_dict = self._load_header(rec)
@@ -345,6 +313,99 @@ class LUDB(PhysioNetDataBase):
         return ann_dict
 
 
+    def load_waves(self, rec:str, leads:Optional[Sequence[str]]=None) -> np.ndarray:
+        """ finished, checked,
+
+        load the wave delineation of the record as one structured array,
+        cached in the annotation sidecar (in `working_dir`)
+
+        Parameters
+        ----------
+        rec: str,
+            name of the record
+        leads: str or list of str, optional,
+            the leads to load
+
+        Returns
+        -------
+        waves: ndarray,
+            structured array with fields "lead", "wave_type" ("pwave", "qrs", "twave"), "onset", "peak", "offset",
+            ordered by the leads (in the standard ordering), then by the positions in the annotation files
+        """
+        rec_fp = os.path.join(self.db_dir, rec)
+        waves = self._load_ann_sidecar(
+            rec, "waves", [f"{rec_fp}.{e}" for e in self.beat_ann_ext],
+            lambda: {"waves": self._parse_waves(rec_fp)},
+        )["waves"]
+        if leads is not None:
+            _leads = self._normalize_leads(leads, standard_ordering=True, lower_cases=False)
+            waves = waves[np.isin(waves["lead"], _leads)]
+        return waves
+
+
+    def _parse_waves(self, rec_fp:str) -> np.ndarray:
+        """ finished, checked,
+
+        parse the wave delineation annotation files of all the leads,
+        onsets and offsets of the waves are found by looking up the neighbouring symbols of the peaks,
+        if the previous (resp. next) symbol is not "(" (resp. ")"), the onset (resp. offset) is set to the peak
+
+        Parameters
+        ----------
+        rec_fp: str,
+            path (without file extension) of the record
+
+        Returns
+        -------
+        waves: ndarray,
+            structured array with fields "lead", "wave_type", "onset", "peak", "offset"
+        """
+        waves = []
+        for l, e in zip(self.all_leads, self.beat_ann_ext):
+            ann = wfdb.rdann(rec_fp, extension=e)
+            symbols = np.array(ann.symbol)
+            sample = ann.sample
+            peak_inds = np.where(np.isin(symbols, ["p", "N", "t"]))[0]
+            prev_inds = np.maximum(peak_inds - 1, 0)
+            next_inds = np.minimum(peak_inds + 1, len(symbols) - 1)
+            has_onset = (peak_inds > 0) & (symbols[prev_inds] == "(")
+            has_offset = (peak_inds < len(symbols) - 1) & (symbols[next_inds] == ")")
+            lead_waves = np.empty((len(peak_inds),), dtype=_WAVES_DTYPE)
+            lead_waves["lead"] = l
+            lead_waves["wave_type"] = [self._symbol_to_wavename[sb] for sb in symbols[peak_inds]]
+            lead_waves["peak"] = sample[peak_inds]
+            lead_waves["onset"] = np.where(has_onset, sample[prev_inds], sample[peak_inds])
+            lead_waves["offset"] = np.where(has_offset, sample[next_inds], sample[peak_inds])
+            waves.append(lead_waves)
+        return np.concatenate(waves)
+
+
+    def _waves_to_waveforms(self, waves:np.ndarray, leads:Sequence[str]) -> Dict[str, List[ECGWaveForm]]:
+        """ finished, checked,
+
+        view of the structured array of waves as lists of `ECGWaveForm`
+
+        Parameters
+        ----------
+        waves: ndarray,
+            structured array returned by `self.load_waves`
+        leads: list of str,
+            the leads (in the standard ordering, and in the standard cases)
+
+        Returns
+        -------
+        waveforms: dict,
+            each item value is a list containing the `ECGWaveForm`s corr. to the lead (item key)
+        """
+        durations = (waves["offset"] - waves["onset"]) * self.spacing
+        waveforms = ED({l:[] for l in leads})
+        for w, duration in zip(waves.tolist(), durations.tolist()):
+            waveforms[w[0]].append(ECGWaveForm(
+                name=w[1], onset=w[2], offset=w[4], peak=w[3], duration=duration,
+            ))
+        return waveforms
+
+
     def load_diagnoses(self, rec:str) -> List[str]:
         """ finished, checked,
 
@@ -388,13 +449,26 @@ class LUDB(PhysioNetDataBase):
             the masks corresponding to the wave delineation annotations of `rec`
         """
         _class_map = ED(class_map) if class_map is not None else self.class_map
-        _leads = self._normalize_leads(leads, standard_ordering=True, lower_cases=True)
-        data = self.load_data(rec, leads=_leads, data_format="channel_first")
-        masks = np.full_like(data, fill_value=_class_map.i, dtype=int)
-        waves = self.load_ann(rec, leads=_leads, metadata=False)["waves"]
-        for idx, (l, l_w) in enumerate(waves.items()):
-            for w in l_w:
-                masks[idx, w.onset: w.offset] = _class_map[self._wavename_to_symbol[w.name]]
+        _leads = self._normalize_leads(leads, standard_ordering=True, lower_cases=False)
+        siglen = wfdb.rdheader(os.path.join(self.db_dir, rec)).sig_len
+        masks = np.full((len(_leads), siglen), fill_value=_class_map.i, dtype=int)
+        waves = self.load_waves(rec, leads=_leads)
+        # fill all the waves at once, via flat indices of the masks
+        lead_names, lead_inds = np.unique(waves["lead"], return_inverse=True)
+        lead_inds = np.array([_leads.index(l) for l in lead_names], dtype=int)[lead_inds]
+        wave_types, values = np.unique(waves["wave_type"], return_inverse=True)
+        values = np.array([_class_map[self._wavename_to_symbol[w]] for w in wave_types], dtype=int)[values]
+        onsets = np.clip(waves["onset"], 0, siglen).astype(int)
+        lengths = np.maximum(np.clip(waves["offset"], 0, siglen) - onsets, 0)
+        flat_starts = lead_inds * siglen + onsets
+        offsets_in_wave = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        flat_inds = np.repeat(flat_starts, lengths) + offsets_in_wave
+        values = np.repeat(values, lengths)
+        # later waves overwrite earlier ones (as filling the waves one by one) where they overlap,
+        # resolved explicitly, since the order of assignments to repeated indices is not guaranteed by numpy
+        _, last = np.unique(flat_inds[::-1], return_index=True)
+        last = len(flat_inds) - 1 - last
+        masks.ravel()[flat_inds[last]] = values[last]
         if mask_format.lower() not in ["channel_first", "lead_first",]:
             masks = masks.T
         return masks
@@ -2,9 +2,8 @@
 """
 """
 import os
-from pyedflib import EdfReader
 from datetime import datetime
-from typing import Union, Optional, Any, List, NoReturn
+from typing import Union, Optional, Any, List, Dict, Sequence, NoReturn
 from numbers import Real
 
 import wfdb
@@ -106,34 +105,34 @@ class UCDDB(PhysioNetDataBase):
         self._ls_rec()
         
         self.fs = None
-        self.file_opened = None
 
 
-    def safe_edf_file_operation(self, operation:str="close", full_file_path:Optional[str]=None) -> Union[EdfReader, NoReturn]:
-        """ finished, checked,
+    def load_psg_data(self, rec:str, channel:Union[str,Sequence[str]]="all", start_sec:Real=0, duration_sec:Optional[Real]=None, dtype:type=np.float64) -> Dict[str, np.ndarray]:
+        """ finished,
 
         Parameters
         ----------
-        operation: str, default "close",
-            operation name, can be "open" and "close"
-        full_file_path: str, optional,
-            path of the file which contains the psg data,
-            if not given, default path will be used
-        
+        rec: str,
+            name of the record
+        channel: str or sequence of str, default "all",
+            label(s) of the channel(s) of PSG,
+            if is "all", then all channels will be returned,
+            only the selected channels are read from the EDF file
+        start_sec: real number, default 0,
+            start time (in seconds) of the data to load
+        duration_sec: real number, optional,
+            duration (in seconds) of the data to load,
+            if not given, data till the end of the record will be loaded
+        dtype: type, default np.float64,
+            dtype of the data, e.g. np.float32
+
         Returns
         -------
-
+        dict, psg data
         """
-        if operation == "open":
-            if self.file_opened is not None:
-                self.file_opened._close()
-            self.file_opened = EdfReader(full_file_path)
-        elif operation =="close":
-            if self.file_opened is not None:
-                self.file_opened._close()
-                self.file_opened = None
-        else:
-            raise ValueError("Illegal operation")
+        frp = os.path.join(self.db_dir, f"{rec}.{self.data_ext}")
+        chn = None if isinstance(channel, str) and channel.lower() == "all" else ([channel] if isinstance(channel, str) else list(channel))
+        return self._read_edf_signals(frp, channels=chn, start_sec=start_sec, duration_sec=duration_sec, dtype=dtype)
 
 
     def get_subject_id(self, rec) -> int:
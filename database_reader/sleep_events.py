@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+columnar (NumPy-backed) representation of sleep events (apnea, arousal, desaturation, etc.)
+
+events are stored as structured arrays of dtype `SLEEP_EVENT_DTYPE`,
+with fields "event_name", "event_start", "event_end", "event_duration" (times in seconds),
+in accordance with the `sleep_event_keys` of the readers
+"""
+from typing import Union, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+__all__ = [
+    "SLEEP_EVENT_DTYPE",
+    "make_sleep_events",
+    "sleep_events_from_pairs",
+    "sleep_events_to_df",
+]
+
+
+SLEEP_EVENT_DTYPE = np.dtype([
+    ("event_name", "U64"),
+    ("event_start", np.float64),
+    ("event_end", np.float64),
+    ("event_duration", np.float64),
+])
+
+
+def make_sleep_events(event_name:Union[str, Sequence[str], np.ndarray],
+                      event_start:Union[Sequence[float], np.ndarray],
+                      event_end:Optional[Union[Sequence[float], np.ndarray]]=None,
+                      event_duration:Optional[Union[Sequence[float], np.ndarray]]=None) -> np.ndarray:
+    """ finished, checked,
+
+    make the structured array of sleep events from columns,
+    one of `event_end` and `event_duration` should be given, the other one is computed
+
+    Parameters
+    ----------
+    event_name: str, or sequence of str, or ndarray,
+        names of the events, a single str for all the events,
+        empty str for events of unknown names
+    event_start: sequence of float, or ndarray,
+        start times (in seconds) of the events
+    event_end: sequence of float, or ndarray, optional,
+        end times (in seconds) of the events
+    event_duration: sequence of float, or ndarray, optional,
+        durations (in seconds) of the events
+
+    Returns
+    -------
+    events: ndarray,
+        of dtype `SLEEP_EVENT_DTYPE`
+    """
+    event_start = np.asarray(event_start, dtype=np.float64).ravel()
+    if event_end is None and event_duration is None:
+        raise ValueError("one of `event_end` and `event_duration` should be given")
+    events = np.zeros((len(event_start),), dtype=SLEEP_EVENT_DTYPE)
+    events["event_name"] = event_name
+    events["event_start"] = event_start
+    if event_end is not None:
+        events["event_end"] = np.asarray(event_end, dtype=np.float64).ravel()
+        events["event_duration"] = events["event_end"] - event_start
+    else:
+        events["event_duration"] = np.asarray(event_duration, dtype=np.float64).ravel()
+        events["event_end"] = event_start + events["event_duration"]
+    return events
+
+
+def sleep_events_from_pairs(pairs:np.ndarray, event_name:Union[str, Sequence[str], np.ndarray]="") -> np.ndarray:
+    """ finished, checked,
+
+    make the structured array of sleep events from wide tables of (start, end) pairs,
+    e.g. the columns "event01start", "event01end", ..., "event18end" of the HRV annotations of SHHS,
+    slots with NaN starts are dropped
+
+    Parameters
+    ----------
+    pairs: ndarray,
+        of shape (n_rows, 2 * n_slots), each row being [start_1, end_1, start_2, end_2, ...]
+    event_name: str, or sequence of str, or ndarray, default "",
+        names of the events (after being reshaped into (n_rows * n_slots, 2) and before dropping the empty slots)
+
+    Returns
+    -------
+    events: ndarray,
+        of dtype `SLEEP_EVENT_DTYPE`, in the row-major order of the slots
+    """
+    pairs = np.asarray(pairs, dtype=np.float64).reshape((-1, 2))
+    kept = ~np.isnan(pairs[:, 0])
+    if not isinstance(event_name, str):
+        event_name = np.asarray(event_name)[kept]
+    return make_sleep_events(event_name, pairs[kept, 0], event_end=pairs[kept, 1])
+
+
+def sleep_events_to_df(events:np.ndarray) -> pd.DataFrame:
+    """ finished, checked,
+
+    wrap the structured array of sleep events into a DataFrame,
+    empty event names are converted to None
+
+    Parameters
+    ----------
+    events: ndarray,
+        of dtype `SLEEP_EVENT_DTYPE`
+
+    Returns
+    -------
+    df_events: DataFrame,
+        with columns "event_name", "event_start", "event_end", "event_duration"
+    """
+    event_name = events["event_name"].astype(object)
+    event_name[events["event_name"] == ""] = None
+    df_events = pd.DataFrame(
+        {
+            "event_name": event_name.tolist(),
+            "event_start": events["event_start"],
+            "event_end": events["event_end"],
+            "event_duration": events["event_duration"],
+        },
+        columns=list(SLEEP_EVENT_DTYPE.names),
+    )
+    return df_events
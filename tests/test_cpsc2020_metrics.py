@@ -0,0 +1,170 @@
+"""
+regression tests of the scoring and the epoch beat labelling of `CPSC2020`,
+results should coincide with those of the original (loop-based) implementations, copied below
+"""
+import numpy as np
+import pytest
+
+from database_reader.cpsc_databases.cpsc2020 import (
+    compute_metrics,
+    _ann_to_beat_ann_epoch_v1,
+    _ann_to_beat_ann_epoch_v3,
+)
+
+
+BIAS_THR = 0.15 * 400  # that of `compute_metrics`
+
+
+def _ref_ann_to_beat_ann_epoch_v1(rpeaks, ann, bias_thr):
+    beat_ann = np.array(["N" for _ in range(len(rpeaks))])
+    for idx, r in enumerate(rpeaks):
+        if any([abs(r-p) < bias_thr for p in ann["SPB_indices"]]):
+            beat_ann[idx] = "S"
+        elif any([abs(r-p) < bias_thr for p in ann["PVC_indices"]]):
+            beat_ann[idx] = "V"
+    ann_matched = ann.copy()
+    retval = dict(ann_matched=ann_matched, beat_ann=beat_ann)
+    return retval
+
+
+def _ref_ann_to_beat_ann_epoch_v3(rpeaks, ann, bias_thr):
+    beat_ann = np.array(["N" for _ in range(len(rpeaks))], dtype="<U1")
+    ann_matched = {k: [] for k,v in ann.items()}
+    for idx_r, r in enumerate(rpeaks):
+        dist_to_spb = np.abs(r-ann["SPB_indices"])
+        dist_to_pvc = np.abs(r-ann["PVC_indices"])
+        if len(dist_to_spb) == 0:
+            dist_to_spb = np.array([np.inf])
+        if len(dist_to_pvc) == 0:
+            dist_to_pvc = np.array([np.inf])
+        argmin = np.argmin([np.min(dist_to_spb), np.min(dist_to_pvc), bias_thr])
+        if argmin == 2:
+            pass
+        elif argmin == 1:
+            beat_ann[idx_r] = "V"
+            ann_matched["PVC_indices"].append(ann["PVC_indices"][np.argmin(dist_to_pvc)])
+        elif argmin == 0:
+            beat_ann[idx_r] = "S"
+            ann_matched["SPB_indices"].append(ann["SPB_indices"][np.argmin(dist_to_spb)])
+    ann_matched = {k: np.array(v) for k,v in ann_matched.items()}
+    retval = dict(ann_matched=ann_matched, beat_ann=beat_ann)
+    return retval
+
+
+def _ref_compute_metrics(sbp_true, pvc_true, sbp_pred, pvc_pred):
+    """
+    the original scoring, returning also the (tp, fp, fn) of each record and each beat type
+    """
+    s_score = np.zeros([len(sbp_true), ], dtype=int)
+    v_score = np.zeros([len(sbp_true), ], dtype=int)
+    details = []
+    for i, (s_ref, v_ref, s_pos, v_pos) in enumerate(zip(sbp_true, pvc_true, sbp_pred, pvc_pred)):
+        counts = {}
+        for name, ref, pos in [("S", s_ref, s_pos), ("V", v_ref, v_pos)]:
+            tp, fp, fn = 0, 0, 0
+            if ref.size == 0:
+                fp = len(pos)
+            else:
+                for m, ans in enumerate(ref):
+                    pos_cand = np.where(abs(pos-ans) <= BIAS_THR)[0]
+                    if pos_cand.size == 0:
+                        fn += 1
+                    else:
+                        tp += 1
+                        fp += len(pos_cand) - 1
+            counts[name] = (tp, fp, fn)
+        s_score[i] = counts["S"][1] * (-1) + counts["S"][2] * (-5)
+        v_score[i] = counts["V"][1] * (-1) + counts["V"][2] * (-5)
+        details.append(counts)
+    return np.sum(s_score), np.sum(v_score), details
+
+
+def _rand_indices(rng, n:int, hi:int, sort:bool, dup:bool) -> np.ndarray:
+    indices = rng.integers(0, hi, n)
+    if dup and n >= 5:
+        indices[: n // 5] = indices[n // 5: 2 * (n // 5)]
+    return np.sort(indices) if sort else indices
+
+
+def _rand_cases(n_cases:int=200, seed:int=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(n_cases):
+        hi = int(rng.integers(100, 5000))
+        sort, dup = rng.random() < 0.5, rng.random() < 0.5
+        yield rng, hi, sort, dup
+
+
+def _check_beat_ann(func, ref_func, rpeaks, ann, bias_thr):
+    result, expected = func(rpeaks, ann, bias_thr), ref_func(rpeaks, ann, bias_thr)
+    assert result["beat_ann"].dtype == expected["beat_ann"].dtype
+    np.testing.assert_array_equal(result["beat_ann"], expected["beat_ann"])
+    for k in ann:
+        assert result["ann_matched"][k].dtype == expected["ann_matched"][k].dtype
+        np.testing.assert_array_equal(result["ann_matched"][k], expected["ann_matched"][k])
+
+
+@pytest.mark.parametrize("func,ref_func", [
+    (_ann_to_beat_ann_epoch_v1, _ref_ann_to_beat_ann_epoch_v1),
+    (_ann_to_beat_ann_epoch_v3, _ref_ann_to_beat_ann_epoch_v3),
+])
+def test_beat_ann_epoch_random(func, ref_func):
+    for rng, hi, sort, dup in _rand_cases():
+        rpeaks = _rand_indices(rng, int(rng.integers(0, 60)), hi, sort=rng.random() < 0.7, dup=False)
+        ann = {
+            "SPB_indices": _rand_indices(rng, int(rng.integers(0, 10)), hi, sort, dup),
+            "PVC_indices": _rand_indices(rng, int(rng.integers(0, 10)), hi, sort, dup),
+        }
+        _check_beat_ann(func, ref_func, rpeaks, ann, rng.choice([30, 60.0, 100]))
+
+
+@pytest.mark.parametrize("func,ref_func", [
+    (_ann_to_beat_ann_epoch_v1, _ref_ann_to_beat_ann_epoch_v1),
+    (_ann_to_beat_ann_epoch_v3, _ref_ann_to_beat_ann_epoch_v3),
+])
+@pytest.mark.parametrize("rpeaks,spb,pvc", [
+    ([], [], []),  # empty
+    ([100, 400, 700], [], []),  # no annotations
+    ([], [110, 690], [390]),  # no rpeaks
+    ([700, 100, 400], [690, 110], [390]),  # unsorted
+    ([100, 400, 700], [130, 130, 70], [70, 130]),  # duplicated, and equidistant annotations
+    ([100, 160, 220], [130, 190], [160, 160]),  # ties between SPB and PVC
+])
+def test_beat_ann_epoch_edge_cases(func, ref_func, rpeaks, spb, pvc):
+    ann = {"SPB_indices": np.array(spb, dtype=int), "PVC_indices": np.array(pvc, dtype=int)}
+    for bias_thr in [30, 60]:
+        _check_beat_ann(func, ref_func, np.array(rpeaks, dtype=int), ann, bias_thr)
+
+
+def _check_metrics(sbp_true, pvc_true, sbp_pred, pvc_pred):
+    Score1, Score2, details = _ref_compute_metrics(sbp_true, pvc_true, sbp_pred, pvc_pred)
+    assert compute_metrics(sbp_true, pvc_true, sbp_pred, pvc_pred) == (Score1, Score2)
+    retval = compute_metrics(sbp_true, pvc_true, sbp_pred, pvc_pred, verbose=1)
+    assert retval.total_loss == -(Score1+Score2)
+    assert retval.class_loss == {"S": -Score1, "V": -Score2}
+    for name in ["S", "V"]:
+        for pos, k in enumerate(["true_positive", "false_positive", "false_negative"]):
+            assert [d[k][name] for d in retval.record_details] == [c[name][pos] for c in details]
+            assert retval[k][name] == sum([c[name][pos] for c in details])
+
+
+def test_compute_metrics_random():
+    for rng, hi, sort, dup in _rand_cases():
+        _check_metrics(*[
+            [_rand_indices(rng, int(rng.integers(0, 30)), hi, sort, dup) for _ in range(5)] \
+                for _ in range(4)
+        ])
+
+
+@pytest.mark.parametrize("s_ref,v_ref,s_pred,v_pred", [
+    ([], [], [], []),  # empty
+    ([], [], [100, 200], [300]),  # no reference beats
+    ([100, 500], [300], [], []),  # no predictions
+    ([500, 100], [900, 300], [510, 90, 140], [330, 870]),  # unsorted
+    ([100, 100, 500], [300, 300], [100, 100, 160, 560], [300, 240, 360]),  # duplicated, and boundaries
+])
+def test_compute_metrics_edge_cases(s_ref, v_ref, s_pred, v_pred):
+    _check_metrics(*[
+        [np.array(item, dtype=int)] for item in [s_ref, v_ref, s_pred, v_pred]
+    ])
+    # empty list of records
+    _check_metrics([], [], [], [])
@@ -0,0 +1,88 @@
+"""
+regression tests of `EdfReaderPool` used by many threads,
+evicted handles should be closed before the same file could be opened again
+"""
+import time
+import threading
+
+import numpy as np
+import pytest
+
+pyedflib = pytest.importorskip("pyedflib")
+
+from database_reader.base import EdfReaderPool, _EdfPoolEntry
+
+
+def _make_edf(file_path:str, seed:int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    sig = rng.uniform(-100, 100, (1, 256*4))
+    header = pyedflib.highlevel.make_signal_headers(["ch0"], sample_frequency=256, physical_min=-200, physical_max=200)
+    pyedflib.highlevel.write_edf(file_path, sig, header)
+    return sig
+
+
+def _slow_close(monkeypatch):
+    close = _EdfPoolEntry.close
+
+    def slow_close(self):
+        time.sleep(0.005)  # widens the gap between eviction and closing
+        close(self)
+
+    monkeypatch.setattr(_EdfPoolEntry, "close", slow_close)
+
+
+def test_pool_threads_evicting(tmp_path, monkeypatch):
+    _slow_close(monkeypatch)
+    paths = [str(tmp_path / f"rec{i}.edf") for i in range(2)]
+    for i, fp in enumerate(paths):
+        _make_edf(fp, i)
+    pool = EdfReaderPool(maxsize=1)
+    errors = []
+
+    def worker(seed:int):
+        rng = np.random.default_rng(seed)
+        try:
+            for _ in range(50):
+                fp = paths[int(rng.integers(0, len(paths)))]
+                with pool.open(fp) as reader:
+                    assert reader.getNSamples()[0] == 256*4
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(pool) <= 1
+    pool.close()
+    assert len(pool) == 0
+
+
+def test_pool_close_then_reopen(tmp_path, monkeypatch):
+    _slow_close(monkeypatch)
+    fp = str(tmp_path / "rec.edf")
+    _make_edf(fp, 0)
+    pool = EdfReaderPool(maxsize=4)
+    errors = []
+
+    def closer():
+        for _ in range(50):
+            pool.close(fp)
+
+    def reader():
+        try:
+            for _ in range(50):
+                with pool.open(fp) as r:
+                    r.readSignal(0)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=closer), threading.Thread(target=reader), threading.Thread(target=reader)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    pool.close()
@@ -0,0 +1,58 @@
+"""
+regression tests of `_DataBase._iter_wfdb_windows`,
+windows should coincide with those read directly via `wfdb.rdrecord`
+"""
+import numpy as np
+import pytest
+
+wfdb = pytest.importorskip("wfdb")
+
+from database_reader.base import PhysioNetDataBase
+
+
+FS = 250
+
+
+def _make_record(tmp_path, siglen:int, n_sig:int=2) -> str:
+    rng = np.random.default_rng(0)
+    sig = np.round(rng.normal(0, 1, (siglen, n_sig)), 3)
+    wfdb.wrsamp(
+        "rec", fs=FS, units=["mV"]*n_sig, sig_name=[f"ch{i}" for i in range(n_sig)],
+        p_signal=sig, fmt=["16"]*n_sig, adc_gain=[1000]*n_sig, baseline=[0]*n_sig,
+        write_dir=str(tmp_path),
+    )
+    return str(tmp_path / "rec")
+
+
+def _make_db() -> PhysioNetDataBase:
+    db = PhysioNetDataBase.__new__(PhysioNetDataBase)
+    db.fs = FS
+    return db
+
+
+@pytest.mark.parametrize("win_len,hop,block_len,siglen", [
+    (100, 250, 300, 5000),  # hop > win_len, gaps spanning the blocks
+    (100, 250, None, 5000),
+    (2500, 7500, None, 600000),  # 10s windows every 30s, default block length
+    (100, 50, 300, 5000),  # overlapping windows
+    (100, 100, 130, 5000),
+])
+def test_windows_match_rdrecord(tmp_path, win_len, hop, block_len, siglen):
+    rec_fp = _make_record(tmp_path, siglen)
+    db = _make_db()
+    n_windows = 0
+    for idx, (sig, _, _) in enumerate(db._iter_wfdb_windows(rec_fp, win_len, hop, data_format="channel_last", block_len=block_len)):
+        start = idx * hop
+        expected = wfdb.rdrecord(rec_fp, sampfrom=start, sampto=start+win_len, physical=True).p_signal
+        np.testing.assert_array_equal(sig, expected)
+        n_windows += 1
+    assert n_windows == (siglen - win_len) // hop + 1
+
+
+def test_windows_with_sampfrom(tmp_path):
+    rec_fp = _make_record(tmp_path, 5000)
+    db = _make_db()
+    for idx, (sig, _, _) in enumerate(db._iter_wfdb_windows(rec_fp, 100, 333, sampfrom=77, sampto=4000, data_format="channel_last", block_len=200)):
+        start = 77 + idx * 333
+        expected = wfdb.rdrecord(rec_fp, sampfrom=start, sampto=start+100, physical=True).p_signal
+        np.testing.assert_array_equal(sig, expected)